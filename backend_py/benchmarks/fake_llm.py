@@ -0,0 +1,100 @@
+import json
+import math
+import random
+import threading
+import time
+from typing import Callable, Union
+
+
+class FakeResponse:
+    def __init__(self, content: str, prompt: str = ""):
+        self.content = content
+        # Rough token counts, so LLM metrics see plausible numbers
+        self.usage_metadata = {
+            "input_tokens": len(prompt) // 4,
+            "output_tokens": len(content) // 4,
+        }
+
+
+class FakeChatModel:
+    """Deterministic stand-in for ChatGoogleGenerativeAI.
+
+    Recognises which agent step is calling it from the system prompt and
+    returns a canned answer built from the configured scenario, so the whole
+    graph can run without network access or an API key.
+    """
+
+    def __init__(self, scenario: dict = None, latency: Union[float, Callable[[], float]] = 0.0):
+        # latency is seconds per call, or a function returning a sample
+        self.scenario = scenario or {}
+        self.latency = latency
+        self.calls = 0
+
+    def invoke(self, messages, config=None):
+        self.calls += 1
+        delay = self.latency() if callable(self.latency) else self.latency
+        if delay:
+            time.sleep(delay)
+        system = messages[0].content if messages else ""
+        prompt = "".join(str(message.content) for message in messages)
+        return FakeResponse(self._respond(system), prompt)
+
+    def _respond(self, system: str) -> str:
+        if "parse user questions" in system:
+            return json.dumps({
+                "is_relevant": True,
+                "relevant_tables": self.scenario.get("relevant_tables", []),
+            })
+        if "generates SQL queries" in system:
+            return self.scenario.get("sql", "NOT_ENOUGH_INFO")
+        if "recommends appropriate data visualizations" in system:
+            visualization = self.scenario.get("visualization", "bar")
+            return f"Recommended Visualization: {visualization}\nReason: Benchmark scenario."
+        if "data labeling expert" in system:
+            return self.scenario.get("label", "Value")
+        if "formats database query results" in system:
+            return self.scenario.get("answer", "Benchmark answer.")
+        if "formats data according to the required needs" in system:
+            return json.dumps(self.scenario.get("formatted_data", {}))
+        return ""
+
+
+def latency_distribution(spec: str, seed: int = None) -> Callable[[], float]:
+    """Latency sampler in seconds from a spec with values in milliseconds.
+
+        fixed:200            every call takes 200 ms
+        uniform:100,800      uniformly between 100 and 800 ms
+        normal:400,100       mean 400 ms, standard deviation 100 ms
+        lognormal:400,0.6    median 400 ms, sigma 0.6 (long tail, like real LLMs)
+        exponential:300      mean 300 ms
+    """
+    kind, _, params = spec.partition(":")
+    try:
+        values = [float(value) for value in params.split(",")] if params else []
+    except ValueError:
+        raise ValueError(f"Invalid latency spec: {spec}")
+    arity = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1}
+    if arity.get(kind) != len(values):
+        raise ValueError(f"Invalid latency spec: {spec}")
+
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def sample() -> float:
+        if kind == "fixed":
+            return values[0]
+        if kind == "uniform":
+            return rng.uniform(values[0], values[1])
+        if kind == "normal":
+            return rng.gauss(values[0], values[1])
+        if kind == "lognormal":
+            return values[0] * math.exp(rng.gauss(0, values[1]))
+        return rng.expovariate(1 / values[0]) if values[0] else 0.0
+
+    def latency() -> float:
+        # Random is shared by every request thread
+        with lock:
+            ms = sample()
+        return max(0.0, ms) / 1000
+
+    return latency
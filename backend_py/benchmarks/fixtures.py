@@ -0,0 +1,75 @@
+import os
+import random
+import sqlite3
+from datetime import date, timedelta
+
+# name -> (rows per table, number of tables, distinct values in the category column)
+FIXTURE_SIZES = {
+    "small": (1_000, 1, 10),
+    "medium": (50_000, 3, 100),
+    "large": (500_000, 5, 1_000),
+}
+
+REGIONS = ["North", "South", "East", "West", "Central"]
+
+
+def table_names(size: str):
+    """Names of the fact tables generated for a fixture size."""
+    _, tables, _ = FIXTURE_SIZES[size]
+    return [f"sales_{i}" for i in range(tables)]
+
+
+def generate_fixture(path: str, size: str, seed: int = 42) -> str:
+    """Create a deterministic SQLite database of the given size at path."""
+    rows, tables, cardinality = FIXTURE_SIZES[size]
+    if os.path.exists(path):
+        os.remove(path)
+
+    rng = random.Random(seed)
+    start = date(2020, 1, 1)
+    categories = [f"Category {i}" for i in range(cardinality)]
+
+    conn = sqlite3.connect(path)
+    with conn:
+        for table in table_names(size):
+            conn.execute(
+                f"""
+                CREATE TABLE `{table}` (
+                    id INTEGER PRIMARY KEY,
+                    category TEXT,
+                    region TEXT,
+                    quantity INTEGER,
+                    price REAL,
+                    sold_at TEXT
+                )
+            """
+            )
+            conn.executemany(
+                f"INSERT INTO `{table}` VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        i,
+                        rng.choice(categories),
+                        rng.choice(REGIONS),
+                        rng.randint(1, 20),
+                        round(rng.uniform(1, 500), 2),
+                        (start + timedelta(days=rng.randint(0, 1460))).isoformat(),
+                    )
+                    for i in range(rows)
+                ),
+            )
+    conn.close()
+    return path
+
+
+def generate_csv(path: str, rows: int = 1_000, seed: int = 42) -> str:
+    """Create a small CSV file for upload benchmarks."""
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        f.write("category,region,quantity,price\n")
+        for _ in range(rows):
+            f.write(
+                f"Category {rng.randint(0, 9)},{rng.choice(REGIONS)},"
+                f"{rng.randint(1, 20)},{rng.uniform(1, 500):.2f}\n"
+            )
+    return path
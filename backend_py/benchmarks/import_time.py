@@ -0,0 +1,137 @@
+"""Import-time benchmark and regression guard.
+
+Imports each entry module in fresh interpreters, times it, and checks that
+the heavy libraries only needed by uploads or the agent (pandas, pyarrow,
+langgraph, the Google SDK, ...) are still loaded lazily. Exits non-zero on a
+violation, or when conversation_api's median import time exceeds --max-ms,
+so it can run in CI.
+
+Usage (from backend_py/):
+    python -m benchmarks.import_time --repeat 5 --max-ms 500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# module -> libraries importing it must not load
+LAZY = {
+    "conversation_api": [
+        "pandas",
+        "numpy",
+        "pyarrow",
+        "requests",
+        "langgraph",
+        "langchain_core",
+        "langchain_google_genai",
+        "google.genai",
+        "google.generativeai",
+    ],
+    "my_agent.main": ["pandas", "pyarrow", "langchain_google_genai", "google.genai", "google.generativeai"],
+}
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def time_import(module, lazy, env):
+    """Seconds to import module in a fresh interpreter, and the lazy libraries it loaded."""
+    output = subprocess.check_output(
+        [sys.executable, "-c", _PROBE.format(module=module, lazy=lazy)],
+        env=env,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    result = json.loads(output.strip().splitlines()[-1])
+    return result["seconds"], result["loaded"]
+
+
+def slowest_imports(module, env, top=10):
+    """The imports with the largest cumulative time, from python -X importtime."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.strip()))
+    rows.sort(reverse=True)
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in rows[:top]]
+
+
+def measure(repeat, modules=None):
+    """Import statistics per module; importing must not touch real data."""
+    workdir = tempfile.mkdtemp(prefix="dataviz-import-")
+    env = dict(
+        os.environ,
+        UPLOAD_DIR=os.path.join(workdir, "uploads"),
+        CONVERSATIONS_DB_PATH=os.path.join(workdir, "conversations.sqlite"),
+        LANGCHAIN_TRACING_V2="false",
+    )
+    results = []
+    for module in modules or LAZY:
+        samples, loaded = [], set()
+        for _ in range(repeat):
+            seconds, eager = time_import(module, LAZY[module], env)
+            samples.append(seconds * 1000)
+            loaded.update(eager)
+        results.append(
+            {
+                "module": module,
+                "runs": repeat,
+                "median_ms": round(statistics.median(samples), 1),
+                "min_ms": round(min(samples), 1),
+                "eagerly_loaded": sorted(loaded),
+                "slowest_imports": slowest_imports(module, env),
+            }
+        )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, help="fail when importing conversation_api takes longer (median)")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    results = measure(args.repeat)
+    failures = []
+    for result in results:
+        print(f"{result['module']:<20} median {result['median_ms']:.1f} ms", file=sys.stderr)
+        if result["eagerly_loaded"]:
+            failures.append(f"{result['module']} imports {', '.join(result['eagerly_loaded'])} eagerly")
+        if (
+            result["module"] == "conversation_api"
+            and args.max_ms is not None
+            and result["median_ms"] > args.max_ms
+        ):
+            failures.append(f"{result['module']} takes {result['median_ms']} ms to import (max {args.max_ms:g})")
+
+    output = json.dumps({"results": results, "failures": failures}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
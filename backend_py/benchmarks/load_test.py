@@ -0,0 +1,504 @@
+"""Load test for conversation_api.
+
+Serves the real Flask app on a local port, with the fake chat model in place
+of Gemini and a generated SQLite fixture as the uploaded database, and replays
+a weighted mix of upload, ask, history and stats requests over HTTP (and
+/ask/batch, /usage and /recent-questions on request). Reports
+throughput, p50/p95/p99 latency and error rate per endpoint, so serving
+configurations can be compared and contention regressions caught before
+deploying.
+
+Load is generated in one of two ways:
+    closed loop (default)  --concurrency clients each send their next request
+                           as soon as the previous one returns
+    open loop (--rate)     requests arrive as a Poisson process at --rate per
+                           second and are sent by up to --concurrency clients;
+                           latency counts from the arrival, so time spent
+                           waiting for a free client is included
+
+Usage (from backend_py/):
+    python -m benchmarks.load_test --concurrency 16 --duration 60
+    python -m benchmarks.load_test --rate 20 --llm-latency lognormal:800,0.5
+    python -m benchmarks.load_test --server gunicorn --workers 4 --threads 4 --output load.json
+    python -m benchmarks.load_test --url http://localhost:5001   # a running server, its own LLM
+"""
+import argparse
+import contextlib
+import json
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import requests
+
+from benchmarks.fake_llm import FakeChatModel, latency_distribution
+from benchmarks.fixtures import FIXTURE_SIZES, generate_csv, generate_fixture
+from benchmarks.run_benchmarks import git_revision, make_scenario
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = ("ask", "batch", "history", "stats", "usage", "recent", "upload")
+DEFAULT_MIX = "ask=4,history=3,stats=2,upload=1"
+
+QUESTIONS = [
+    "What is the revenue per category?",
+    "Which category sells the most?",
+    "Show revenue by category",
+    "How much revenue does each category bring in?",
+]
+
+
+def parse_mix(spec):
+    """Endpoint weights from "ask=4,history=3,...", e.g. for random.choices."""
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(
+                f"Unknown endpoint {name!r}; choose from {', '.join(ENDPOINTS)}"
+            )
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Invalid weight in {part!r}")
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("The mix needs at least one positive weight")
+    return mix
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class Traffic:
+    """Sends the load-test requests and records how each one went.
+
+    Each client thread keeps its own HTTP session. A request counts as an
+    error when it raises, returns a 4xx/5xx status or, for /ask, comes back
+    with an error from the graph.
+    """
+
+    def __init__(self, base_url, uuid, sessions, uploads, timeout, seed):
+        self.base_url = base_url.rstrip("/")
+        self.uuid = uuid
+        self.sessions = sessions
+        self.uploads = uploads
+        self.timeout = timeout
+        self.measure_from = 0.0
+        self.results = []  # (endpoint, seconds, error kind or None)
+        self._local = threading.local()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def send(self, endpoint, arrived=None):
+        """Send one request; latency counts from arrived when given."""
+        started = arrived if arrived is not None else time.perf_counter()
+        with self._lock:
+            session_id = self._rng.choice(self.sessions)
+            question = self._rng.choice(QUESTIONS)
+            upload = self._rng.choice(self.uploads)
+
+        error = None
+        try:
+            response = self._request(endpoint, session_id, question, upload)
+            if response.status_code >= 400:
+                error = f"http_{response.status_code}"
+            elif endpoint == "ask" and response.json().get("error"):
+                error = "graph_error"
+            elif endpoint == "batch" and _batch_failed(response.text):
+                error = "graph_error"
+        except Exception as e:
+            error = type(e).__name__
+        elapsed = time.perf_counter() - started
+
+        if started >= self.measure_from:
+            with self._lock:
+                self.results.append((endpoint, elapsed, error))
+
+    def _request(self, endpoint, session_id, question, upload):
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = self._local.http = requests.Session()
+        url, timeout = self.base_url, self.timeout
+
+        if endpoint == "ask":
+            return http.post(
+                f"{url}/ask",
+                json={"question": question, "uuid": self.uuid, "session_id": session_id},
+                timeout=timeout,
+            )
+        if endpoint == "batch":
+            return http.post(
+                f"{url}/ask/batch",
+                json={"questions": QUESTIONS, "uuid": self.uuid, "session_id": session_id},
+                timeout=timeout,
+            )
+        if endpoint == "history":
+            return http.get(f"{url}/conversation-history/{session_id}", timeout=timeout)
+        if endpoint == "stats":
+            return http.get(f"{url}/session/{session_id}/stats", timeout=timeout)
+        if endpoint == "usage":
+            return http.get(f"{url}/usage/{self.uuid}", timeout=timeout)
+        if endpoint == "recent":
+            return http.get(f"{url}/recent-questions/{self.uuid}", timeout=timeout)
+        name, data = upload
+        return http.post(f"{url}/upload-file", files={"file": (name, data)}, timeout=timeout)
+
+
+def _batch_failed(body):
+    """Whether an /ask/batch event stream reports a failed question or batch."""
+    for line in body.splitlines():
+        if line == "event: error":
+            return True
+        if line.startswith("data: ") and json.loads(line[len("data: "):]).get("error"):
+            return True
+    return False
+
+
+def closed_loop(traffic, pick, concurrency, deadline):
+    """Every client sends its next request as soon as the previous one returns."""
+
+    def client():
+        while time.perf_counter() < deadline:
+            traffic.send(pick())
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {"arrivals": None, "not_sent": 0}
+
+
+def open_loop(traffic, pick, concurrency, deadline, rate, rng):
+    """Poisson arrivals at rate per second, sent by up to concurrency clients.
+
+    Arrivals still waiting for a client when the run ends are dropped and
+    reported as not sent; a growing count means the server cannot keep up.
+    """
+    arrivals = 0
+    futures = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        next_at = time.perf_counter()
+        while True:
+            next_at += rng.expovariate(rate)
+            if next_at >= deadline:
+                break
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(traffic.send, pick(), next_at))
+            arrivals += 1
+        pool.shutdown(wait=True, cancel_futures=True)
+    return {"arrivals": arrivals, "not_sent": sum(f.cancelled() for f in futures)}
+
+
+def endpoint_report(latencies, errors, seconds):
+    """Throughput and latency of successful requests, and the share that failed."""
+    total = len(latencies) + sum(errors.values())
+    report = {
+        "requests": total,
+        "errors": sum(errors.values()),
+        "error_rate": round(sum(errors.values()) / total, 4) if total else 0.0,
+        "throughput_rps": round(len(latencies) / seconds, 3),
+    }
+    if latencies:
+        ms = sorted(s * 1000 for s in latencies)
+        report.update(
+            {
+                "mean_ms": round(sum(ms) / len(ms), 3),
+                "p50_ms": round(percentile(ms, 0.50), 3),
+                "p95_ms": round(percentile(ms, 0.95), 3),
+                "p99_ms": round(percentile(ms, 0.99), 3),
+                "max_ms": round(ms[-1], 3),
+            }
+        )
+    if errors:
+        report["error_kinds"] = dict(errors.most_common())
+    return report
+
+
+def build_report(results, seconds):
+    latencies, errors = {}, {}
+    for endpoint, elapsed, error in results:
+        for name in (endpoint, "all"):
+            if error is None:
+                latencies.setdefault(name, []).append(elapsed)
+            else:
+                errors.setdefault(name, Counter())[error] += 1
+                latencies.setdefault(name, [])
+    names = [name for name in ENDPOINTS if name in latencies] + (["all"] if results else [])
+    return {name: endpoint_report(latencies[name], errors.get(name, Counter()), seconds) for name in names}
+
+
+def print_report(endpoints, file=sys.stderr):
+    print(
+        f"{'endpoint':<10}{'requests':>10}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}"
+        f"{'p99 ms':>10}{'errors':>9}",
+        file=file,
+    )
+    for name, report in endpoints.items():
+        print(
+            f"{name:<10}{report['requests']:>10}{report['throughput_rps']:>10.1f}"
+            f"{report.get('p50_ms', float('nan')):>10.1f}{report.get('p95_ms', float('nan')):>10.1f}"
+            f"{report.get('p99_ms', float('nan')):>10.1f}{report['error_rate']:>9.1%}",
+            file=file,
+        )
+
+
+def install_fake_llm(api, scenario, latency):
+    """Make /ask run the graph with the fake chat model instead of Gemini."""
+    from my_agent.LLMManager import LLMManager
+    from my_agent.WorkflowManager import WorkflowManager
+
+    workflow = WorkflowManager(
+        db_manager=api.local_db,
+        llm_manager=LLMManager(llm=FakeChatModel(scenario, latency)),
+        conversation_manager=api.conversation_manager,
+    )
+    # Looked up at call time by the routes and get_graph()
+    api.get_workflow = lru_cache(maxsize=None)(lambda: workflow)
+    api.get_graph.cache_clear()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_werkzeug(api, port):
+    """Threaded development server in this process; returns a stop function."""
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # no per-request log lines
+    server = make_server("127.0.0.1", port, api.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name="load-test-server", daemon=True)
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        thread.join()
+        api.shutdown()
+
+    return stop
+
+
+def _run_gunicorn(app, port, workers, threads):
+    from gunicorn.app.base import Application
+
+    class LoadTestServer(Application):
+        """gunicorn.conf.py with the load test's bind address and pool sizes."""
+
+        def load_config(self):
+            self.load_config_from_file(os.path.join(BACKEND_DIR, "gunicorn.conf.py"))
+            self.cfg.set("bind", f"127.0.0.1:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("threads", threads)
+            self.cfg.set("accesslog", None)
+
+        def load(self):
+            return app
+
+    # The app's own progress prints would end up in the JSON on stdout
+    sys.stdout = open(os.devnull, "w")
+    LoadTestServer().run()
+
+
+def serve_gunicorn(api, port, workers, threads):
+    """gunicorn in a forked child; workers inherit the patched app."""
+    process = multiprocessing.get_context("fork").Process(
+        target=_run_gunicorn, args=(api.app, port, workers, threads), daemon=False
+    )
+    process.start()
+
+    def stop():
+        process.terminate()  # SIGTERM: graceful shutdown, flushing every worker
+        process.join()
+
+    return stop
+
+
+def wait_until_healthy(base_url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/health", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become healthy")
+
+
+def prepare(base_url, workdir, size, sessions):
+    """Upload the fixture database and open sessions on it."""
+    path = generate_fixture(os.path.join(workdir, f"load-{size}.sqlite"), size)
+    with open(path, "rb") as f:
+        response = requests.post(
+            f"{base_url}/upload-file", files={"file": (os.path.basename(path), f)}, timeout=300
+        )
+    response.raise_for_status()
+    uuid = response.json()["uuid"]
+
+    session_ids = []
+    for _ in range(sessions):
+        response = requests.post(
+            f"{base_url}/session/create", json={"database_uuid": uuid}, timeout=30
+        )
+        response.raise_for_status()
+        session_ids.append(response.json()["session_id"])
+    return uuid, session_ids
+
+
+def upload_payloads(workdir, variants, rows):
+    """Distinct CSV files for upload traffic; repeats of one are deduplicated."""
+    payloads = []
+    for seed in range(variants):
+        path = generate_csv(os.path.join(workdir, f"upload-{seed}.csv"), rows, seed)
+        with open(path, "rb") as f:
+            payloads.append((f"upload-{seed}.csv", f.read()))
+    return payloads
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help=f"endpoint weights, from {', '.join(ENDPOINTS)} (default {DEFAULT_MIX})")
+    parser.add_argument("--concurrency", type=int, default=8, help="clients sending requests")
+    parser.add_argument("--rate", type=float, help="open loop: mean arrivals per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of unmeasured load first")
+    parser.add_argument("--llm-latency", default="lognormal:500,0.5",
+                        help="fake LLM latency per call in ms: fixed:N, uniform:A,B, "
+                             "normal:MEAN,SD, lognormal:MEDIAN,SIGMA or exponential:MEAN")
+    parser.add_argument("--size", default="small", choices=sorted(FIXTURE_SIZES))
+    parser.add_argument("--sessions", type=int, help="conversation sessions to spread traffic over (default: concurrency)")
+    parser.add_argument("--upload-variants", type=int, default=20, help="distinct CSV files used for uploads")
+    parser.add_argument("--upload-rows", type=int, default=1_000)
+    parser.add_argument("--server", choices=["werkzeug", "gunicorn"], default="werkzeug")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads per worker")
+    parser.add_argument("--background-workers", action="store_true",
+                        help="run retention and the index advisor during the test")
+    parser.add_argument("--url", help="load an already running server instead (it keeps its own LLM)")
+    parser.add_argument("--timeout", type=float, default=120, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+    latency = latency_distribution(args.llm_latency, args.seed)
+
+    workdir = tempfile.mkdtemp(prefix="dataviz-load-")
+    stop = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        upload_dir = os.path.join(workdir, "uploads")
+        os.makedirs(upload_dir)
+        # Must be set before conversation_api is imported
+        os.environ["UPLOAD_DIR"] = upload_dir
+        os.environ["CONVERSATIONS_DB_PATH"] = os.path.join(workdir, "conversations.sqlite")
+        os.environ["LANGCHAIN_TRACING_V2"] = "false"
+        os.environ["PRELOAD_GRAPH"] = "false"
+        for name in ("CONVERSATION_RETENTION", "INDEX_ADVISOR", "UPLOAD_RETENTION"):
+            os.environ[f"{name}_ENABLED"] = "true" if args.background_workers else "false"
+
+        import conversation_api as api
+
+        install_fake_llm(api, make_scenario(args.size), latency)
+        # As wsgi.py does before gunicorn forks its workers
+        api.warm_up()
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        if args.server == "gunicorn":
+            stop = serve_gunicorn(api, port, args.workers, args.threads)
+        else:
+            api.start_background_workers()
+            stop = serve_werkzeug(api, port)
+
+    try:
+        wait_until_healthy(base_url)
+        uuid, sessions = prepare(base_url, workdir, args.size, args.sessions or args.concurrency)
+        uploads = upload_payloads(workdir, args.upload_variants, args.upload_rows)
+        traffic = Traffic(base_url, uuid, sessions, uploads, args.timeout, args.seed)
+
+        rng = random.Random(args.seed)
+        names, weights = zip(*args.mix.items())
+        pick_lock = threading.Lock()
+
+        def pick():
+            with pick_lock:
+                return rng.choices(names, weights)[0]
+
+        started = time.perf_counter()
+        traffic.measure_from = started + args.warmup
+        deadline = traffic.measure_from + args.duration
+        print(
+            f"Load testing {base_url} for {args.warmup:g}+{args.duration:g} s "
+            f"({'rate %g/s' % args.rate if args.rate else 'closed loop'}, "
+            f"concurrency {args.concurrency})",
+            file=sys.stderr,
+        )
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            if args.rate:
+                arrivals = open_loop(traffic, pick, args.concurrency, deadline, args.rate, rng)
+            else:
+                arrivals = closed_loop(traffic, pick, args.concurrency, deadline)
+        # Requests still in flight at the deadline finish inside the window
+        measured = max(time.perf_counter(), deadline) - traffic.measure_from
+    finally:
+        if stop is not None:
+            stop()
+
+    endpoints = build_report(traffic.results, measured)
+    print_report(endpoints)
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "server": "external" if args.url else args.server,
+            "workers": args.workers if args.server == "gunicorn" and not args.url else None,
+            "threads": args.threads if args.server == "gunicorn" and not args.url else None,
+            "mode": "open" if args.rate else "closed",
+            "rate": args.rate,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "measured_s": round(measured, 3),
+            "warmup_s": args.warmup,
+            "mix": args.mix,
+            "llm_latency": None if args.url else args.llm_latency,
+            "fixture": {"size": args.size, **dict(zip(("rows", "tables", "cardinality"), FIXTURE_SIZES[args.size]))},
+            "sessions": len(sessions),
+            "upload_variants": args.upload_variants,
+            **arrivals,
+        },
+        "endpoints": endpoints,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""Offline benchmark suite.
+
+Runs entirely in-process: a deterministic fake chat model replaces Gemini and
+the Flask app's test client stands in for the database endpoint, so neither
+an API key nor the Node SQLite service is needed.
+
+Usage (from backend_py/):
+    python -m benchmarks.run_benchmarks --sizes small medium --repeat 5 --output bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.fixtures import FIXTURE_SIZES, generate_csv, generate_fixture, table_names
+
+
+def summarize(samples):
+    """Summary statistics in milliseconds for a list of durations in seconds."""
+    ms = sorted(s * 1000 for s in samples)
+    p95_index = min(len(ms) - 1, int(round(0.95 * (len(ms) - 1))))
+    return {
+        "runs": len(ms),
+        "min_ms": round(ms[0], 3),
+        "median_ms": round(statistics.median(ms), 3),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p95_ms": round(ms[p95_index], 3),
+        "max_ms": round(ms[-1], 3),
+    }
+
+
+def measure(fn, repeat, warmup=1):
+    """Time fn() repeat times after warmup calls; returns (stats, last result)."""
+    result = None
+    samples = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(warmup):
+            result = fn()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            samples.append(time.perf_counter() - start)
+    return summarize(samples), result
+
+
+class BenchmarkRecorder:
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = []
+
+    def run(self, group, name, fn, fixture=None, **params):
+        stats, result = measure(fn, self.repeat)
+        self.results.append(
+            {"group": group, "name": name, "fixture": fixture, "params": params, **stats}
+        )
+        print(f"{group:>10} {name:<45} {fixture or '-':<7} median {stats['median_ms']:.2f} ms", file=sys.stderr)
+        return result
+
+
+def make_scenario(size):
+    table = table_names(size)[0]
+    return {
+        "relevant_tables": [
+            {
+                "table_name": table,
+                "columns": ["category", "quantity", "price"],
+                "noun_columns": ["category"],
+            }
+        ],
+        "sql": (
+            f"SELECT `category`, SUM(`quantity` * `price`) AS revenue FROM `{table}` "
+            "GROUP BY `category` ORDER BY revenue DESC"
+        ),
+        "visualization": "bar",
+        "label": "Revenue",
+    }
+
+
+def graph_nodes(workflow):
+    """Graph nodes in execution order, as registered in WorkflowManager."""
+    agent = workflow.sql_agent
+    return [
+        ("parse_question", agent.parse_question),
+        ("get_unique_nouns", agent.get_unique_nouns),
+        ("generate_sql", agent.generate_sql),
+        ("validate_and_fix_sql", agent.validate_and_fix_sql),
+        ("execute_sql", agent.execute_sql),
+        ("choose_visualization", agent.choose_visualization),
+        ("format_data_for_visualization", workflow.data_formatter.format_data_for_visualization),
+        ("format_results", agent.format_results),
+    ]
+
+
+def bench_graph(recorder, api, size, uuid):
+    from my_agent.DatabaseManager import DatabaseManager
+    from my_agent.LLMManager import LLMManager
+    from my_agent.WorkflowManager import WorkflowManager
+
+    class InProcessDatabaseManager(DatabaseManager):
+        """Serves DatabaseManager calls through the Flask test client."""
+
+        def __init__(self, client):
+            self.endpoint_url = "in-process"
+            self.client = client
+
+        def get_schema(self, uuid):
+            response = self.client.get(f"/get-schema/{uuid}")
+            if response.status_code != 200:
+                raise Exception(f"Error fetching schema: {response.get_json()}")
+            return response.get_json()["schema"]
+
+        def execute_query(self, uuid, query):
+            response = self.client.post("/execute-query", json={"uuid": uuid, "query": query})
+            if response.status_code != 200:
+                raise Exception(f"Error executing query: {response.get_json()}")
+            return response.get_json()["results"]
+
+    llm_manager = LLMManager(llm=FakeChatModel(make_scenario(size)))
+    workflow = WorkflowManager(
+        db_manager=InProcessDatabaseManager(api.app.test_client()),
+        llm_manager=llm_manager,
+        conversation_manager=api.conversation_manager,
+    )
+
+    session_id = api.conversation_manager.create_session(uuid)
+    state = {"question": "What is the revenue per category?", "uuid": uuid, "session_id": session_id}
+    for name, node in graph_nodes(workflow):
+        update = recorder.run("node", name, lambda: node(dict(state)), fixture=size)
+        state.update(update)
+
+    graph = workflow.returnGraph()
+    initial = {"question": state["question"], "uuid": uuid, "session_id": session_id}
+    recorder.run("graph", "invoke", lambda: graph.invoke(dict(initial)), fixture=size)
+
+    # get_unique_nouns across noun columns of increasing cardinality
+    table = table_names(size)[0]
+    for columns in (["region"], ["category"], ["category", "region"], ["sold_at"]):
+        parsed = {
+            "is_relevant": True,
+            "relevant_tables": [{"table_name": table, "columns": columns, "noun_columns": columns}],
+        }
+        recorder.run(
+            "nouns",
+            "get_unique_nouns",
+            lambda: workflow.sql_agent.get_unique_nouns({"uuid": uuid, "parsed_question": parsed}),
+            fixture=size,
+            columns=columns,
+        )
+
+
+def synthetic_results(points):
+    numeric = [[float(i), float(i * 7 % 101)] for i in range(points)]
+    labeled = [[f"Series {i % 5}", float(i // 5), float(i % 97)] for i in range(points)]
+    categories = [[f"Category {i}", float(i * 3 % 89)] for i in range(points)]
+    grouped = [[f"Entity {i % 4}", f"Group {i // 4}", float(i % 53)] for i in range(points)]
+    return numeric, labeled, categories, grouped
+
+
+def bench_formatter(recorder, points):
+    from my_agent.DataFormatter import DataFormatter
+    from my_agent.LLMManager import LLMManager
+    from my_agent.Serializer import dumps
+
+    formatter = DataFormatter(LLMManager(llm=FakeChatModel({"label": "Value"})))
+    numeric, labeled, categories, grouped = synthetic_results(points)
+    question = "Benchmark question"
+
+    cases = [
+        ("_format_line_data", "2col", lambda: formatter._format_line_data(numeric, question)),
+        ("_format_line_data", "3col", lambda: formatter._format_line_data(labeled, question)),
+        ("_format_scatter_data", "2col", lambda: formatter._format_scatter_data(numeric)),
+        ("_format_scatter_data", "3col", lambda: formatter._format_scatter_data(labeled)),
+        ("_format_bar_data", "2col", lambda: formatter._format_bar_data(categories, question)),
+        ("_format_bar_data", "3col", lambda: formatter._format_bar_data(grouped, question)),
+        ("_format_pie_data", "2col", lambda: formatter._format_pie_data(categories, question)),
+    ]
+    for name, shape, fn in cases:
+        recorder.run("formatter", name, fn, points=points, shape=shape)
+
+    # Payload size and encode time, point objects vs columnar encoding
+    for visualization, payload in (
+        ("scatter", formatter._format_scatter_data(labeled)),
+        ("pie", formatter._format_pie_data(categories, question)),
+    ):
+        columnar = formatter._to_columnar(visualization, payload)
+        for encoding, data in (("points", payload), ("columnar", columnar)):
+            size = len(dumps(data))
+            recorder.run(
+                "serialize", f"{visualization}_{encoding}_orjson", lambda: dumps(data),
+                points=points, bytes=size,
+            )
+            recorder.run(
+                "serialize", f"{visualization}_{encoding}_stdlib", lambda: json.dumps(data),
+                points=points, bytes=len(json.dumps(data)),
+            )
+
+
+def bench_routes(recorder, api, size, uuid, workdir):
+    client = api.app.test_client()
+    table = table_names(size)[0]
+    session_id = client.post("/session/create", json={"database_uuid": uuid}).get_json()["session_id"]
+    csv_path = generate_csv(os.path.join(workdir, "upload.csv"))
+
+    def upload_csv():
+        with open(csv_path, "rb") as f:
+            return client.post("/upload-file", data={"file": (f, "upload.csv")})
+
+    routes = [
+        ("GET /health", lambda: client.get("/health")),
+        ("GET /get-schema", lambda: client.get(f"/get-schema/{uuid}")),
+        ("POST /execute-query aggregate", lambda: client.post("/execute-query", json={
+            "uuid": uuid,
+            "query": f"SELECT category, SUM(quantity * price) FROM `{table}` GROUP BY category",
+        })),
+        ("POST /execute-query scan", lambda: client.post("/execute-query", json={
+            "uuid": uuid, "query": f"SELECT * FROM `{table}`",
+        })),
+        ("POST /session/create", lambda: client.post("/session/create", json={"database_uuid": uuid})),
+        ("GET /conversation-history", lambda: client.get(f"/conversation-history/{session_id}")),
+        ("GET /recent-questions", lambda: client.get(f"/recent-questions/{uuid}")),
+        ("GET /session/stats", lambda: client.get(f"/session/{session_id}/stats")),
+        ("POST /upload-file csv", upload_csv),
+    ]
+    for name, fn in routes:
+        recorder.run("route", name, fn, fixture=size)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["small", "medium"], choices=sorted(FIXTURE_SIZES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--points", nargs="+", type=int, default=[100, 10_000])
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="dataviz-bench-")
+    upload_dir = os.path.join(workdir, "uploads")
+    os.makedirs(upload_dir)
+    # Must be set before conversation_api is imported
+    os.environ["UPLOAD_DIR"] = upload_dir
+    os.environ["CONVERSATIONS_DB_PATH"] = os.path.join(workdir, "conversations.sqlite")
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
+
+    import conversation_api as api
+
+    recorder = BenchmarkRecorder(args.repeat)
+    for size in args.sizes:
+        uuid = f"bench-{size}"
+        generate_fixture(os.path.join(upload_dir, f"{uuid}.sqlite"), size)
+        bench_graph(recorder, api, size, uuid)
+        bench_routes(recorder, api, size, uuid, workdir)
+    for points in args.points:
+        bench_formatter(recorder, points)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "fixtures": {size: dict(zip(("rows", "tables", "cardinality"), FIXTURE_SIZES[size])) for size in args.sizes},
+        },
+        "results": recorder.results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
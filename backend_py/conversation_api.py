@@ -1,31 +1,124 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
+from my_agent.AggregateCache import AggregateCache
+from my_agent.BatchRunner import BatchRunner
+from my_agent.ChartRefresher import ChartError, ChartRefresher
 from my_agent.ConversationManager import ConversationManager
+from my_agent.ConversationRetention import ConversationRetention
+from my_agent.DataIngestor import DataIngestor, IngestError
+from my_agent.IndexAdvisor import IndexAdvisor
+from my_agent.LocalDatabaseManager import LocalDatabaseManager
+from my_agent import Metrics
+from my_agent.Profiler import RequestProfiler
+from my_agent.SampleStore import SampleStore
+from my_agent.RequestTimer import RequestTimer
+from my_agent.Serializer import FastJSONProvider, dumps, loads
+from my_agent.UploadRetention import UploadRetention
+from my_agent.UploadStore import DatabaseNotFound, InvalidDatabase, UploadStore
+from functools import lru_cache
+import base64
 import os
-import sqlite3
-import json
+import time
 import uuid as uuid_lib
-import pandas as pd
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)  # orjson-backed jsonify for every route
 CORS(app, origins=["http://localhost:3000"])  # Allow frontend access
 
-conversation_manager = ConversationManager()
+conversation_manager = ConversationManager(
+    os.environ.get("CONVERSATIONS_DB_PATH", "conversations.sqlite")
+)
+# Background retention for conversations.sqlite (one process runs it)
+conversation_retention = ConversationRetention(conversation_manager)
+_shutting_down = False
 
 # Database file path
-UPLOAD_DIR = os.path.join(
-    os.path.dirname(os.path.dirname(__file__)), "sqlite_server", "uploads"
+UPLOAD_DIR = os.environ.get(
+    "UPLOAD_DIR",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "sqlite_server",
+        "uploads",
+    ),
 )
 # Ensure upload directory exists
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Uploaded databases are optimized on upload and then served read-only
+upload_store = UploadStore(UPLOAD_DIR)
+# Evicts least recently used uploads beyond the disk budget (one process runs it)
+upload_retention = UploadRetention(upload_store, conversation_manager)
+# Summary tables answering recurring aggregate queries
+aggregate_cache = (
+    AggregateCache(upload_store)
+    if os.environ.get("AGG_CACHE_ENABLED", "true").lower() != "false"
+    else None
+)
+# Random samples of large tables, for progressive answers on /ask/stream
+sample_store = (
+    SampleStore(upload_store)
+    if os.environ.get("SAMPLE_ENABLED", "true").lower() != "false"
+    else None
+)
+# Schema and query access to uploaded databases, shared by routes and the graph
+local_db = LocalDatabaseManager(upload_store, aggregate_cache, sample_store=sample_store)
+# Learns indexes for uploaded databases from the queries run on them
+index_advisor = IndexAdvisor(upload_store, conversation_manager)
+
+# Loads CSV, Parquet and zipped uploads into new SQLite databases
+data_ingestor = DataIngestor()
 
 # Allowed file extensions
-ALLOWED_EXTENSIONS = {".sqlite", ".csv"}
+ALLOWED_EXTENSIONS = {".sqlite"} | DataIngestor.EXTENSIONS
+
+# Opt-in per-request CPU profiles (PROFILE_DIR); free when disabled
+profiler = RequestProfiler()
+
+# Rows of the query result sent in the execute_sql stream event
+STREAM_PREVIEW_ROWS = int(os.environ.get("STREAM_PREVIEW_ROWS", 20))
+# Longest /ask/stream waits for the exact rows after a sampled answer
+SAMPLE_EXACT_TIMEOUT_S = float(os.environ.get("SAMPLE_EXACT_TIMEOUT_S", 300))
+# Questions accepted by one /ask/batch request
+BATCH_MAX_QUESTIONS = int(os.environ.get("BATCH_MAX_QUESTIONS", 20))
+
+
+@app.before_request
+def _start_request_clock():
+    g.request_started = time.perf_counter()
+    if profiler.enabled and profiler.wanted(request.headers.get("X-Profile")):
+        request_id = request.headers.get("X-Request-Id") or uuid_lib.uuid4().hex
+        g.profile = profiler.start(request_id)
+        g.profile_id = request_id
+
+
+@app.after_request
+def _record_request_metrics(response):
+    # Streamed responses are measured up to their first byte
+    started = g.get("request_started")
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        Metrics.HTTP_REQUEST_SECONDS.labels(
+            endpoint, request.method, str(response.status_code)
+        ).observe(time.perf_counter() - started)
+    if g.get("profile") is not None:
+        response.headers["X-Profile-Id"] = g.profile_id
+    return response
+
+
+@app.teardown_request
+def _finish_profile(exc):
+    # Runs after a streamed response has been sent in full
+    profile = g.pop("profile", None)
+    if profile is not None:
+        profiler.finish(profile)
 
 
 @app.route("/upload-file", methods=["POST"])
 def upload_file():
-    """Upload SQLite or CSV file."""
+    """Upload a SQLite, CSV, Parquet or zip (of CSV/Parquet files) file.
+
+    An optional "columns" form field (comma separated) loads only those
+    columns of Parquet files.
+    """
     try:
         if "file" not in request.files:
             return jsonify({"error": "No file provided"}), 400
@@ -37,41 +130,61 @@ def upload_file():
 
         # Check file extension
         _, file_extension = os.path.splitext(file.filename)
-        if file_extension.lower() not in ALLOWED_EXTENSIONS:
+        file_extension = file_extension.lower()
+        if file_extension not in ALLOWED_EXTENSIONS:
             return jsonify(
-                {"error": "Invalid file type. Only .sqlite and .csv files are allowed"}
+                {
+                    "error": "Invalid file type. Only .sqlite, .csv, .parquet and .zip "
+                    "files are allowed"
+                }
             ), 400
 
         # Generate unique ID for the file
         file_uuid = str(uuid_lib.uuid4())
-
-        # Handle SQLite file
-        if file_extension.lower() == ".sqlite":
-            db_path = os.path.join(UPLOAD_DIR, f"{file_uuid}.sqlite")
-            file.save(db_path)
-
-        # Handle CSV file - convert to SQLite
-        elif file_extension.lower() == ".csv":
-            db_path = os.path.join(UPLOAD_DIR, f"{file_uuid}.sqlite")
-
+        # Written to a staging file; finalize() optimizes it into place
+        db_path = upload_store.staging_path(file_uuid)
+
+        # Uploads are hashed as they come in; known content is not stored twice
+        columns = request.form.get("columns")
+        columns = [c.strip() for c in columns.split(",")] if columns else None
+        # A lone CSV keeps the table name it has always had
+        table = "csv_data" if file_extension == ".csv" else None
+        if file_extension == ".sqlite":
+            content_id = upload_store.save(file.stream, db_path)
+        else:
+            content_id = data_ingestor.content_id(
+                upload_store.digest(file.stream), file.filename, columns, table
+            )
+
+        if upload_store.link(file_uuid, content_id):
+            if os.path.exists(db_path):
+                os.remove(db_path)
+            return jsonify({"uuid": file_uuid, "deduplicated": True}), 200
+
+        # Handle CSV, Parquet and zip files - load into SQLite
+        if file_extension != ".sqlite":
             try:
-                # Read CSV file
-                df = pd.read_csv(file)
-
-                if df.empty:
-                    return jsonify({"error": "CSV file is empty"}), 400
-
-                # Create SQLite database and save data
-                conn = sqlite3.connect(db_path)
-                df.to_sql("csv_data", conn, if_exists="replace", index=False)
-                conn.close()
-
+                data_ingestor.load(
+                    file.stream, file.filename, db_path, columns=columns, table=table
+                )
             except Exception as e:
+                if os.path.exists(db_path):
+                    os.remove(db_path)
+                if isinstance(e, IngestError):
+                    return jsonify({"error": str(e)}), 400
                 return jsonify(
-                    {"error": f"Error converting CSV to SQLite: {str(e)}"}
+                    {"error": f"Error converting {file_extension} to SQLite: {str(e)}"}
                 ), 500
 
-        return jsonify({"uuid": file_uuid}), 200
+        try:
+            upload_store.finalize(file_uuid, db_path, content_id)
+        except InvalidDatabase as e:
+            return jsonify({"error": str(e)}), 400
+        upload_retention.schedule()
+        if sample_store is not None:
+            sample_store.schedule(file_uuid)
+
+        return jsonify({"uuid": file_uuid, "deduplicated": False}), 200
 
     except Exception as e:
         return jsonify({"error": f"File upload failed: {str(e)}"}), 500
@@ -81,42 +194,9 @@ def upload_file():
 def get_schema(uuid):
     """Get schema for a database."""
     try:
-        db_path = os.path.join(UPLOAD_DIR, f"{uuid}.sqlite")
-
-        if not os.path.exists(db_path):
-            return jsonify({"error": "Database not found"}), 404
-
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        # Get all tables
-        cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='table';")
-        tables = cursor.fetchall()
-
-        schema = []
-        for table_name, create_statement in tables:
-            schema.append(f"Table: {table_name}")
-            schema.append(f"CREATE statement: {create_statement}\n")
-
-            # Get sample rows
-            try:
-                cursor.execute(f"SELECT * FROM '{table_name}' LIMIT 3;")
-                rows = cursor.fetchall()
-                if rows:
-                    schema.append("Example rows:")
-                    for row in rows:
-                        schema.append(
-                            json.dumps(
-                                dict(zip([col[0] for col in cursor.description], row))
-                            )
-                        )
-            except Exception as e:
-                print(f"Error fetching rows for table {table_name}: {e}")
-
-            schema.append("")  # Blank line between tables
-
-        conn.close()
-        return jsonify({"schema": "\n".join(schema)})
+        return jsonify({"schema": local_db.get_schema(uuid)})
+    except DatabaseNotFound as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -132,42 +212,70 @@ def execute_query():
         if not uuid or not query:
             return jsonify({"error": "Missing uuid or query"}), 400
 
-        db_path = os.path.join(UPLOAD_DIR, f"{uuid}.sqlite")
+        return jsonify({"results": local_db.execute_query(uuid, query)})
+    except DatabaseNotFound as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
 
-        if not os.path.exists(db_path):
-            return jsonify({"error": "Database not found"}), 404
+def _encode_cursor(position):
+    """Encode a (timestamp, id) keyset position as an opaque URL-safe cursor."""
+    if position is None:
+        return None
+    return base64.urlsafe_b64encode(dumps(list(position))).decode("ascii")
 
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        conn.close()
 
-        # Convert rows to list of lists (values only)
-        results = [list(row) for row in rows]
-        return jsonify({"results": results})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 400
+def _decode_cursor(cursor):
+    if not cursor:
+        return None
+    timestamp, row_id = loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    return timestamp, row_id
 
 
 @app.route("/conversation-history/<session_id>", methods=["GET"])
 def get_conversation_history(session_id):
-    """Get conversation history for a session."""
+    """Get conversation history for a session.
+
+    Pass the returned next_cursor as ?cursor= to fetch the next (older) page.
+    """
     try:
         limit = request.args.get("limit", 20, type=int)
-        history = conversation_manager.get_conversation_history(session_id, limit)
-        return jsonify({"history": history})
+        try:
+            before = _decode_cursor(request.args.get("cursor"))
+        except (ValueError, TypeError):
+            return jsonify({"error": "Invalid cursor"}), 400
+
+        history = conversation_manager.get_conversation_history(
+            session_id, limit, before
+        )
+        next_cursor = None
+        if len(history) == limit:
+            next_cursor = _encode_cursor((history[-1]["timestamp"], history[-1]["id"]))
+        return jsonify({"history": history, "next_cursor": next_cursor})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/recent-questions/<database_uuid>", methods=["GET"])
 def get_recent_questions(database_uuid):
-    """Get recent questions for a database."""
+    """Get recent distinct questions for a database.
+
+    Pass the returned next_cursor as ?cursor= to fetch the next page.
+    """
     try:
         limit = request.args.get("limit", 5, type=int)
-        questions = conversation_manager.get_recent_questions(database_uuid, limit)
-        return jsonify({"questions": questions})
+        try:
+            before = _decode_cursor(request.args.get("cursor"))
+        except (ValueError, TypeError):
+            return jsonify({"error": "Invalid cursor"}), 400
+
+        questions, next_position = conversation_manager.get_recent_questions_page(
+            database_uuid, limit, before
+        )
+        return jsonify(
+            {"questions": questions, "next_cursor": _encode_cursor(next_position)}
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -199,12 +307,565 @@ def get_session_stats(session_id):
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/usage/<database_uuid>", methods=["GET"])
+def get_database_usage(database_uuid):
+    """Get usage counters, error rates and visualization breakdown for a database."""
+    try:
+        usage = conversation_manager.get_database_usage(database_uuid)
+        return jsonify({"usage": usage})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@lru_cache(maxsize=None)
+def get_workflow():
+    """Agent workflow for this process, sharing its conversation manager.
+
+    Built on first use, so processes that only serve uploads, history or
+    health checks never import langgraph or the LLM client.
+    """
+    from my_agent.WorkflowManager import WorkflowManager
+
+    return WorkflowManager(db_manager=local_db, conversation_manager=conversation_manager)
+
+
+@lru_cache(maxsize=None)
+def get_graph():
+    """Compiled agent graph for this process."""
+    return get_workflow().returnGraph()
+
+
+def _batch_workflow(db_manager, conversation):
+    """Workflow for one /ask/batch request, sharing this process's LLM client."""
+    from my_agent.WorkflowManager import WorkflowManager
+
+    return WorkflowManager(
+        db_manager=db_manager,
+        llm_manager=get_workflow().llm_manager,
+        conversation_manager=conversation,
+    )
+
+
+# Runs /ask/batch questions concurrently with shared per-database work
+batch_runner = BatchRunner(_batch_workflow, local_db, conversation_manager)
+
+
+def _chart_formatter():
+    from my_agent.DataFormatter import DataFormatter
+
+    # Only used with the LLM when a chart is saved without its labels
+    return DataFormatter(get_workflow().llm_manager)
+
+
+# Saved charts, refreshed from their SQL without the LLM
+chart_refresher = ChartRefresher(local_db, conversation_manager, _chart_formatter)
+
+
+def _graph_input(data):
+    """Initial graph state from an /ask request body, or None if incomplete."""
+    question = data.get("question")
+    database_uuid = data.get("uuid") or data.get("database_uuid")
+    if not question or not database_uuid:
+        return None
+
+    initial = {"question": question, "uuid": database_uuid}
+    if data.get("session_id"):
+        initial["session_id"] = data["session_id"]
+    if data.get("chart_encoding"):
+        initial["chart_encoding"] = data["chart_encoding"]
+    return initial
+
+
+def _queue_wait():
+    """Seconds since a fronting proxy received the request (X-Request-Start)."""
+    header = request.headers.get("X-Request-Start", "")
+    try:
+        started = float(header.replace("t=", "", 1))
+    except ValueError:
+        return 0.0
+    # Proxies send seconds, milliseconds or microseconds since the epoch
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    return max(0.0, time.time() - started)
+
+
+@app.route("/ask", methods=["POST"])
+def ask():
+    """Answer a question by running the agent graph in this process.
+
+    Returns the answer and chart payload along with a timing breakdown (queue
+    wait, LLM, SQL and formatting time, and per-node totals), which is also
+    sent as a Server-Timing header.
+    """
+    initial = _graph_input(request.get_json() or {})
+    if initial is None:
+        return jsonify({"error": "Missing question or uuid"}), 400
+
+    with RequestTimer.collect() as timer:
+        timer.queue_wait = _queue_wait()
+        try:
+            result = get_graph().invoke(initial)
+        except Exception as e:
+            response = jsonify({"error": str(e), "timings": timer.summary()})
+            response.status_code = 500
+            response.headers["Server-Timing"] = timer.server_timing()
+            return response
+    index_advisor.schedule()
+
+    response = jsonify({**_answer(result), "timings": timer.summary()})
+    response.headers["Server-Timing"] = timer.server_timing()
+    return response
+
+
+def _answer(result):
+    """The fields of a finished graph run that /ask and /ask/batch return."""
+    return {
+        "answer": result.get("answer"),
+        "sql_query": result.get("sql_query"),
+        "sql_issues": result.get("sql_issues") or [],
+        "visualization": result.get("visualization"),
+        "visualization_reason": result.get("visualization_reason"),
+        "formatted_data_for_visualization": result.get("formatted_data_for_visualization"),
+        "error": result.get("error"),
+        "session_id": result.get("session_id"),
+    }
+
+
+def _stream_event(node, update):
+    """Pick the part of a node's state update worth sending to the client."""
+    if node == "parse_question":
+        parsed = update.get("parsed_question") or {}
+        return {
+            "parsed_question": parsed,
+            "relevant_tables": parsed.get("relevant_tables", []),
+        }
+    if node == "execute_sql":
+        results = update.get("results")
+        if isinstance(results, list):
+            return {
+                **update,
+                "results": results[:STREAM_PREVIEW_ROWS],
+                "row_count": len(results),
+            }
+    return update
+
+
+def _exact_event(state):
+    """The "exact" stream event: a sampled answer's exact rows, chart and answer.
+
+    Waits for the exact query started by execute_sql, then formats its rows
+    with the labels of the approximate chart, without the LLM, and has the
+    answer, which quoted the estimates, written again from the exact rows.
+    The stored turn gets the exact answer too, so history and context no
+    longer carry the estimate.
+    """
+    rows = sample_store.exact_result(state["approximate"]["exact_id"], SAMPLE_EXACT_TIMEOUT_S)
+    visualization = state.get("visualization")
+    approximate_chart = state.get("formatted_data_for_visualization")
+    workflow = get_workflow()
+    formatter = workflow.data_formatter
+    try:
+        formatted = formatter.format_pinned(
+            visualization,
+            rows,
+            state.get("question"),
+            formatter.chart_labels(visualization, approximate_chart),
+            state.get("chart_encoding"),
+        )["formatted_data_for_visualization"]
+    except ValueError:
+        formatted = None  # no chart, or one only the LLM can format
+    answer = workflow.sql_agent.answer(state.get("question"), rows)
+    if state.get("session_id"):
+        conversation_manager.update_conversation_result(
+            state["session_id"],
+            state.get("question"),
+            state.get("sql_query", ""),
+            f"Found {len(rows)} rows" if rows else "No data found",
+            answer,
+        )
+    return {
+        "results": rows[:STREAM_PREVIEW_ROWS],
+        "row_count": len(rows),
+        "formatted_data_for_visualization": formatted,
+        "answer": answer,
+        "approximate": None,
+    }
+
+
+def _sse(event, data):
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+@app.route("/ask/stream", methods=["POST"])
+def ask_stream():
+    """Run the agent graph and stream one server-sent event per finished node.
+
+    Each event is named after the node and carries the state keys it produced
+    (relevant tables, SQL, a result preview, the chart payload, the answer), so
+    clients can merge them into their view as they arrive. A final "done" event
+    carries the timing breakdown; failures are sent as an "error" event.
+
+    With "progressive": true, an aggregate over a sampled large table is
+    first answered from the sample: execute_sql carries an "approximate"
+    object (table, fraction, sample_rows, source_rows, scale) and the chart
+    and answer are built from the estimate, the answer saying so. The exact
+    query runs meanwhile, and an "exact" event with its rows, chart and a
+    new answer (and "approximate": null) follows and replaces the estimate.
+    """
+    data = request.get_json() or {}
+    initial = _graph_input(data)
+    if initial is None:
+        return jsonify({"error": "Missing question or uuid"}), 400
+    if data.get("progressive") and sample_store is not None:
+        initial["progressive"] = True
+    queue_wait = _queue_wait()
+
+    def generate():
+        with RequestTimer.collect() as timer:
+            timer.queue_wait = queue_wait
+            try:
+                state = dict(initial)
+                for chunk in get_graph().stream(initial, stream_mode="updates"):
+                    for node, update in chunk.items():
+                        state.update(update or {})
+                        yield _sse(node, _stream_event(node, update or {}))
+                if state.get("approximate"):
+                    yield _sse("exact", _exact_event(state))
+                yield _sse("done", {"timings": timer.summary()})
+                index_advisor.schedule()
+            except Exception as e:
+                yield _sse("error", {"error": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/ask/batch", methods=["POST"])
+def ask_batch():
+    """Answer many questions about one database together, e.g. for a dashboard.
+
+    Takes {"uuid", "questions": [...]} plus the optional "session_id",
+    "chart_encoding" and "max_concurrency" (capped by BATCH_MAX_CONCURRENCY).
+    The schema, noun lookups and identical SQL are shared between the
+    questions and their LLM calls run concurrently. Sends a server-sent
+    "result" event per question as it finishes (its "index" in the request,
+    the question and the fields /ask returns), then a "done" event with the
+    session and how many queries were run and shared.
+    """
+    data = request.get_json() or {}
+    database_uuid = data.get("uuid") or data.get("database_uuid")
+    questions = data.get("questions")
+    if (
+        not database_uuid
+        or not isinstance(questions, list)
+        or not questions
+        or not all(isinstance(q, str) and q.strip() for q in questions)
+    ):
+        return jsonify({"error": "Missing uuid or a non-empty list of questions"}), 400
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        return jsonify(
+            {"error": f"At most {BATCH_MAX_QUESTIONS} questions per batch"}
+        ), 400
+    if not upload_store.exists(database_uuid):
+        return jsonify({"error": "Database not found"}), 404
+    try:
+        max_concurrency = int(data.get("max_concurrency") or 0) or None
+    except (TypeError, ValueError):
+        return jsonify({"error": "max_concurrency must be a number"}), 400
+
+    results = batch_runner.run(
+        database_uuid,
+        questions,
+        session_id=data.get("session_id"),
+        chart_encoding=data.get("chart_encoding"),
+        max_concurrency=max_concurrency,
+    )
+
+    def generate():
+        try:
+            for result in results:
+                if result.get("done"):
+                    yield _sse("done", result)
+                else:
+                    yield _sse(
+                        "result",
+                        {
+                            "index": result["index"],
+                            "question": result["question"],
+                            **_answer(result),
+                            "timings": result["timings"],
+                        },
+                    )
+            index_advisor.schedule()
+        except Exception as e:
+            yield _sse("error", {"error": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/saved-charts", methods=["POST"])
+def save_chart():
+    """Pin a conversation turn (an "id" from the history) as a saved chart.
+
+    Takes {"conversation_id"} plus an optional "title", and either the
+    "labels" to pin or the turn's "formatted_data_for_visualization" to take
+    them from; without either, the LLM labels the chart once now.
+    """
+    try:
+        data = request.get_json() or {}
+        conversation_id = data.get("conversation_id")
+        if not isinstance(conversation_id, int):
+            return jsonify({"error": "conversation_id is required"}), 400
+        chart = chart_refresher.pin(
+            conversation_id,
+            title=data.get("title"),
+            labels=data.get("labels"),
+            chart=data.get("formatted_data_for_visualization"),
+        )
+        return jsonify({"chart": chart}), 201
+    except (LookupError, DatabaseNotFound) as e:
+        return jsonify({"error": str(e)}), 404
+    except ChartError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/saved-charts", methods=["GET"])
+def list_saved_charts():
+    """Saved charts of the database given as ?uuid=."""
+    database_uuid = request.args.get("uuid")
+    if not database_uuid:
+        return jsonify({"error": "uuid is required"}), 400
+    try:
+        return jsonify({"charts": conversation_manager.get_saved_charts(database_uuid)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/saved-charts/<chart_id>", methods=["DELETE"])
+def delete_saved_chart(chart_id):
+    """Delete a saved chart."""
+    try:
+        if not conversation_manager.delete_saved_chart(chart_id):
+            return jsonify({"error": "Chart not found"}), 404
+        return jsonify({"deleted": chart_id})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/saved-charts/<chart_id>/refresh", methods=["POST"])
+def refresh_saved_chart(chart_id):
+    """Re-run a saved chart's SQL and format it with its pinned labels, without the LLM."""
+    try:
+        chart = conversation_manager.get_saved_chart(chart_id)
+        if chart is None:
+            return jsonify({"error": "Chart not found"}), 404
+        if not upload_store.exists(chart["database_uuid"]):
+            return jsonify({"error": "Database not found"}), 404
+        data = request.get_json(silent=True) or {}
+        result = chart_refresher.refresh(chart, data.get("chart_encoding"))
+        return jsonify(result), 500 if result["error"] else 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/saved-charts/refresh", methods=["POST"])
+def refresh_saved_charts():
+    """Refresh many saved charts concurrently, e.g. for a scheduled dashboard.
+
+    Takes {"chart_ids": [...]} or {"uuid"} for every chart of a database,
+    and an optional "chart_encoding". Returns one result per chart; a chart
+    that fails carries its error and does not fail the others.
+    """
+    try:
+        data = request.get_json() or {}
+        started = time.perf_counter()
+        if isinstance(data.get("chart_ids"), list):
+            charts = conversation_manager.get_saved_charts(chart_ids=data["chart_ids"])
+        elif data.get("uuid"):
+            charts = conversation_manager.get_saved_charts(data["uuid"])
+        else:
+            return jsonify({"error": "chart_ids or uuid is required"}), 400
+
+        results = chart_refresher.refresh_many(charts, data.get("chart_encoding"))
+        return jsonify(
+            {
+                "charts": results,
+                "refreshed": sum(1 for result in results if not result["error"]),
+                "errors": sum(1 for result in results if result["error"]),
+                "total_ms": round((time.perf_counter() - started) * 1000, 2),
+            }
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/index-advisor/<uuid>", methods=["GET"])
+def get_index_advice(uuid):
+    """Indexes the advisor maintains on a database and its recent runs.
+
+    Each run lists the scored candidates, what was created or dropped, and the
+    logged queries' times before and after the change.
+    """
+    try:
+        if not upload_store.exists(uuid):
+            return jsonify({"error": "Database not found"}), 404
+        return jsonify({"advisor": index_advisor.report(uuid)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/index-advisor/<uuid>/run", methods=["POST"])
+def run_index_advisor(uuid):
+    """Run the index advisor on a database now instead of waiting for the worker."""
+    try:
+        if not upload_store.exists(uuid):
+            return jsonify({"error": "Database not found"}), 404
+        return jsonify({"run": index_advisor.advise(uuid)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/aggregate-cache/<uuid>", methods=["GET"])
+def get_aggregate_summaries(uuid):
+    """Summary tables materialized for a database's recurring aggregate queries."""
+    try:
+        if not upload_store.exists(uuid):
+            return jsonify({"error": "Database not found"}), 404
+        summaries = aggregate_cache.summaries(uuid) if aggregate_cache else []
+        return jsonify({"summaries": summaries})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/samples/<uuid>", methods=["GET"])
+def get_samples(uuid):
+    """Sampled tables of a database, with their sampling fraction and sizes."""
+    try:
+        if not upload_store.exists(uuid):
+            return jsonify({"error": "Database not found"}), 404
+        samples = sample_store.samples(uuid) if sample_store else []
+        return jsonify({"samples": samples})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/storage", methods=["GET"])
+def get_storage_usage():
+    """Disk used by uploaded databases and by the conversation store."""
+    try:
+        return jsonify(
+            {
+                "uploads": upload_retention.usage(),
+                "conversations": conversation_manager.get_storage_usage(),
+            }
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/storage/conversations/compact", methods=["POST"])
+def compact_conversations():
+    """Shrink conversations.sqlite, converting it to incremental auto-vacuum if needed."""
+    try:
+        return jsonify({"conversations": conversation_manager.compact()})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus metrics: request, graph node, LLM, database and store latencies."""
+    body, content_type = Metrics.render()
+    return Response(body, content_type=content_type)
+
+
 @app.route("/health", methods=["GET"])
 def health_check():
     """Health check endpoint."""
     return jsonify({"status": "healthy"})
 
 
+@app.route("/ready", methods=["GET"])
+def readiness_check():
+    """Readiness endpoint: 503 until this worker can serve, and while draining."""
+    checks = {"shutting_down": _shutting_down}
+    try:
+        conversation_manager.ping()
+        checks["conversation_db"] = True
+    except Exception:
+        checks["conversation_db"] = False
+    checks["upload_dir"] = os.access(UPLOAD_DIR, os.W_OK)
+    if _preload_graph():
+        checks["graph"] = get_graph.cache_info().currsize > 0
+
+    ready = not _shutting_down and all(
+        value for name, value in checks.items() if name != "shutting_down"
+    )
+    return jsonify({"status": "ready" if ready else "not_ready", "checks": checks}), (
+        200 if ready else 503
+    )
+
+
+def _preload_graph():
+    return os.environ.get("PRELOAD_GRAPH", "false").lower() == "true"
+
+
+def warm_up():
+    """Load ahead of time what the first requests would otherwise wait for.
+
+    Called before forking workers so they share the loaded modules. Unless
+    PRELOAD_MODULES=false, imports the upload libraries and builds the agent
+    graph; with PRELOAD_GRAPH=true it also creates the LLM client, which
+    needs GOOGLE_API_KEY.
+    """
+    if os.environ.get("PRELOAD_MODULES", "true").lower() != "false":
+        DataIngestor.preload()
+        get_graph()
+    if _preload_graph():
+        get_graph()
+        get_workflow().llm_manager.warm_up()
+
+
+def start_background_workers():
+    """Start per-process background work; call once in each serving process."""
+    # Deleting history is opt-in
+    if os.environ.get("CONVERSATION_RETENTION_ENABLED", "false").lower() == "true":
+        conversation_retention.start()
+    if os.environ.get("INDEX_ADVISOR_ENABLED", "true").lower() != "false":
+        index_advisor.start()
+    if os.environ.get("UPLOAD_RETENTION_ENABLED", "true").lower() != "false":
+        upload_retention.start()
+
+
+def start_draining():
+    """Make /ready report this process as shutting down."""
+    global _shutting_down
+    _shutting_down = True
+
+
+def shutdown():
+    """Stop background work and flush pending conversation writes."""
+    start_draining()
+    conversation_retention.stop()
+    index_advisor.stop()
+    upload_retention.stop()
+    conversation_manager.close()
+    upload_store.close()
+
+
 if __name__ == "__main__":
+    # Development server; use gunicorn -c gunicorn.conf.py wsgi:app in production
+    start_background_workers()
     port = int(os.environ.get("PORT", 5001))
     app.run(host="0.0.0.0", port=port, debug=True)
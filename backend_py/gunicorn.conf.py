@@ -0,0 +1,82 @@
+"""Gunicorn configuration for serving conversation_api in production.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every setting can be overridden through the environment variables below.
+"""
+import multiprocessing
+import os
+import shutil
+import signal
+import threading
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5001)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Requests mostly wait on the LLM and SQLite, so each worker also runs threads
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+# LLM-backed requests can take a while
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+# On SIGTERM a worker reports draining on /ready, then keeps accepting
+# requests this long so load balancers stop routing to it first; counts
+# against graceful_timeout
+drain_seconds = float(os.environ.get("GUNICORN_DRAIN_SECONDS", 0))
+keepalive = 5
+# Import the app (and the graph, with PRELOAD_GRAPH=true) once before forking
+preload_app = True
+accesslog = "-"
+errorlog = "-"
+
+# Workers write metrics here for /metrics to aggregate; start from empty,
+# before the app (and its metrics) is imported
+_metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if _metrics_dir:
+    shutil.rmtree(_metrics_dir, ignore_errors=True)
+    os.makedirs(_metrics_dir)
+
+
+def pre_fork(server, worker):
+    import conversation_api
+
+    # Workers must not inherit the master's open SQLite connections
+    conversation_api.conversation_manager.close_connections()
+    conversation_api.upload_store.close()
+
+
+def post_fork(server, worker):
+    import conversation_api
+
+    conversation_api.start_background_workers()
+
+
+def post_worker_init(worker):
+    import conversation_api
+
+    # Gunicorn stops accepting connections as soon as SIGTERM arrives, so
+    # draining has to start in the signal handler, not in worker_exit
+    stop_accepting = signal.getsignal(signal.SIGTERM)
+
+    def handle_term(signum, frame):
+        conversation_api.start_draining()
+        if drain_seconds > 0:
+            threading.Timer(drain_seconds, stop_accepting, (signum, frame)).start()
+        else:
+            stop_accepting(signum, frame)
+
+    signal.signal(signal.SIGTERM, handle_term)
+    signal.siginterrupt(signal.SIGTERM, False)
+
+
+def worker_int(worker):
+    import conversation_api
+
+    # SIGINT/SIGQUIT: the worker exits right after this
+    conversation_api.start_draining()
+
+
+def worker_exit(server, worker):
+    import conversation_api
+
+    # Flush write-behind conversation entries before the worker goes away
+    conversation_api.shutdown()
@@ -0,0 +1,35 @@
+-- Keyset pagination for conversation history and recent questions
+
+-- Serves WHERE session_id = ? ORDER BY timestamp DESC, id DESC as an index range scan
+CREATE INDEX IF NOT EXISTS idx_conversations_session_timestamp ON conversations(session_id, timestamp, id);
+DROP INDEX IF EXISTS idx_conversations_session_id;
+
+-- One row per distinct question per database, maintained on insert
+CREATE TABLE IF NOT EXISTS recent_questions (
+    database_uuid TEXT NOT NULL,
+    question TEXT NOT NULL,
+    last_asked TIMESTAMP NOT NULL,
+    last_id INTEGER NOT NULL,
+    PRIMARY KEY (database_uuid, question)
+) WITHOUT ROWID;
+
+-- Covering index for the newest-first recent questions page
+CREATE INDEX IF NOT EXISTS idx_recent_questions_database_last_asked ON recent_questions(database_uuid, last_asked, last_id, question);
+
+CREATE TRIGGER IF NOT EXISTS trg_conversations_recent_questions
+AFTER INSERT ON conversations
+WHEN NEW.database_uuid IS NOT NULL AND NEW.question IS NOT NULL
+BEGIN
+    INSERT INTO recent_questions (database_uuid, question, last_asked, last_id)
+    VALUES (NEW.database_uuid, NEW.question, NEW.timestamp, NEW.id)
+    ON CONFLICT (database_uuid, question) DO UPDATE SET
+        last_asked = excluded.last_asked,
+        last_id = excluded.last_id;
+END;
+
+-- Backfill from existing history
+INSERT OR REPLACE INTO recent_questions (database_uuid, question, last_asked, last_id)
+SELECT database_uuid, question, MAX(timestamp), MAX(id)
+FROM conversations
+WHERE database_uuid IS NOT NULL AND question IS NOT NULL
+GROUP BY database_uuid, question;
@@ -0,0 +1,74 @@
+-- Materialized usage counters, maintained by triggers on conversations
+
+CREATE TABLE IF NOT EXISTS session_usage (
+    session_id TEXT PRIMARY KEY,
+    total_conversations INTEGER NOT NULL DEFAULT 0,
+    failed_conversations INTEGER NOT NULL DEFAULT 0,
+    first_conversation TIMESTAMP,
+    last_conversation TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS database_usage (
+    database_uuid TEXT PRIMARY KEY,
+    total_conversations INTEGER NOT NULL DEFAULT 0,
+    failed_conversations INTEGER NOT NULL DEFAULT 0,
+    first_conversation TIMESTAMP,
+    last_conversation TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS database_visualization_usage (
+    database_uuid TEXT NOT NULL,
+    visualization_type TEXT NOT NULL,
+    total_conversations INTEGER NOT NULL DEFAULT 0,
+    failed_conversations INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (database_uuid, visualization_type)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_conversations_session_usage
+AFTER INSERT ON conversations
+BEGIN
+    INSERT INTO session_usage (session_id, total_conversations, failed_conversations, first_conversation, last_conversation)
+    VALUES (NEW.session_id, 1, NEW.error_message IS NOT NULL, NEW.timestamp, NEW.timestamp)
+    ON CONFLICT (session_id) DO UPDATE SET
+        total_conversations = total_conversations + 1,
+        failed_conversations = failed_conversations + excluded.failed_conversations,
+        first_conversation = MIN(first_conversation, excluded.first_conversation),
+        last_conversation = MAX(last_conversation, excluded.last_conversation);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_conversations_database_usage
+AFTER INSERT ON conversations
+WHEN NEW.database_uuid IS NOT NULL
+BEGIN
+    INSERT INTO database_usage (database_uuid, total_conversations, failed_conversations, first_conversation, last_conversation)
+    VALUES (NEW.database_uuid, 1, NEW.error_message IS NOT NULL, NEW.timestamp, NEW.timestamp)
+    ON CONFLICT (database_uuid) DO UPDATE SET
+        total_conversations = total_conversations + 1,
+        failed_conversations = failed_conversations + excluded.failed_conversations,
+        first_conversation = MIN(first_conversation, excluded.first_conversation),
+        last_conversation = MAX(last_conversation, excluded.last_conversation);
+
+    INSERT INTO database_visualization_usage (database_uuid, visualization_type, total_conversations, failed_conversations)
+    VALUES (NEW.database_uuid, COALESCE(NEW.visualization_type, 'none'), 1, NEW.error_message IS NOT NULL)
+    ON CONFLICT (database_uuid, visualization_type) DO UPDATE SET
+        total_conversations = total_conversations + 1,
+        failed_conversations = failed_conversations + excluded.failed_conversations;
+END;
+
+-- Backfill from existing history
+INSERT INTO session_usage
+SELECT session_id, COUNT(*), COUNT(error_message), MIN(timestamp), MAX(timestamp)
+FROM conversations
+GROUP BY session_id;
+
+INSERT INTO database_usage
+SELECT database_uuid, COUNT(*), COUNT(error_message), MIN(timestamp), MAX(timestamp)
+FROM conversations
+WHERE database_uuid IS NOT NULL
+GROUP BY database_uuid;
+
+INSERT INTO database_visualization_usage
+SELECT database_uuid, COALESCE(visualization_type, 'none'), COUNT(*), COUNT(error_message)
+FROM conversations
+WHERE database_uuid IS NOT NULL
+GROUP BY database_uuid, COALESCE(visualization_type, 'none');
@@ -0,0 +1,21 @@
+-- Saved charts: a conversation turn pinned so it can be refreshed without the LLM
+
+-- The chart keeps its own copy of the turn's question, SQL and chart type, so
+-- it outlives conversation retention; labels hold the LLM-chosen axis and
+-- series labels (JSON) and column_count the result shape they belong to
+CREATE TABLE IF NOT EXISTS saved_charts (
+    chart_id TEXT PRIMARY KEY,
+    conversation_id INTEGER,
+    database_uuid TEXT NOT NULL,
+    title TEXT,
+    question TEXT NOT NULL,
+    sql_query TEXT NOT NULL,
+    visualization_type TEXT NOT NULL,
+    column_count INTEGER NOT NULL,
+    labels TEXT NOT NULL DEFAULT '{}',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_refreshed TIMESTAMP,
+    last_error TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_saved_charts_database_created ON saved_charts(database_uuid, created_at);
@@ -0,0 +1,74 @@
+-- Keep the usage counters in step with deletes (retention, storage budgets)
+
+-- First/last conversation of a database are looked up again when a delete
+-- removes the boundary turn
+CREATE INDEX IF NOT EXISTS idx_conversations_database_timestamp ON conversations(database_uuid, timestamp);
+DROP INDEX IF EXISTS idx_conversations_database_uuid;
+
+CREATE TRIGGER IF NOT EXISTS trg_conversations_session_usage_delete
+AFTER DELETE ON conversations
+BEGIN
+    UPDATE session_usage SET
+        total_conversations = total_conversations - 1,
+        failed_conversations = failed_conversations - (OLD.error_message IS NOT NULL),
+        first_conversation = CASE WHEN first_conversation = OLD.timestamp
+            THEN (SELECT MIN(timestamp) FROM conversations WHERE session_id = OLD.session_id)
+            ELSE first_conversation END,
+        last_conversation = CASE WHEN last_conversation = OLD.timestamp
+            THEN (SELECT MAX(timestamp) FROM conversations WHERE session_id = OLD.session_id)
+            ELSE last_conversation END
+    WHERE session_id = OLD.session_id;
+
+    DELETE FROM session_usage WHERE session_id = OLD.session_id AND total_conversations <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_conversations_database_usage_delete
+AFTER DELETE ON conversations
+WHEN OLD.database_uuid IS NOT NULL
+BEGIN
+    UPDATE database_usage SET
+        total_conversations = total_conversations - 1,
+        failed_conversations = failed_conversations - (OLD.error_message IS NOT NULL),
+        first_conversation = CASE WHEN first_conversation = OLD.timestamp
+            THEN (SELECT MIN(timestamp) FROM conversations WHERE database_uuid = OLD.database_uuid)
+            ELSE first_conversation END,
+        last_conversation = CASE WHEN last_conversation = OLD.timestamp
+            THEN (SELECT MAX(timestamp) FROM conversations WHERE database_uuid = OLD.database_uuid)
+            ELSE last_conversation END
+    WHERE database_uuid = OLD.database_uuid;
+
+    DELETE FROM database_usage WHERE database_uuid = OLD.database_uuid AND total_conversations <= 0;
+
+    UPDATE database_visualization_usage SET
+        total_conversations = total_conversations - 1,
+        failed_conversations = failed_conversations - (OLD.error_message IS NOT NULL)
+    WHERE database_uuid = OLD.database_uuid
+      AND visualization_type = COALESCE(OLD.visualization_type, 'none');
+
+    DELETE FROM database_visualization_usage
+    WHERE database_uuid = OLD.database_uuid
+      AND visualization_type = COALESCE(OLD.visualization_type, 'none')
+      AND total_conversations <= 0;
+END;
+
+-- Counters drifted by deletes made before these triggers: recount them
+DELETE FROM session_usage;
+DELETE FROM database_usage;
+DELETE FROM database_visualization_usage;
+
+INSERT INTO session_usage
+SELECT session_id, COUNT(*), COUNT(error_message), MIN(timestamp), MAX(timestamp)
+FROM conversations
+GROUP BY session_id;
+
+INSERT INTO database_usage
+SELECT database_uuid, COUNT(*), COUNT(error_message), MIN(timestamp), MAX(timestamp)
+FROM conversations
+WHERE database_uuid IS NOT NULL
+GROUP BY database_uuid;
+
+INSERT INTO database_visualization_usage
+SELECT database_uuid, COALESCE(visualization_type, 'none'), COUNT(*), COUNT(error_message)
+FROM conversations
+WHERE database_uuid IS NOT NULL
+GROUP BY database_uuid, COALESCE(visualization_type, 'none');
@@ -0,0 +1,10 @@
+-- Edits of a session's turns, so per-process caches can tell a session changed
+-- without its turn count or latest turn moving
+
+ALTER TABLE session_usage ADD COLUMN revised INTEGER NOT NULL DEFAULT 0;
+
+CREATE TRIGGER IF NOT EXISTS trg_conversations_session_revised
+AFTER UPDATE OF question, sql_query, results_summary ON conversations
+BEGIN
+    UPDATE session_usage SET revised = revised + 1 WHERE session_id = NEW.session_id;
+END;
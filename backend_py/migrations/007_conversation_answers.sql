@@ -0,0 +1,4 @@
+-- The answer shown for each turn, so a progressive answer's exact rewrite can
+-- replace the estimate it was first given
+
+ALTER TABLE conversations ADD COLUMN answer TEXT;
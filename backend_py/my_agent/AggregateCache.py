@@ -0,0 +1,425 @@
+import json
+import os
+import queue
+import sqlite3
+import stat
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.request import pathname2url
+
+from my_agent.QueryAnalyzer import AggregateQuery, aggregate_query, table_columns
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+# How each aggregate is recomputed from per-group partial results
+_REAGGREGATE = {
+    "SUM": "SUM({})",
+    "TOTAL": "TOTAL({})",
+    "MIN": "MIN({})",
+    "MAX": "MAX({})",
+    "COUNT": "COALESCE(SUM({}), 0)",
+}
+# A query repeated within this window (a retried question) counts once
+_REPEAT_WINDOW_S = 10.0
+
+
+class _Summary:
+    __slots__ = ("name", "table", "base", "group", "parts")
+
+    def __init__(self, name, table, base, group, parts):
+        self.name = name
+        self.table = table
+        self.base = base  # frozenset of rendered WHERE conjuncts
+        self.group = group  # tuple of group columns
+        self.parts = parts  # (function, argument, distinct) -> summary column
+
+
+class AggregateCache:
+    """Summary tables for recurring aggregate queries on uploaded databases.
+
+    Single-table GROUP BY queries are reduced to a shape: table, the WHERE
+    conditions on non-grouped columns, and the group columns. Once a shape has
+    been seen min_hits times on a table of at least min_rows rows, a
+    background thread materializes it into the database's summaries.sqlite
+    sidecar (the upload itself is read-only). Shapes are counted and
+    summaries shared per content, across every uuid it was uploaded as.
+    Later queries are answered from a summary when they can be derived from
+    it: same base conditions, group columns a subset of the summary's
+    (re-aggregating SUM/COUNT/MIN/MAX/TOTAL/AVG when coarser), extra filters
+    only on group columns, any HAVING/ORDER BY/LIMIT.
+
+    Summaries are tied to UploadStore.version(); a re-upload deletes them and
+    any version mismatch makes them invisible until rebuilt. A rewrite that
+    fails falls back to the original query.
+    """
+
+    def __init__(self, upload_store, min_hits: int = None, min_rows: int = None, max_summaries: int = None):
+        self.upload_store = upload_store
+        self.min_hits = min_hits or int(os.getenv("AGG_CACHE_MIN_HITS", 2))
+        self.min_rows = min_rows if min_rows is not None else int(os.getenv("AGG_CACHE_MIN_ROWS", 10000))
+        self.max_summaries = max_summaries or int(os.getenv("AGG_CACHE_MAX_SUMMARIES", 20))
+        self._lock = threading.Lock()
+        self._tables = {}  # (content id, version) -> table columns
+        self._summaries = {}  # content id -> (file signature, [_Summary])
+        self._shapes = {}  # (content id, version, shape) -> [hits, parts, queued]
+        self._recent = {}  # (content id, query) -> monotonic time last seen
+        self._builds = None
+        self._thread = None
+        self._pid = None
+
+    def execute(self, uuid: str, query: str) -> Optional[List[list]]:
+        """Rows for query from a summary table, or None to run it as usual."""
+        content_id = self.upload_store.content_id(uuid)
+        version = self.upload_store.version(uuid)
+        parsed = aggregate_query(query, self._table_columns(uuid, content_id, version))
+        if parsed is None:
+            return None
+
+        for summary in self._load(uuid, content_id, version):
+            sql = _rewrite(parsed, summary)
+            if sql is None:
+                continue
+            try:
+                conn = sqlite3.connect(f"file:{pathname2url(self.path(uuid))}?mode=ro", uri=True)
+                try:
+                    return [list(row) for row in conn.execute(sql).fetchall()]
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"Error reading summary {summary.name}, running original query: {e}")
+                break
+
+        self._observe(uuid, content_id, version, query, parsed)
+        return None
+
+    def path(self, uuid: str) -> str:
+        return self.upload_store.sidecar_path(uuid, "summaries.sqlite")
+
+    def summaries(self, uuid: str) -> List[Dict]:
+        """Summary tables kept for a database, for inspection."""
+        if not os.path.exists(self.path(uuid)):
+            return []
+        conn = sqlite3.connect(f"file:{pathname2url(self.path(uuid))}?mode=ro", uri=True)
+        try:
+            rows = conn.execute(
+                "SELECT name, source_table, base, group_columns, parts, row_count, "
+                "source_rows, status, built_at FROM summaries ORDER BY built_at"
+            ).fetchall()
+        except sqlite3.OperationalError:
+            return []
+        finally:
+            conn.close()
+        keys = ("name", "table", "where", "group_by", "aggregates", "rows", "source_rows", "status", "built_at")
+        result = []
+        for row in rows:
+            entry = dict(zip(keys, row))
+            for key in ("where", "group_by", "aggregates"):
+                entry[key] = json.loads(entry[key])
+            result.append(entry)
+        return result
+
+    def _table_columns(self, uuid: str, content_id: str, version: str):
+        key = (content_id, version)
+        tables = self._tables.get(key)
+        if tables is None:
+            with self.upload_store.connection(uuid) as conn:
+                tables = table_columns(conn)
+            with self._lock:
+                self._tables = {k: v for k, v in self._tables.items() if k[0] != content_id}
+                self._tables[key] = tables
+        return tables
+
+    def _load(self, uuid: str, content_id: str, version: str) -> List[_Summary]:
+        """Usable summaries for uuid, re-read when the summaries file changes."""
+        try:
+            info = os.stat(self.path(uuid))
+        except FileNotFoundError:
+            return []
+        signature = (version, info.st_ino, info.st_mtime_ns, info.st_size)
+        cached = self._summaries.get(content_id)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        summaries = []
+        try:
+            conn = sqlite3.connect(f"file:{pathname2url(self.path(uuid))}?mode=ro", uri=True)
+            try:
+                stored = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+                if stored and stored[0] == version:
+                    for name, table, base, group, parts in conn.execute(
+                        "SELECT name, source_table, base, group_columns, parts FROM summaries WHERE status = 'ready'"
+                    ):
+                        summaries.append(
+                            _Summary(
+                                name,
+                                table,
+                                frozenset(json.loads(base)),
+                                tuple(json.loads(group)),
+                                {(f, arg, bool(d)): column for f, arg, d, column in json.loads(parts)},
+                            )
+                        )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Error loading summaries for {uuid}: {e}")
+        with self._lock:
+            self._summaries[content_id] = (signature, summaries)
+        return summaries
+
+    def _observe(self, uuid: str, content_id: str, version: str, query: str, parsed: AggregateQuery):
+        now = time.monotonic()
+        shape = _shape(parsed)
+        parts = set()
+        for call in parsed.aggregates:
+            parts.update(_parts(call.key))
+        with self._lock:
+            last = self._recent.get((content_id, query))
+            self._recent[(content_id, query)] = now
+            if len(self._recent) > 4096:
+                self._recent = {k: t for k, t in self._recent.items() if now - t < _REPEAT_WINDOW_S}
+            if last is not None and now - last < _REPEAT_WINDOW_S:
+                return
+            entry = self._shapes.setdefault((content_id, version, shape), [0, set(), False])
+            entry[0] += 1
+            new_parts = not parts <= entry[1]
+            entry[1] |= parts
+            if entry[0] < self.min_hits or (entry[2] and not new_parts):
+                return
+            entry[2] = True
+            parts = set(entry[1])
+        self._enqueue((uuid, version, shape, parts))
+
+    def _enqueue(self, job):
+        if self._thread is None or self._pid != os.getpid():
+            with self._lock:
+                if self._thread is None or self._pid != os.getpid():
+                    self._builds = queue.Queue()
+                    self._pid = os.getpid()
+                    self._thread = threading.Thread(target=self._run, name="aggregate-cache", daemon=True)
+                    self._thread.start()
+        self._builds.put(job)
+
+    def _run(self):
+        while True:
+            uuid, version, shape, parts = self._builds.get()
+            try:
+                self.build(uuid, version, shape, parts)
+            except Exception as e:
+                print(f"Error building summary for {uuid}: {e}")
+
+    def build(self, uuid: str, version: str, shape, parts) -> Optional[str]:
+        """Materialize a shape into the summaries file; returns the table name."""
+        table, base, group = shape
+        if self.upload_store.version(uuid) != version:
+            return None
+        lock_file = None
+        if fcntl is not None:
+            lock_file = open(self.path(uuid) + ".lock", "w")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            conn = sqlite3.connect(
+                f"file:{pathname2url(self.path(uuid))}", uri=True, isolation_level=None
+            )
+            try:
+                return self._build(conn, uuid, version, table, base, group, parts)
+            finally:
+                conn.close()
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+
+    def _build(self, conn, uuid, version, table, base, group, parts):
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS summaries (
+                name TEXT PRIMARY KEY,
+                source_table TEXT NOT NULL,
+                base TEXT NOT NULL,
+                group_columns TEXT NOT NULL,
+                parts TEXT NOT NULL,
+                row_count INTEGER,
+                source_rows INTEGER,
+                status TEXT NOT NULL,
+                built_at TIMESTAMP
+            )
+        """
+        )
+        stored = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if stored is None or stored[0] != version:
+            # Built against other data: start over
+            for (name,) in conn.execute("SELECT name FROM summaries").fetchall():
+                conn.execute(f"DROP TABLE IF EXISTS {_quote(name)}")
+            conn.execute("DELETE FROM summaries")
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (version,))
+
+        base_json = json.dumps(sorted(base))
+        group_json = json.dumps(list(group))
+        name = "summary_%08x" % zlib.crc32(f"{table}\0{base_json}\0{group_json}".encode("utf-8"))
+        existing = conn.execute("SELECT parts, status FROM summaries WHERE name = ?", (name,)).fetchone()
+        if existing is not None:
+            if existing[1] == "too_large":
+                return None
+            known = {(f, arg, bool(d)) for f, arg, d, _ in json.loads(existing[0])}
+            if parts <= known:
+                return name
+            parts = parts | known
+
+        source = self.upload_store.path(uuid)
+        immutable = not os.stat(source).st_mode & stat.S_IWUSR
+        conn.execute(
+            "ATTACH DATABASE ? AS src",
+            (f"file:{pathname2url(source)}?mode=ro" + ("&immutable=1" if immutable else ""),),
+        )
+        try:
+            source_rows = conn.execute(f"SELECT COUNT(*) FROM src.{_quote(table)}").fetchone()[0]
+            if source_rows < self.min_rows:
+                return None
+
+            ordered_parts = sorted(parts)
+            columns = [_quote(column) for column in group]
+            columns += [f"{_part_sql(part)} AS a{i}" for i, part in enumerate(ordered_parts)]
+            select = f"SELECT {', '.join(columns)} FROM src.{_quote(table)}"
+            if base:
+                select += " WHERE " + " AND ".join(f"({condition})" for condition in sorted(base))
+            if group:
+                select += " GROUP BY " + ", ".join(_quote(column) for column in group)
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(f"DROP TABLE IF EXISTS {_quote(name)}")
+                conn.execute(f"CREATE TABLE {_quote(name)} AS {select}")
+                row_count = conn.execute(f"SELECT COUNT(*) FROM {_quote(name)}").fetchone()[0]
+                # A summary nearly as big as its table saves nothing
+                status = "ready" if row_count <= max(1000, source_rows // 2) else "too_large"
+                if status != "ready":
+                    conn.execute(f"DROP TABLE {_quote(name)}")
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO summaries
+                    (name, source_table, base, group_columns, parts, row_count, source_rows, status, built_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                    (
+                        name,
+                        table,
+                        base_json,
+                        group_json,
+                        json.dumps([[f, arg, d, f"a{i}"] for i, (f, arg, d) in enumerate(ordered_parts)]),
+                        row_count,
+                        source_rows,
+                        status,
+                        datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                    ),
+                )
+                # Keep the newest max_summaries
+                for (old,) in conn.execute(
+                    "SELECT name FROM summaries WHERE status = 'ready' ORDER BY built_at DESC, name LIMIT -1 OFFSET ?",
+                    (self.max_summaries,),
+                ).fetchall():
+                    conn.execute(f"DROP TABLE IF EXISTS {_quote(old)}")
+                    conn.execute("DELETE FROM summaries WHERE name = ?", (old,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return name if status == "ready" else None
+        finally:
+            conn.execute("DETACH DATABASE src")
+
+
+def _shape(parsed: AggregateQuery) -> Tuple[str, frozenset, tuple]:
+    group = set(parsed.group)
+    base = frozenset(text for text, columns in parsed.conjuncts if not columns <= group)
+    return (parsed.table, base, tuple(sorted(group)))
+
+
+def _parts(key) -> List[Tuple[str, str, bool]]:
+    """Partial aggregates a summary stores to answer an aggregate call."""
+    function, argument, distinct = key
+    if function == "AVG" and not distinct:
+        return [("SUM", argument, False), ("COUNT", argument, False)]
+    return [key]
+
+
+def _part_sql(part) -> str:
+    function, argument, distinct = part
+    return f"{function}({'DISTINCT ' if distinct else ''}{argument})"
+
+
+def _aggregate_sql(key, parts: Dict, exact: bool) -> Optional[str]:
+    """An aggregate call rewritten over summary columns, or None if impossible."""
+    function, argument, distinct = key
+    if distinct or function not in ("AVG", *_REAGGREGATE):
+        # DISTINCT aggregates cannot be combined across groups
+        column = parts.get(key)
+        return _quote(column) if column and exact else None
+    if function == "AVG":
+        total = parts.get(("SUM", argument, False))
+        count = parts.get(("COUNT", argument, False))
+        if total is None or count is None:
+            return None
+        if exact:
+            return f"(CAST({_quote(total)} AS REAL) / {_quote(count)})"
+        return f"(CAST(SUM({_quote(total)}) AS REAL) / SUM({_quote(count)}))"
+    column = parts.get(key)
+    if column is None:
+        return None
+    return _quote(column) if exact else _REAGGREGATE[function].format(_quote(column))
+
+
+def _rewrite(parsed: AggregateQuery, summary: _Summary) -> Optional[str]:
+    """The query over a summary table, or None if the summary cannot answer it."""
+    if parsed.table != summary.table:
+        return None
+    group = set(parsed.group)
+    available = set(summary.group)
+    if not group <= available:
+        return None
+    base, filters = set(), []
+    for text, columns in parsed.conjuncts:
+        if columns <= available:
+            filters.append(text)
+        else:
+            base.add(text)
+    if base != summary.base:
+        return None
+
+    exact = group == available
+    replacements = {}
+    for call in parsed.aggregates:
+        text = _aggregate_sql(call.key, summary.parts, exact)
+        if text is None:
+            return None
+        replacements[call.start] = (call.end, text)
+
+    sql = f"SELECT {parsed.render(*parsed.select, replacements)} FROM {_quote(summary.name)}"
+    having = parsed.render(*parsed.having, replacements) if parsed.having else None
+    if exact and having:
+        # One row per group already: HAVING becomes a plain filter
+        filters.append(having)
+        having = None
+    if filters:
+        sql += " WHERE " + " AND ".join(f"({condition})" for condition in filters)
+    if not exact and parsed.group:
+        sql += " GROUP BY " + ", ".join(_quote(column) for column in parsed.group)
+    if having:
+        sql += f" HAVING {having}"
+    if parsed.order:
+        sql += f" ORDER BY {parsed.render(*parsed.order, replacements)}"
+    elif parsed.group:
+        sql += " ORDER BY " + ", ".join(_quote(column) for column in parsed.group)
+    if parsed.limit:
+        sql += f" LIMIT {parsed.render(*parsed.limit)}"
+    return sql
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
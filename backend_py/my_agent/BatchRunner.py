@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List
+
+from my_agent.DatabaseManager import DatabaseManager
+from my_agent.RequestTimer import RequestTimer, timed
+
+
+class SharedDatabaseManager(DatabaseManager):
+    """Database access shared by the questions of one batch.
+
+    Wraps the process's database manager so the schema is fetched once and
+    every distinct query (noun lookups, the generated SQL) executes once,
+    however many questions ask for it. A caller asking for a query that is
+    still running waits for that run instead of starting another.
+    """
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+        self.endpoint_url = db_manager.endpoint_url
+        self.queries_run = 0
+        self.queries_shared = 0
+        self._results: Dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+
+    def get_schema(self, uuid: str) -> str:
+        return self._once(("schema", uuid), lambda: self.db_manager.get_schema(uuid))
+
+    def execute_query(self, uuid: str, query: str) -> List[Any]:
+        rows = self._once(
+            ("query", uuid, _normalize(query)),
+            lambda: self.db_manager.execute_query(uuid, query),
+            count=True,
+        )
+        # Each question gets its own list; the rows themselves are not modified
+        return list(rows)
+
+    def _once(self, key: tuple, fn: Callable[[], Any], count: bool = False):
+        with self._lock:
+            future = self._results.get(key)
+            owner = future is None
+            if owner:
+                future = self._results[key] = Future()
+            if count:
+                if owner:
+                    self.queries_run += 1
+                else:
+                    self.queries_shared += 1
+
+        if owner:
+            try:
+                future.set_result(fn())
+            except Exception as e:
+                future.set_exception(e)
+            return future.result()
+        with timed("sql"):
+            return future.result()
+
+
+class BatchConversation:
+    """A conversation manager as the questions of one batch see it.
+
+    The context is the conversation as it was when the batch began, so
+    questions answered earlier in the batch do not become context for the
+    ones still running; everything else goes to the real manager.
+    """
+
+    def __init__(self, conversation_manager, session_id: str):
+        self._manager = conversation_manager
+        self._session_id = session_id
+        self._context = conversation_manager.get_conversation_context(session_id)
+
+    def get_conversation_context(self, session_id: str) -> str:
+        if session_id == self._session_id:
+            return self._context
+        return self._manager.get_conversation_context(session_id)
+
+    def __getattr__(self, name):
+        return getattr(self._manager, name)
+
+
+class BatchRunner:
+    """Answers many questions about one database as a batch.
+
+    The questions run through one graph that shares a SharedDatabaseManager,
+    at most max_concurrency at a time, so their LLM calls overlap while the
+    per-database work is done once. All questions are saved to one session,
+    and each sees the context that session had before the batch.
+    """
+
+    def __init__(
+        self,
+        workflow_factory: Callable,
+        db_manager: DatabaseManager,
+        conversation_manager,
+        max_concurrency: int = None,
+    ):
+        # workflow_factory(db_manager, conversation_manager) -> WorkflowManager
+        self.workflow_factory = workflow_factory
+        self.db_manager = db_manager
+        self.conversation_manager = conversation_manager
+        self.max_concurrency = max_concurrency or int(os.getenv("BATCH_MAX_CONCURRENCY", 4))
+
+    def run(
+        self,
+        uuid: str,
+        questions: List[str],
+        session_id: str = None,
+        chart_encoding: str = None,
+        max_concurrency: int = None,
+    ) -> Iterator[Dict]:
+        """Yield each question's final graph state as soon as it is answered.
+
+        Every item carries the question's index and a timing summary; a
+        question that fails yields its error instead of ending the batch.
+        The last item is a summary with "done" set.
+        """
+        started = time.perf_counter()
+        shared = SharedDatabaseManager(self.db_manager)
+        # Fails fast for an unknown database, before any LLM call
+        shared.get_schema(uuid)
+        session_id = session_id or self.conversation_manager.create_session(uuid)
+        conversation = BatchConversation(self.conversation_manager, session_id)
+        graph = self.workflow_factory(shared, conversation).returnGraph()
+
+        def answer(index: int, question: str) -> Dict:
+            initial = {"question": question, "uuid": uuid, "session_id": session_id}
+            if chart_encoding:
+                initial["chart_encoding"] = chart_encoding
+            with RequestTimer.collect() as timer:
+                try:
+                    result = graph.invoke(initial)
+                except Exception as e:
+                    result = {"error": str(e), "session_id": session_id}
+                return {**result, "index": index, "question": question, "timings": timer.summary()}
+
+        workers = min(max_concurrency or self.max_concurrency, self.max_concurrency, len(questions))
+        pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ask-batch")
+        errors = 0
+        try:
+            futures = [pool.submit(answer, i, q) for i, q in enumerate(questions)]
+            for future in as_completed(futures):
+                result = future.result()
+                errors += bool(result.get("error"))
+                yield result
+        finally:
+            # A client that went away does not need the questions not started
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        yield {
+            "done": True,
+            "questions": len(questions),
+            "errors": errors,
+            "session_id": session_id,
+            "queries_run": shared.queries_run,
+            "queries_shared": shared.queries_shared,
+            "total_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+
+def _normalize(query: str) -> str:
+    """Query text without surrounding whitespace or a trailing semicolon."""
+    return query.strip().rstrip(";").rstrip()
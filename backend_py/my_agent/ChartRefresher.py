@@ -0,0 +1,130 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from my_agent.BatchRunner import SharedDatabaseManager
+from my_agent.DatabaseManager import DatabaseManager
+
+# Chart types DataFormatter.format_pinned renders without the LLM
+PINNABLE = ("bar", "horizontal_bar", "line", "pie", "scatter")
+
+
+class ChartError(Exception):
+    pass
+
+
+class ChartRefresher:
+    """Saves conversation turns as charts and re-renders them without the LLM.
+
+    Saving pins the turn's SQL and chart type together with the labels the
+    LLM chose for it and the number of result columns they belong to. A
+    refresh then re-runs only the SQL and DataFormatter's deterministic
+    path, so it costs one query and no LLM calls. Bulk refreshes run
+    concurrently, and charts sharing a query run it once.
+    """
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        conversation_manager,
+        formatter_factory: Callable,
+        max_concurrency: int = None,
+    ):
+        self.db_manager = db_manager
+        self.conversation_manager = conversation_manager
+        # DataFormatter imports langchain; create it when charts are first used
+        self.formatter_factory = formatter_factory
+        self.max_concurrency = max_concurrency or int(os.getenv("CHART_REFRESH_CONCURRENCY", 8))
+        self._formatter = None
+
+    @property
+    def formatter(self):
+        if self._formatter is None:
+            self._formatter = self.formatter_factory()
+        return self._formatter
+
+    def pin(self, conversation_id: int, title: str = None, labels: Dict = None, chart: Dict = None) -> Dict:
+        """Save a conversation turn as a chart and return the saved chart.
+
+        The labels are, in order of preference: the labels given, those in
+        the turn's chart payload (chart, as /ask returned it), or, when
+        neither is sent, chosen once now by formatting the chart with the LLM.
+        """
+        turn = self.conversation_manager.get_conversation(conversation_id)
+        if turn is None:
+            raise LookupError(f"Conversation {conversation_id} not found")
+        if turn["error_message"] or turn["sql_query"] in (None, "", "NOT_RELEVANT"):
+            raise ChartError("Only turns that ran SQL successfully can be saved")
+        if turn["visualization_type"] not in PINNABLE:
+            raise ChartError(f"Chart type {turn['visualization_type']!r} cannot be saved")
+
+        rows = self.db_manager.execute_query(turn["database_uuid"], turn["sql_query"])
+        if labels is None and chart is not None:
+            labels = self.formatter.chart_labels(turn["visualization_type"], chart)
+        if labels is None and turn["visualization_type"] in ("pie", "scatter"):
+            labels = {}  # their labels come from the data
+        if labels is None:
+            formatted = self.formatter.format_data_for_visualization(
+                {
+                    "visualization": turn["visualization_type"],
+                    "results": rows,
+                    "question": turn["question"],
+                    "sql_query": turn["sql_query"],
+                }
+            )
+            labels = self.formatter.chart_labels(
+                turn["visualization_type"], formatted.get("formatted_data_for_visualization")
+            )
+        return self.conversation_manager.save_chart(
+            turn, len(rows[0]) if rows else 0, labels, title
+        )
+
+    def refresh(self, chart: Dict, chart_encoding: str = None) -> Dict:
+        """Re-render one saved chart from fresh query results."""
+        result = self._render(chart, self.db_manager, chart_encoding)
+        self.conversation_manager.record_chart_refreshes([(chart["chart_id"], result["error"])])
+        return result
+
+    def refresh_many(self, charts: List[Dict], chart_encoding: str = None) -> List[Dict]:
+        """Re-render saved charts concurrently; results are in the order given."""
+        if not charts:
+            return []
+        shared = SharedDatabaseManager(self.db_manager)
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_concurrency, len(charts)), thread_name_prefix="chart-refresh"
+        ) as pool:
+            results = list(pool.map(lambda chart: self._render(chart, shared, chart_encoding), charts))
+        self.conversation_manager.record_chart_refreshes(
+            [(result["chart_id"], result["error"]) for result in results]
+        )
+        return results
+
+    def _render(self, chart: Dict, db_manager: DatabaseManager, chart_encoding: str) -> Dict:
+        started = time.perf_counter()
+        result = {
+            "chart_id": chart["chart_id"],
+            "title": chart["title"],
+            "question": chart["question"],
+            "sql_query": chart["sql_query"],
+            "visualization": chart["visualization_type"],
+            "formatted_data_for_visualization": None,
+            "row_count": None,
+            "error": None,
+        }
+        try:
+            rows = db_manager.execute_query(chart["database_uuid"], chart["sql_query"])
+            if rows and chart["column_count"] and len(rows[0]) != chart["column_count"]:
+                raise ChartError(
+                    f"The query now returns {len(rows[0])} columns; the chart was saved "
+                    f"with {chart['column_count']}"
+                )
+            formatted = self.formatter.format_pinned(
+                chart["visualization_type"], rows, chart["question"], chart["labels"], chart_encoding
+            )
+            result["formatted_data_for_visualization"] = formatted["formatted_data_for_visualization"]
+            result["row_count"] = len(rows)
+        except Exception as e:
+            result["error"] = str(e)
+        result["refresh_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return result
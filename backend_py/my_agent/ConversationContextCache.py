@@ -0,0 +1,132 @@
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Tuple
+
+
+# Loads of a session repeated because turns arrived meanwhile, at most
+_LOAD_ATTEMPTS = 3
+
+
+class _SessionTurns:
+    __slots__ = ("turns", "rendered", "marker")
+
+    def __init__(self, turns, maxlen, marker):
+        self.turns = deque(turns, maxlen=maxlen)
+        self.rendered = None
+        self.marker = marker
+
+
+class ConversationContextCache:
+    """Per-session ring buffer of the last few turns, with LRU eviction.
+
+    Sessions are loaded lazily through load_turns on a miss and kept current by
+    append() (write-through from save_conversation). The rendered context string
+    is memoized until the next turn arrives.
+
+    The cache is per process, so with load_marker every read first checks a
+    cheap per-session marker, (number of turns, time of the latest turn,
+    revision), and reloads the session when another process has changed it.
+    append() advances the marker for the turn it records, from the turn's
+    "timestamp". Without load_marker, turns saved by another process are only
+    seen after the session is evicted here.
+
+    A turn appended while its session is being loaded may or may not be in
+    what the load read, so such a load is discarded and repeated.
+    """
+
+    def __init__(
+        self,
+        load_turns: Callable[[str, int], List[Dict]],
+        render: Callable[[List[Dict]], str],
+        turns: int = 3,
+        max_sessions: int = 1024,
+        load_marker: Callable[[str], Tuple] = None,
+    ):
+        self._load_turns = load_turns
+        self._load_marker = load_marker
+        self._render = render
+        self.turns = turns
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._loads = {}  # session id -> [loads in progress, turns appended meanwhile]
+        self._lock = threading.Lock()
+
+    def get_context(self, session_id: str) -> str:
+        """Rendered context for a session, loading it on a miss or when it changed."""
+        marker = self._marker(session_id)
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None and entry.marker == marker:
+                self._sessions.move_to_end(session_id)
+                if entry.rendered is None:
+                    entry.rendered = self._render(list(entry.turns))
+                return entry.rendered
+
+        for attempt in range(_LOAD_ATTEMPTS):
+            if attempt:
+                marker = self._marker(session_id)
+            with self._lock:
+                load = self._loads.setdefault(session_id, [0, 0])
+                load[0] += 1
+                appended = load[1]
+            try:
+                # Load outside the lock; history comes back newest first
+                turns = list(reversed(self._load_turns(session_id, self.turns)))
+            except Exception:
+                with self._lock:
+                    self._end_load(session_id, load)
+                raise
+            with self._lock:
+                self._end_load(session_id, load)
+                entry = self._sessions.get(session_id)
+                stale = entry is None or entry.marker != marker
+                if stale and load[1] != appended:
+                    continue  # a turn arrived during the load; read again
+                if stale:
+                    entry = _SessionTurns(turns, self.turns, marker)
+                    self._sessions[session_id] = entry
+                    self._evict()
+                self._sessions.move_to_end(session_id)
+                if entry.rendered is None:
+                    entry.rendered = self._render(list(entry.turns))
+                return entry.rendered
+        # Turns keep arriving: answer from the last load without caching it
+        return self._render(turns)
+
+    def append(self, session_id: str, turn: Dict):
+        """Record a new turn for a cached session."""
+        with self._lock:
+            load = self._loads.get(session_id)
+            if load is not None:
+                load[1] += 1
+            entry = self._sessions.get(session_id)
+            # Uncached sessions pick the turn up from SQLite on their next load
+            if entry is None:
+                return
+            entry.turns.append(turn)
+            entry.rendered = None
+            if entry.marker is not None:
+                count, latest, revision = entry.marker
+                timestamp = turn.get("timestamp")
+                entry.marker = (count + 1, max(latest or timestamp, timestamp), revision)
+            self._sessions.move_to_end(session_id)
+
+    def discard(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def _marker(self, session_id: str):
+        return self._load_marker(session_id) if self._load_marker else None
+
+    def _end_load(self, session_id: str, load: List[int]):
+        load[0] -= 1
+        if not load[0]:
+            del self._loads[session_id]
+
+    def _evict(self):
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
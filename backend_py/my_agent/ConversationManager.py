@@ -1,78 +1,189 @@
+import json
+import queue
 import sqlite3
 import uuid
-from typing import List, Dict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, List, Dict, Optional, Set, Tuple, Union
 import os
 
+from my_agent.ConversationContextCache import ConversationContextCache
+from my_agent.ConversationWriter import ConversationWriter
+from my_agent.Metrics import store_operation
+
 
 class ConversationManager:
-    def __init__(self, db_path: str = "conversations.sqlite"):
+    def __init__(
+        self,
+        db_path: str = "conversations.sqlite",
+        pool_size: int = 8,
+        write_behind: bool = None,
+    ):
         """Initialize the conversation manager with database path."""
         self.db_path = db_path
+        # Idle connections are reused across requests and threads
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._pool_pid = os.getpid()
         self.init_database()
 
-    def init_database(self):
-        """Initialize the conversation history database if it doesn't exist."""
-        if not os.path.exists(self.db_path):
-            # Create the database using the schema
-            # Get the path to the schema file (it's in the parent directory)
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            schema_path = os.path.join(
-                os.path.dirname(current_dir), "create_conversations_db.sql"
+        if write_behind is None:
+            write_behind = os.getenv("CONVERSATION_WRITE_BEHIND", "true").lower() != "false"
+        self._writer = (
+            ConversationWriter(
+                self._write_conversations,
+                flush_interval_ms=int(os.getenv("CONVERSATION_FLUSH_INTERVAL_MS", 50)),
+                batch_size=int(os.getenv("CONVERSATION_BATCH_SIZE", 100)),
+                max_pending=int(os.getenv("CONVERSATION_MAX_PENDING", 1000)),
             )
+            if write_behind
+            else None
+        )
+        self._context_cache = ConversationContextCache(
+            self.get_conversation_history,
+            _render_context,
+            turns=3,
+            max_sessions=int(os.getenv("CONVERSATION_CONTEXT_SESSIONS", 1024)),
+            # Other worker processes write to the same sessions
+            load_marker=self._session_marker,
+        )
 
-            with open(schema_path, "r") as f:
-                schema = f.read()
-
-            conn = sqlite3.connect(self.db_path)
-            conn.executescript(schema)
-            conn.close()
+    def _connect(self) -> sqlite3.Connection:
+        """Open a tuned connection: WAL so readers never block on the writer."""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=5.0,
+            check_same_thread=False,  # pooled connections move between threads
+            cached_statements=256,
+        )
+        # Lets retention shrink the file; only takes effect on a new, empty
+        # database (existing ones are converted by compact())
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        """Borrow a pooled connection, returning it to the pool afterwards."""
+        if self._pool_pid != os.getpid():
+            # Forked worker: never reuse connections opened by the parent
+            self._pool = queue.LifoQueue(maxsize=self._pool.maxsize)
+            self._pool_pid = os.getpid()
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def ping(self):
+        """Check that the database can be queried."""
+        with self._connection() as conn:
+            conn.execute("SELECT 1").fetchone()
+
+    def flush(self):
+        """Wait until queued conversation writes are committed."""
+        if self._writer:
+            self._writer.flush()
+
+    def close(self):
+        """Flush queued writes and close all idle pooled connections."""
+        if self._writer:
+            self._writer.close()
+        self.close_connections()
+
+    def close_connections(self):
+        """Close all idle pooled connections."""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
 
+    def init_database(self):
+        """Create or migrate the conversation history schema (runs once at startup)."""
+        migrations = self._migrations()
+        with self._connection() as conn:
+            # Serialize migrations across processes sharing the database file
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for target, statements in enumerate(migrations, start=1):
+                if version < target:
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+
+    def _migrations(self) -> List[List[str]]:
+        """Schema migrations in order; entry N brings the database to user_version N.
+
+        The base schema is migration 1; later ones are the numbered scripts in
+        backend_py/migrations, applied in file name order.
+        """
+        # The schema files live in the parent directory of this package
+        backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        migrations_dir = os.path.join(backend_dir, "migrations")
+        paths = [os.path.join(backend_dir, "create_conversations_db.sql")] + [
+            os.path.join(migrations_dir, name)
+            for name in sorted(os.listdir(migrations_dir))
+            if name.endswith(".sql")
+        ]
+
+        migrations = []
+        for path in paths:
+            with open(path, "r") as f:
+                migrations.append(_split_statements(f.read()))
+        return migrations
+
+    @store_operation("create_session")
     def create_session(self, database_uuid: str, user_identifier: str = None) -> str:
         """Create a new conversation session."""
         session_id = str(uuid.uuid4())
 
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            INSERT INTO sessions (session_id, user_identifier, database_uuid)
-            VALUES (?, ?, ?)
-        """,
-            (session_id, user_identifier, database_uuid),
-        )
-
-        conn.commit()
-        conn.close()
+        with self._connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO sessions (session_id, user_identifier, database_uuid)
+                VALUES (?, ?, ?)
+            """,
+                (session_id, user_identifier, database_uuid),
+            )
+            conn.commit()
 
         return session_id
 
+    @store_operation("get_or_create_session")
     def get_or_create_session(
         self, database_uuid: str, user_identifier: str = None
     ) -> str:
         """Get the most recent session for a user/database or create a new one."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        # Try to find the most recent session for this database
-        cursor.execute(
-            """
-            SELECT session_id FROM sessions 
-            WHERE database_uuid = ? 
-            ORDER BY last_activity DESC 
-            LIMIT 1
-        """,
-            (database_uuid,),
-        )
-
-        result = cursor.fetchone()
-        conn.close()
+        with self._connection() as conn:
+            # Try to find the most recent session for this database
+            result = conn.execute(
+                """
+                SELECT session_id FROM sessions 
+                WHERE database_uuid = ? 
+                ORDER BY last_activity DESC 
+                LIMIT 1
+            """,
+                (database_uuid,),
+            ).fetchone()
 
         if result:
             return result[0]
         else:
             return self.create_session(database_uuid, user_identifier)
 
+    @store_operation("save_conversation")
     def save_conversation(
         self,
         session_id: str,
@@ -82,132 +193,590 @@ class ConversationManager:
         visualization_type: str = None,
         error_message: str = None,
         database_uuid: str = None,
+        answer: str = None,
     ):
-        """Save a conversation entry."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            INSERT INTO conversations 
-            (session_id, question, sql_query, results_summary, visualization_type, error_message, database_uuid)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """,
-            (
-                session_id,
-                question,
-                sql_query,
-                results_summary,
-                visualization_type,
-                error_message,
-                database_uuid,
-            ),
+        """Save a conversation entry.
+
+        With write-behind enabled the entry is queued and committed by the
+        background writer in a batch; otherwise it is written immediately.
+        """
+        # Stamp now, in the same format as CURRENT_TIMESTAMP, so batching
+        # does not shift the recorded time
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        entry = (
+            session_id,
+            question,
+            sql_query,
+            results_summary,
+            visualization_type,
+            error_message,
+            database_uuid,
+            answer,
+            timestamp,
         )
-
-        # Update session last activity
-        cursor.execute(
-            """
-            UPDATE sessions SET last_activity = CURRENT_TIMESTAMP 
-            WHERE session_id = ?
-        """,
-            (session_id,),
+        if self._writer:
+            self._writer.submit(entry)
+        else:
+            self._write_conversations([entry])
+
+        # Write-through to the in-memory context of this session
+        self._context_cache.append(
+            session_id,
+            {
+                "question": question,
+                "sql_query": sql_query,
+                "results_summary": results_summary,
+                "timestamp": timestamp,
+            },
         )
 
-        conn.commit()
-        conn.close()
-
-    def get_conversation_history(self, session_id: str, limit: int = 20) -> List[Dict]:
-        """Get conversation history for a session."""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            SELECT * FROM conversations 
-            WHERE session_id = ? 
-            ORDER BY timestamp DESC 
-            LIMIT ?
-        """,
-            (session_id, limit),
-        )
+    @store_operation("write_batch")
+    def _write_conversations(self, entries: List[tuple]):
+        """Insert a batch of conversation entries in one transaction."""
+        # Coalesce last_activity to one update per session
+        last_activity = {}
+        for entry in entries:
+            session_id, timestamp = entry[0], entry[-1]
+            last_activity[session_id] = max(timestamp, last_activity.get(session_id, timestamp))
+
+        with self._connection() as conn:
+            conn.executemany(
+                """
+                INSERT INTO conversations 
+                (session_id, question, sql_query, results_summary, visualization_type, error_message, database_uuid, answer, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+                entries,
+            )
 
-        rows = cursor.fetchall()
-        conn.close()
+            # Update session last activity
+            conn.executemany(
+                """
+                UPDATE sessions SET last_activity = ? 
+                WHERE session_id = ?
+            """,
+                [(timestamp, session_id) for session_id, timestamp in last_activity.items()],
+            )
+            conn.commit()
+
+    @store_operation("update_result")
+    def update_conversation_result(
+        self, session_id: str, question: str, sql_query: str, results_summary: str, answer: str
+    ) -> bool:
+        """Replace the result of a session's latest turn for question and sql_query.
+
+        Used when a progressive answer's exact result arrives after the turn
+        was saved with the estimate. Returns whether a turn was updated.
+        """
+        self.flush()
+        with self._connection() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE conversations SET results_summary = ?, answer = ?
+                WHERE id = (
+                    SELECT id FROM conversations
+                    WHERE session_id = ? AND question = ? AND sql_query = ?
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT 1
+                )
+            """,
+                (results_summary, answer, session_id, question, sql_query),
+            )
+            conn.commit()
+        # Other workers' caches see the edit through the session's revision
+        self._context_cache.discard(session_id)
+        return cursor.rowcount > 0
+
+    @store_operation("get_history")
+    def get_conversation_history(
+        self, session_id: str, limit: int = 20, before: Tuple[str, int] = None
+    ) -> List[Dict]:
+        """Get conversation history for a session, newest first.
+
+        before is a (timestamp, id) keyset cursor: only turns older than it
+        are returned, so deep pages cost the same as the first one.
+        """
+        self.flush()
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            if before is None:
+                rows = cursor.execute(
+                    """
+                    SELECT * FROM conversations 
+                    WHERE session_id = ? 
+                    ORDER BY timestamp DESC, id DESC 
+                    LIMIT ?
+                """,
+                    (session_id, limit),
+                ).fetchall()
+            else:
+                rows = cursor.execute(
+                    """
+                    SELECT * FROM conversations 
+                    WHERE session_id = ? AND (timestamp, id) < (?, ?)
+                    ORDER BY timestamp DESC, id DESC 
+                    LIMIT ?
+                """,
+                    (session_id, before[0], before[1], limit),
+                ).fetchall()
 
         # Convert to list of dictionaries
         return [dict(row) for row in rows]
 
+    def _session_marker(self, session_id: str) -> Tuple[int, Optional[str], int]:
+        """(turns, latest turn time, revision) of a session, from its usage counters."""
+        self.flush()
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT total_conversations, last_conversation, revised FROM session_usage WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+        return tuple(row) if row else (0, None, 0)
+
+    @store_operation("get_context")
+    def get_conversation_context(self, session_id: str) -> str:
+        """Get the rendered context of the last few turns, served from memory."""
+        return self._context_cache.get_context(session_id)
+
     def get_recent_questions(self, database_uuid: str, limit: int = 5) -> List[str]:
         """Get recent questions for a database."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        return self.get_recent_questions_page(database_uuid, limit)[0]
+
+    @store_operation("get_recent_questions")
+    def get_recent_questions_page(
+        self, database_uuid: str, limit: int = 5, before: Tuple[str, int] = None
+    ) -> Tuple[List[str], Optional[Tuple[str, int]]]:
+        """Get distinct recent questions for a database, newest first.
+
+        Reads the deduplicated recent_questions table through its covering
+        index. Returns the questions and the (last_asked, last_id) cursor for
+        the next page, or None when there are no more.
+        """
+        self.flush()
+        with self._connection() as conn:
+            if before is None:
+                rows = conn.execute(
+                    """
+                    SELECT question, last_asked, last_id FROM recent_questions 
+                    WHERE database_uuid = ? 
+                    ORDER BY last_asked DESC, last_id DESC 
+                    LIMIT ?
+                """,
+                    (database_uuid, limit),
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    """
+                    SELECT question, last_asked, last_id FROM recent_questions 
+                    WHERE database_uuid = ? AND (last_asked, last_id) < (?, ?)
+                    ORDER BY last_asked DESC, last_id DESC 
+                    LIMIT ?
+                """,
+                    (database_uuid, before[0], before[1], limit),
+                ).fetchall()
+
+        next_cursor = (rows[-1][1], rows[-1][2]) if len(rows) == limit else None
+        return [row[0] for row in rows], next_cursor
+
+    @store_operation("get_query_log")
+    def get_query_log(
+        self, database_uuids: Union[str, List[str]], limit: int = 500
+    ) -> List[str]:
+        """SQL the agent ran successfully against one or more databases, newest first."""
+        if isinstance(database_uuids, str):
+            database_uuids = [database_uuids]
+        placeholders = ", ".join("?" * len(database_uuids))
+        self.flush()
+        with self._connection() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT sql_query FROM conversations 
+                WHERE database_uuid IN ({placeholders}) AND error_message IS NULL 
+                AND sql_query IS NOT NULL AND sql_query NOT IN ('', 'NOT_RELEVANT')
+                ORDER BY timestamp DESC, id DESC 
+                LIMIT ?
+            """,
+                (*database_uuids, limit),
+            ).fetchall()
+        return [row[0] for row in rows]
 
-        cursor.execute(
-            """
-            SELECT DISTINCT question FROM conversations 
-            WHERE database_uuid = ? AND question IS NOT NULL
-            ORDER BY timestamp DESC 
-            LIMIT ?
-        """,
-            (database_uuid, limit),
+    def get_database_activity(self) -> Dict[str, int]:
+        """Total conversations per database, from the usage counters."""
+        self.flush()
+        with self._connection() as conn:
+            rows = conn.execute(
+                "SELECT database_uuid, total_conversations FROM database_usage"
+            ).fetchall()
+        return dict(rows)
+
+    def get_active_databases(self, minutes: int = 30) -> Set[str]:
+        """Databases with a session that was active in the last minutes."""
+        self.flush()
+        with self._connection() as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT database_uuid FROM sessions WHERE last_activity >= datetime('now', ?)",
+                (f"-{int(minutes)} minutes",),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def get_saved_chart_databases(self) -> Set[str]:
+        """Databases that at least one saved chart queries."""
+        with self._connection() as conn:
+            rows = conn.execute("SELECT DISTINCT database_uuid FROM saved_charts").fetchall()
+        return {row[0] for row in rows}
+
+    def delete_old_conversations(
+        self, days_old: int = 30, batch_size: int = 500, archive: Callable = None
+    ) -> int:
+        """Delete conversations and sessions older than specified days.
+
+        Rows go in batches of batch_size, each in its own short transaction,
+        so other writers are never locked out for long. archive, if given, is
+        called with each batch of rows before it is deleted. Returns the
+        number of conversations deleted.
+        """
+        cutoff = f"-{int(days_old)} days"
+        deleted = self._delete_conversation_batches(
+            "timestamp < datetime('now', ?)", (cutoff,), batch_size, archive
         )
 
-        rows = cursor.fetchall()
-        conn.close()
-
-        return [row[0] for row in rows]
+        while True:
+            with self._connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                session_ids = conn.execute(
+                    """
+                    SELECT session_id FROM sessions 
+                    WHERE last_activity < datetime('now', ?)
+                    LIMIT ?
+                """,
+                    (cutoff, batch_size),
+                ).fetchall()
+                conn.executemany("DELETE FROM sessions WHERE session_id = ?", session_ids)
+                conn.executemany("DELETE FROM session_usage WHERE session_id = ?", session_ids)
+                conn.commit()
+            for (session_id,) in session_ids:
+                self._context_cache.discard(session_id)
+            if len(session_ids) < batch_size:
+                break
+
+        self._after_delete(deleted)
+        return deleted
+
+    def enforce_storage_budget(
+        self,
+        max_rows: int = 0,
+        max_bytes: int = 0,
+        batch_size: int = 500,
+        archive: Callable = None,
+    ) -> int:
+        """Delete the oldest conversations until row and size budgets are met.
+
+        A budget of 0 means unlimited. Returns the number of conversations deleted.
+        """
+        deleted = 0
+        if max_rows:
+            with self._connection() as conn:
+                count = conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+            if count > max_rows:
+                deleted += self._delete_conversation_batches(
+                    "1", (), batch_size, archive, limit=count - max_rows
+                )
+
+        if max_bytes:
+            while self.get_storage_usage()["used_bytes"] > max_bytes:
+                batch = self._delete_conversation_batches(
+                    "1", (), batch_size, archive, limit=batch_size
+                )
+                if not batch:
+                    break
+                deleted += batch
+
+        self._after_delete(deleted)
+        return deleted
+
+    def incremental_vacuum(self):
+        """Return free pages to the filesystem so the database file shrinks."""
+        with self._connection() as conn:
+            # executescript steps the pragma to completion; execute() would
+            # free only a single page
+            conn.executescript("PRAGMA incremental_vacuum;")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+    def compact(self) -> Dict:
+        """Shrink the database file now and report the storage usage after.
+
+        A database created before incremental auto-vacuum is converted first,
+        with one full VACUUM that rewrites the file and blocks writers while
+        it runs; that is why it is never done implicitly.
+        """
+        self.flush()
+        with self._connection() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+        self.incremental_vacuum()
+        return self.get_storage_usage()
+
+    def get_storage_usage(self) -> Dict:
+        """Report live data size, file size and free pages of the database."""
+        with self._connection() as conn:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+        file_bytes = sum(
+            os.path.getsize(path)
+            for path in (self.db_path, self.db_path + "-wal")
+            if os.path.exists(path)
+        )
+        return {
+            "used_bytes": (page_count - free_pages) * page_size,
+            "file_bytes": file_bytes,
+            "free_pages": free_pages,
+            # False until compact() converts a database from before incremental auto-vacuum
+            "incremental_vacuum": auto_vacuum == 2,
+        }
+
+    def _delete_conversation_batches(
+        self,
+        where: str,
+        params: tuple,
+        batch_size: int,
+        archive: Callable = None,
+        limit: int = None,
+    ) -> int:
+        """Delete the oldest conversations matching where, one batch per transaction."""
+        deleted = 0
+        while limit is None or deleted < limit:
+            size = batch_size if limit is None else min(batch_size, limit - deleted)
+            with self._connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                cursor = conn.cursor()
+                cursor.row_factory = sqlite3.Row
+                rows = cursor.execute(
+                    f"""
+                    SELECT * FROM conversations 
+                    WHERE {where}
+                    ORDER BY timestamp, id 
+                    LIMIT ?
+                """,
+                    (*params, size),
+                ).fetchall()
+                if rows:
+                    # Archive inside the transaction: a failed export deletes nothing
+                    if archive:
+                        archive([dict(row) for row in rows])
+                    conn.executemany(
+                        "DELETE FROM conversations WHERE id = ?",
+                        [(row["id"],) for row in rows],
+                    )
+                conn.commit()
+            deleted += len(rows)
+            if len(rows) < size:
+                break
+        return deleted
+
+    def _after_delete(self, deleted: int):
+        if not deleted:
+            return
+        with self._connection() as conn:
+            # Drop recent questions whose latest turn is gone
+            conn.execute(
+                """
+                DELETE FROM recent_questions 
+                WHERE NOT EXISTS (SELECT 1 FROM conversations WHERE id = recent_questions.last_id)
+            """
+            )
+            conn.commit()
+        self._context_cache.clear()
+        self.incremental_vacuum()
 
-    def delete_old_conversations(self, days_old: int = 30):
-        """Delete conversations older than specified days."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    @store_operation("get_session_stats")
+    def get_session_stats(self, session_id: str) -> Dict:
+        """Get statistics for a session from its materialized counters."""
+        self.flush()
+        with self._connection() as conn:
+            result = conn.execute(
+                """
+                SELECT total_conversations, failed_conversations, last_conversation, first_conversation
+                FROM session_usage 
+                WHERE session_id = ?
+            """,
+                (session_id,),
+            ).fetchone()
+
+        total, failed, last, first = result or (0, 0, None, None)
+        return {
+            "total_conversations": total,
+            "successful_conversations": total - failed,
+            "failed_conversations": failed,
+            "error_rate": _rate(failed, total),
+            "last_conversation": last,
+            "first_conversation": first,
+        }
+
+    @store_operation("get_database_usage")
+    def get_database_usage(self, database_uuid: str) -> Dict:
+        """Get usage counters for a database, broken down by visualization type."""
+        self.flush()
+        with self._connection() as conn:
+            result = conn.execute(
+                """
+                SELECT total_conversations, failed_conversations, last_conversation, first_conversation
+                FROM database_usage 
+                WHERE database_uuid = ?
+            """,
+                (database_uuid,),
+            ).fetchone()
+            visualizations = conn.execute(
+                """
+                SELECT visualization_type, total_conversations, failed_conversations
+                FROM database_visualization_usage 
+                WHERE database_uuid = ?
+                ORDER BY total_conversations DESC
+            """,
+                (database_uuid,),
+            ).fetchall()
+
+        total, failed, last, first = result or (0, 0, None, None)
+        return {
+            "total_conversations": total,
+            "successful_conversations": total - failed,
+            "failed_conversations": failed,
+            "error_rate": _rate(failed, total),
+            "last_conversation": last,
+            "first_conversation": first,
+            "visualizations": [
+                {
+                    "visualization_type": visualization_type,
+                    "total_conversations": viz_total,
+                    "failed_conversations": viz_failed,
+                    "error_rate": _rate(viz_failed, viz_total),
+                }
+                for visualization_type, viz_total, viz_failed in visualizations
+            ],
+        }
+
+    @store_operation("get_conversation")
+    def get_conversation(self, conversation_id: int) -> Optional[Dict]:
+        """One conversation turn by id, or None."""
+        self.flush()
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            row = cursor.execute(
+                "SELECT * FROM conversations WHERE id = ?", (conversation_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    @store_operation("save_chart")
+    def save_chart(
+        self,
+        turn: Dict,
+        column_count: int,
+        labels: Dict[str, str],
+        title: str = None,
+    ) -> Dict:
+        """Pin a conversation turn as a saved chart and return it."""
+        chart_id = str(uuid.uuid4())
+        with self._connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO saved_charts
+                (chart_id, conversation_id, database_uuid, title, question, sql_query,
+                 visualization_type, column_count, labels)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+                (
+                    chart_id,
+                    turn.get("id"),
+                    turn["database_uuid"],
+                    title or turn["question"],
+                    turn["question"],
+                    turn["sql_query"],
+                    turn["visualization_type"],
+                    column_count,
+                    json.dumps(labels),
+                ),
+            )
+            conn.commit()
+        return self.get_saved_chart(chart_id)
+
+    @store_operation("get_saved_chart")
+    def get_saved_chart(self, chart_id: str) -> Optional[Dict]:
+        """A saved chart by id, or None."""
+        charts = self._saved_charts("WHERE chart_id = ?", (chart_id,))
+        return charts[0] if charts else None
+
+    @store_operation("get_saved_charts")
+    def get_saved_charts(self, database_uuid: str = None, chart_ids: List[str] = None) -> List[Dict]:
+        """Saved charts of a database, or with the given ids, oldest first."""
+        if chart_ids is not None:
+            placeholders = ", ".join("?" * len(chart_ids))
+            return self._saved_charts(f"WHERE chart_id IN ({placeholders})", tuple(chart_ids))
+        return self._saved_charts("WHERE database_uuid = ?", (database_uuid,))
+
+    def _saved_charts(self, where: str, params: tuple) -> List[Dict]:
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            rows = cursor.execute(
+                f"SELECT * FROM saved_charts {where} ORDER BY created_at, chart_id", params
+            ).fetchall()
+        charts = [dict(row) for row in rows]
+        for chart in charts:
+            chart["labels"] = json.loads(chart["labels"])
+        return charts
+
+    @store_operation("delete_saved_chart")
+    def delete_saved_chart(self, chart_id: str) -> bool:
+        """Delete a saved chart; False if it did not exist."""
+        with self._connection() as conn:
+            deleted = conn.execute(
+                "DELETE FROM saved_charts WHERE chart_id = ?", (chart_id,)
+            ).rowcount
+            conn.commit()
+        return deleted > 0
+
+    @store_operation("record_chart_refreshes")
+    def record_chart_refreshes(self, refreshes: List[Tuple[str, Optional[str]]]):
+        """Stamp (chart id, error or None) pairs as refreshed now, in one transaction."""
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        with self._connection() as conn:
+            conn.executemany(
+                "UPDATE saved_charts SET last_refreshed = ?, last_error = ? WHERE chart_id = ?",
+                [(timestamp, error, chart_id) for chart_id, error in refreshes],
+            )
+            conn.commit()
 
-        cursor.execute(
-            """
-            DELETE FROM conversations 
-            WHERE timestamp < datetime('now', '-{} days')
-        """.format(days_old)
-        )
 
-        cursor.execute(
-            """
-            DELETE FROM sessions 
-            WHERE last_activity < datetime('now', '-{} days')
-        """.format(days_old)
-        )
+def _rate(part: int, total: int) -> float:
+    return round(part / total, 4) if total else 0.0
 
-        conn.commit()
-        conn.close()
 
-    def get_session_stats(self, session_id: str) -> Dict:
-        """Get statistics for a session."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+def _render_context(turns: List[Dict]) -> str:
+    """Render turns (oldest first) as prompt context for follow-up questions."""
+    context_parts = []
+    for entry in turns:
+        if entry["question"] and entry["sql_query"]:
+            context_parts.append(f"Previous Q: {entry['question']}")
+            context_parts.append(f"Previous SQL: {entry['sql_query']}")
+            if entry["results_summary"]:
+                context_parts.append(f"Previous Result: {entry['results_summary']}")
 
-        cursor.execute(
-            """
-            SELECT 
-                COUNT(*) as total_conversations,
-                COUNT(CASE WHEN error_message IS NULL THEN 1 END) as successful_conversations,
-                COUNT(CASE WHEN error_message IS NOT NULL THEN 1 END) as failed_conversations,
-                MAX(timestamp) as last_conversation,
-                MIN(timestamp) as first_conversation
-            FROM conversations 
-            WHERE session_id = ?
-        """,
-            (session_id,),
-        )
+    if context_parts:
+        return "===Recent conversation context:\n" + "\n".join(context_parts) + "\n\n"
+    return ""
 
-        result = cursor.fetchone()
-        conn.close()
 
-        if result:
-            return {
-                "total_conversations": result[0],
-                "successful_conversations": result[1],
-                "failed_conversations": result[2],
-                "last_conversation": result[3],
-                "first_conversation": result[4],
-            }
-        return {}
+def _split_statements(script: str) -> List[str]:
+    """Split a SQL script into complete statements."""
+    statements, current = [], ""
+    for line in script.splitlines(keepends=True):
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ""
+    return statements
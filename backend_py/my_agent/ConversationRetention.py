@@ -0,0 +1,113 @@
+import gzip
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from my_agent.Serializer import dumps
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+class ConversationRetention:
+    """Background worker that keeps conversations.sqlite within its budgets.
+
+    Every interval it deletes turns older than retention_days, then the oldest
+    turns until the row and size budgets hold, optionally archiving deleted rows
+    to gzipped JSON lines first, and finally runs an incremental vacuum so the
+    file actually shrinks. Deletes happen in bounded batches (see
+    ConversationManager.delete_old_conversations). When several processes share
+    the database, a lock file makes sure only one of them runs the worker.
+    """
+
+    def __init__(
+        self,
+        conversation_manager,
+        retention_days: int = None,
+        max_rows: int = None,
+        max_bytes: int = None,
+        batch_size: int = None,
+        interval_seconds: float = None,
+        archive_dir: str = None,
+    ):
+        self.conversation_manager = conversation_manager
+        self.retention_days = _env_int("CONVERSATION_RETENTION_DAYS", 30, retention_days)
+        self.max_rows = _env_int("CONVERSATION_MAX_ROWS", 0, max_rows)
+        self.max_bytes = (
+            max_bytes
+            if max_bytes is not None
+            else int(os.getenv("CONVERSATION_MAX_DB_MB", 0)) * 1024 * 1024
+        )
+        self.batch_size = _env_int("CONVERSATION_RETENTION_BATCH", 500, batch_size)
+        self.interval_seconds = _env_int("CONVERSATION_RETENTION_INTERVAL_S", 3600, interval_seconds)
+        self.archive_dir = archive_dir or os.getenv("CONVERSATION_ARCHIVE_DIR") or None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_file = None
+
+    def start(self) -> bool:
+        """Start the worker thread unless another process already runs one."""
+        if not self._acquire_lock():
+            return False
+        self._thread = threading.Thread(target=self._run, name="conversation-retention", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run_once(self) -> Dict:
+        """Apply the retention policy once and report what was done."""
+        archive = self._archive if self.archive_dir else None
+        expired = self.conversation_manager.delete_old_conversations(
+            self.retention_days, self.batch_size, archive
+        )
+        trimmed = self.conversation_manager.enforce_storage_budget(
+            self.max_rows, self.max_bytes, self.batch_size, archive
+        )
+        return {
+            "expired": expired,
+            "trimmed": trimmed,
+            **self.conversation_manager.get_storage_usage(),
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                report = self.run_once()
+                if report["expired"] or report["trimmed"]:
+                    print(f"Conversation retention: {report}")
+            except Exception as e:
+                print(f"Error applying conversation retention: {e}")
+            self._stop.wait(self.interval_seconds)
+
+    def _archive(self, rows: List[Dict]):
+        """Append rows to today's gzipped JSON lines export."""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        day = datetime.now(timezone.utc).strftime("%Y%m%d")
+        path = os.path.join(self.archive_dir, f"conversations-{day}.jsonl.gz")
+        with gzip.open(path, "ab") as f:
+            f.write(b"".join(dumps(row) + b"\n" for row in rows))
+
+    def _acquire_lock(self) -> bool:
+        if fcntl is None:
+            return True
+        self._lock_file = open(self.conversation_manager.db_path + ".retention.lock", "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+
+
+def _env_int(name: str, default: int, override) -> int:
+    if override is not None:
+        return override
+    return int(os.getenv(name, default))
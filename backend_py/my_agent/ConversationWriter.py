@@ -0,0 +1,158 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from typing import Callable, List
+
+
+class ConversationWriter:
+    """Write-behind queue that batches conversation inserts on a background thread.
+
+    Entries are written in one transaction once batch_size rows are queued or
+    flush_interval_ms has passed since the first one. The queue is bounded:
+    when it is full, submit() blocks for up to enqueue_timeout seconds and then
+    falls back to writing the entry synchronously, so memory stays bounded and
+    callers are slowed down rather than entries dropped.
+
+    Every entry gets a sequence number, so flush() waits only for the entries
+    submitted before it was called, not for ones other threads keep adding.
+    A batch that fails is retried one entry at a time, so a bad row costs
+    only itself.
+    """
+
+    def __init__(
+        self,
+        write_batch: Callable[[List[tuple]], None],
+        flush_interval_ms: int = 50,
+        batch_size: int = 100,
+        max_pending: int = 1000,
+        enqueue_timeout: float = 1.0,
+    ):
+        self._write_batch = write_batch
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.enqueue_timeout = enqueue_timeout
+        self._lock = threading.Lock()
+        self._committed = threading.Condition()
+        self._next_seq = 0
+        self._outstanding = set()  # sequence numbers submitted but not yet written
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        atexit.register(self.close)
+
+    def _ensure_started(self):
+        """Start the writer thread lazily, and again in forked worker processes."""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_pending)
+            with self._committed:
+                self._outstanding = set()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="conversation-writer", daemon=True
+            )
+            self._thread.start()
+
+    def submit(self, entry: tuple):
+        """Queue an entry for the next batch."""
+        if self._closed:
+            self._write_batch([entry])
+            return
+        self._ensure_started()
+        with self._committed:
+            self._next_seq += 1
+            seq = self._next_seq
+            self._outstanding.add(seq)
+        try:
+            self._queue.put((seq, entry), timeout=self.enqueue_timeout)
+        except queue.Full:
+            # Backpressure: the writer is behind, pay for this write ourselves
+            try:
+                self._write_batch([entry])
+            finally:
+                self._done([seq])
+
+    def pending(self) -> int:
+        """Number of queued entries not yet committed."""
+        if self._queue is None or self._pid != os.getpid():
+            return 0
+        with self._committed:
+            return len(self._outstanding)
+
+    def flush(self):
+        """Block until every entry submitted before this call has been written.
+
+        Entries submitted afterwards are not waited for, so a reader's wait
+        is bounded by the backlog it saw, however busy the writers are.
+        """
+        if not self.pending():
+            return
+        with self._committed:
+            target = self._next_seq
+            self._committed.wait_for(
+                lambda: not self._outstanding or min(self._outstanding) > target
+            )
+
+    def _done(self, seqs: List[int]):
+        with self._committed:
+            self._outstanding.difference_update(seqs)
+            self._committed.notify_all()
+
+    def close(self):
+        """Flush pending entries and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = [first]
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stop = True
+                    break
+                batch.append(entry)
+
+            try:
+                self._write(batch)
+            finally:
+                self._done([seq for seq, _ in batch])
+
+            if stop:
+                return
+
+    def _write(self, batch: List[tuple]):
+        try:
+            self._write_batch([entry for _, entry in batch])
+            return
+        except Exception as e:
+            if len(batch) == 1:
+                print(f"Error writing conversation entry {batch[0][0]}, dropping it: {e}")
+                return
+            print(f"Error writing conversation batch, retrying its {len(batch)} entries one by one: {e}")
+        # Isolate the failing rows: the others still get written
+        for item in batch:
+            self._write([item])
@@ -5,12 +5,18 @@ from my_agent.graph_instructions import graph_instructions
 
 
 class DataFormatter:
-    def __init__(self):
-        self.llm_manager = LLMManager()
+    def __init__(self, llm_manager=None):
+        self.llm_manager = llm_manager or LLMManager()
 
     
     def format_data_for_visualization(self, state: dict) -> dict:
         """Format the data for the chosen visualization type."""
+        formatted = self._format_for_visualization(state)
+        if state.get('chart_encoding') == "columnar":
+            return self._to_columnar(state['visualization'], formatted)
+        return formatted
+
+    def _format_for_visualization(self, state: dict) -> dict:
         visualization = state['visualization']
         results = state['results']
         question = state['question']
@@ -45,7 +51,9 @@ class DataFormatter:
         
         return self._format_other_visualizations(visualization, question, sql_query, results)
     
-    def _format_line_data(self, results, question):
+    def _format_line_data(self, results, question, pinned_labels=None):
+        # pinned_labels: {"series", "y_axis"} labels of a saved chart, used
+        # instead of asking the LLM
         if isinstance(results, str):
             results = eval(results)
 
@@ -54,12 +62,15 @@ class DataFormatter:
             x_values = [str(row[0]) for row in results]
             y_values = [float(row[1]) for row in results]
 
-            # Use LLM to get a relevant label
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", "You are a data labeling expert. Given a question and some data, provide a concise and relevant label for the data series."),
-                ("human", "Question: {question}\n Data (first few rows): {data}\n\nProvide a concise label for this y axis. For example, if the data is the sales figures over time, the label could be 'Sales'. If the data is the population growth, the label could be 'Population'. If the data is the revenue trend, the label could be 'Revenue'."),
-            ])
-            label = self.llm_manager.invoke(prompt, question=question, data=str(results[:2]))
+            if pinned_labels is not None:
+                label = pinned_labels.get("series", "")
+            else:
+                # Use LLM to get a relevant label
+                prompt = ChatPromptTemplate.from_messages([
+                    ("system", "You are a data labeling expert. Given a question and some data, provide a concise and relevant label for the data series."),
+                    ("human", "Question: {question}\n Data (first few rows): {data}\n\nProvide a concise label for this y axis. For example, if the data is the sales figures over time, the label could be 'Sales'. If the data is the population growth, the label could be 'Population'. If the data is the revenue trend, the label could be 'Revenue'."),
+                ])
+                label = self.llm_manager.invoke(prompt, question=question, data=str(results[:2]))
 
             formatted_data = {
                 "xValues": x_values,
@@ -120,12 +131,15 @@ class DataFormatter:
                 "yAxisLabel": ""
             }
 
-            # Use LLM to get a relevant label for the y-axis
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", "You are a data labeling expert. Given a question and some data, provide a concise and relevant label for the y-axis."),
-                ("human", "Question: {question}\n Data (first few rows): {data}\n\nProvide a concise label for the y-axis. For example, if the data represents sales figures over time for different categories, the label could be 'Sales'. If it's about population growth for different groups, it could be 'Population'."),
-            ])
-            y_axis_label = self.llm_manager.invoke(prompt, question=question, data=str(results[:2]))
+            if pinned_labels is not None:
+                y_axis_label = pinned_labels.get("y_axis", "")
+            else:
+                # Use LLM to get a relevant label for the y-axis
+                prompt = ChatPromptTemplate.from_messages([
+                    ("system", "You are a data labeling expert. Given a question and some data, provide a concise and relevant label for the y-axis."),
+                    ("human", "Question: {question}\n Data (first few rows): {data}\n\nProvide a concise label for the y-axis. For example, if the data represents sales figures over time for different categories, the label could be 'Sales'. If it's about population growth for different groups, it could be 'Population'."),
+                ])
+                y_axis_label = self.llm_manager.invoke(prompt, question=question, data=str(results[:2]))
 
             # Add the y-axis label to the formatted data
             formatted_data["yAxisLabel"] = y_axis_label.strip()
@@ -169,7 +183,8 @@ class DataFormatter:
         return {"formatted_data_for_visualization": formatted_data}
 
 
-    def _format_bar_data(self, results, question):
+    def _format_bar_data(self, results, question, pinned_labels=None):
+        # pinned_labels: as for _format_line_data
         if isinstance(results, str):
             results = eval(results)
 
@@ -178,12 +193,15 @@ class DataFormatter:
             labels = [str(row[0]) for row in results]
             data = [float(row[1]) for row in results]
             
-            # Use LLM to get a relevant label
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", "You are a data labeling expert. Given a question and some data, provide a concise and relevant label for the data series."),
-                ("human", "Question: {question}\nData (first few rows): {data}\n\nProvide a concise label for this y axis. For example, if the data is the sales figures for products, the label could be 'Sales'. If the data is the population of cities, the label could be 'Population'. If the data is the revenue by region, the label could be 'Revenue'."),
-            ])
-            label = self.llm_manager.invoke(prompt, question=question, data=str(results[:2]))
+            if pinned_labels is not None:
+                label = pinned_labels.get("series", "")
+            else:
+                # Use LLM to get a relevant label
+                prompt = ChatPromptTemplate.from_messages([
+                    ("system", "You are a data labeling expert. Given a question and some data, provide a concise and relevant label for the data series."),
+                    ("human", "Question: {question}\nData (first few rows): {data}\n\nProvide a concise label for this y axis. For example, if the data is the sales figures for products, the label could be 'Sales'. If the data is the population of cities, the label could be 'Population'. If the data is the revenue by region, the label could be 'Revenue'."),
+                ])
+                label = self.llm_manager.invoke(prompt, question=question, data=str(results[:2]))
             
             values = [{"data": data, "label": label}]
         elif len(results[0]) == 3:
@@ -246,6 +264,81 @@ class DataFormatter:
 
         return {"formatted_data_for_visualization": formatted_data}
 
+    def format_pinned(self, visualization, results, question, labels, chart_encoding=None):
+        """Format results for a saved chart using its pinned labels.
+
+        Runs only the deterministic formatting paths and never calls the LLM;
+        results these paths cannot format raise ValueError.
+        """
+        if not results:
+            return {"formatted_data_for_visualization": None}
+
+        if visualization == "scatter":
+            formatted = self._format_scatter_data(results)
+        elif visualization == "line":
+            formatted = self._format_line_data(results, question, pinned_labels=labels)
+        elif visualization == "pie":
+            formatted = self._format_pie_data(results, question)
+        elif visualization in ("bar", "horizontal_bar"):
+            formatted = self._format_bar_data(results, question, pinned_labels=labels)
+        else:
+            raise ValueError(f"Chart type {visualization!r} cannot be refreshed")
+
+        if chart_encoding == "columnar":
+            return self._to_columnar(visualization, formatted)
+        return formatted
+
+    @staticmethod
+    def chart_labels(visualization, data):
+        """The LLM-chosen labels in a formatted chart payload, for pinning."""
+        labels = {}
+        if not isinstance(data, dict):
+            return labels
+        if visualization == "line":
+            y_values = data.get("yValues") or []
+            if "yAxisLabel" in data:
+                labels["y_axis"] = data["yAxisLabel"]
+            elif len(y_values) == 1:
+                labels["series"] = y_values[0].get("label", "")
+        elif visualization in ("bar", "horizontal_bar"):
+            values = data.get("values") or []
+            if len(values) == 1:
+                labels["series"] = values[0].get("label", "")
+        return labels
+
+    def _to_columnar(self, visualization, formatted):
+        """Re-encode point-object payloads as parallel arrays.
+
+        Scatter series become {"x": [...], "y": [...]} (ids are implied by
+        position) and pie slices become {"ids", "values", "labels"} arrays.
+        Bar and line payloads are already columnar and pass through unchanged.
+        """
+        data = formatted.get("formatted_data_for_visualization")
+        if not data:
+            return formatted
+
+        if visualization == "scatter" and isinstance(data, dict):
+            series = [
+                {
+                    "x": [point["x"] for point in s["data"]],
+                    "y": [point["y"] for point in s["data"]],
+                    "label": s.get("label"),
+                }
+                for s in data.get("series", [])
+            ]
+            data = {"encoding": "columnar", "series": series}
+        elif visualization == "pie" and isinstance(data, list):
+            data = {
+                "encoding": "columnar",
+                "ids": [item["id"] for item in data],
+                "values": [item["value"] for item in data],
+                "labels": [item["label"] for item in data],
+            }
+        else:
+            return formatted
+
+        return {**formatted, "formatted_data_for_visualization": data}
+
     def _format_other_visualizations(self, visualization, question, sql_query, results):
         instructions = graph_instructions[visualization]
         prompt = ChatPromptTemplate.from_messages([
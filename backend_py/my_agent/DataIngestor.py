@@ -0,0 +1,299 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import zipfile
+from typing import IO, Iterable, List, Optional
+
+from my_agent.Serializer import dumps
+
+# pandas and pyarrow take a good part of a second to import, so they are
+# imported on the first upload that needs them (or by preload())
+
+
+class IngestError(Exception):
+    pass
+
+
+class DataIngestor:
+    """Loads uploaded CSV, Parquet and zip files into a new SQLite database.
+
+    Every file becomes its own table and the whole upload is written in one
+    transaction on a database nobody else can see yet, so the journal and
+    fsyncs are switched off. Parquet files are read a batch of rows at a time
+    with only the requested columns, and their column types come from the
+    file's own schema instead of being guessed. CSV files are read in chunks
+    and typed from the first one.
+    """
+
+    EXTENSIONS = {".csv", ".parquet", ".zip"}
+
+    @staticmethod
+    def preload():
+        """Import the libraries uploads need now rather than on first use.
+
+        Called before a server forks its workers, so they share the modules.
+        """
+        import pandas  # noqa: F401
+
+        try:
+            _arrow()
+        except IngestError:
+            pass
+
+    def __init__(self, batch_size: int = None, csv_chunksize: int = None):
+        self.batch_size = batch_size or int(os.getenv("INGEST_BATCH_ROWS", 65536))
+        self.csv_chunksize = csv_chunksize or int(
+            os.getenv("INGEST_CSV_CHUNK_ROWS", 50000)
+        )
+
+    def load(
+        self,
+        source: IO[bytes],
+        filename: str,
+        db_path: str,
+        columns: Optional[Iterable[str]] = None,
+        table: str = None,
+    ) -> List[str]:
+        """Write the data in source to a new database at db_path.
+
+        columns limits Parquet files to those columns. table names the table
+        of a single CSV or Parquet file; by default it is the file name.
+        Returns the names of the tables created.
+        """
+        columns = [c for c in columns if c] if columns else None
+        extension = os.path.splitext(filename)[1].lower()
+        if extension not in self.EXTENSIONS:
+            raise IngestError(f"Unsupported file type: {extension}")
+
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        try:
+            # A crash leaves a staging file that is thrown away anyway
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.execute("BEGIN")
+            tables = []
+            if extension == ".zip":
+                self._load_zip(conn, source, db_path, columns, tables)
+            else:
+                name = table or _table_name(filename, tables)
+                self._load_file(conn, source, extension, name, columns)
+                tables.append(name)
+            conn.execute("COMMIT")
+            return tables
+        finally:
+            conn.close()
+
+    def content_id(
+        self,
+        digest: str,
+        filename: str,
+        columns: Optional[Iterable[str]] = None,
+        table: str = None,
+    ) -> str:
+        """Identity of the database load() would build from a file with digest.
+
+        Besides the bytes, it covers what else shapes the result: the table
+        name a single file gets and the columns selected.
+        """
+        extension = os.path.splitext(filename)[1].lower()
+        if extension != ".zip":
+            table = table or _table_name(filename, [])
+        options = [extension, table, sorted(c for c in columns if c) if columns else None]
+        return hashlib.sha256(f"{digest}:{json.dumps(options)}".encode()).hexdigest()
+
+    def _load_zip(self, conn, source, db_path, columns, tables):
+        try:
+            archive = zipfile.ZipFile(source)
+        except zipfile.BadZipFile as e:
+            raise IngestError(f"Not a valid zip file: {e}")
+
+        with archive:
+            for info in archive.infolist():
+                name = info.filename
+                base = os.path.basename(name)
+                if info.is_dir() or name.startswith("__MACOSX/") or base.startswith("."):
+                    continue
+                extension = os.path.splitext(base)[1].lower()
+                if extension not in (".csv", ".parquet"):
+                    continue
+
+                table = _table_name(base, tables)
+                if extension == ".csv":
+                    with archive.open(info) as member:
+                        self._load_file(conn, member, extension, table, columns)
+                else:
+                    # Parquet reads its footer first; seeking inside a
+                    # compressed member would decompress it over and over
+                    with tempfile.TemporaryFile(dir=os.path.dirname(db_path)) as copy:
+                        with archive.open(info) as member:
+                            shutil.copyfileobj(member, copy)
+                        copy.seek(0)
+                        self._load_file(conn, copy, extension, table, columns)
+                tables.append(table)
+
+        if not tables:
+            raise IngestError("Zip file contains no .csv or .parquet files")
+
+    def _load_file(self, conn, source, extension, table, columns):
+        if extension == ".parquet":
+            rows = self._load_parquet(conn, source, table, columns)
+        else:
+            rows = self._load_csv(conn, source, table)
+        if rows == 0:
+            raise IngestError(f"{table}: file is empty")
+
+    def _load_parquet(self, conn, source, table, columns) -> int:
+        pa, pq = _arrow()
+        try:
+            parquet = pq.ParquetFile(source)
+        except (pa.ArrowInvalid, OSError) as e:
+            raise IngestError(f"{table}: not a valid Parquet file: {e}")
+
+        schema = parquet.schema_arrow
+        names = schema.names
+        if columns:
+            names = [name for name in names if name in columns]
+            if not names:
+                raise IngestError(f"{table}: none of the requested columns exist")
+
+        fields = [schema.field(name) for name in names]
+        _create_table(conn, table, [(f.name, _sqlite_type(f.type)) for f in fields])
+        insert = _insert_statement(table, len(fields))
+
+        rows = 0
+        for batch in parquet.iter_batches(batch_size=self.batch_size, columns=names):
+            values = [_arrow_values(batch.column(i)) for i in range(batch.num_columns)]
+            conn.executemany(insert, zip(*values))
+            rows += batch.num_rows
+        return rows
+
+    def _load_csv(self, conn, source, table) -> int:
+        import pandas as pd
+
+        try:
+            chunks = pd.read_csv(source, chunksize=self.csv_chunksize)
+        except pd.errors.EmptyDataError:
+            raise IngestError(f"{table}: file is empty")
+
+        rows = 0
+        insert = None
+        with chunks:
+            for chunk in chunks:
+                if insert is None:
+                    _create_table(
+                        conn,
+                        table,
+                        [(str(name), _pandas_type(chunk[name].dtype)) for name in chunk.columns],
+                    )
+                    insert = _insert_statement(table, len(chunk.columns))
+                values = [_pandas_values(chunk.iloc[:, i]) for i in range(chunk.shape[1])]
+                conn.executemany(insert, zip(*values))
+                rows += len(chunk)
+        return rows
+
+
+def _arrow():
+    """pyarrow and pyarrow.parquet, which are optional."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise IngestError("Parquet uploads require pyarrow to be installed")
+    return pyarrow, pyarrow.parquet
+
+
+def _table_name(filename: str, taken: List[str]) -> str:
+    """A readable table name for filename that is not in taken yet."""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    name = re.sub(r"\W+", "_", stem).strip("_").lower() or "data"
+    if name[0].isdigit():
+        name = f"t_{name}"
+    candidate, n = name, 2
+    while candidate in taken:
+        candidate, n = f"{name}_{n}", n + 1
+    return candidate
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _create_table(conn, table, columns):
+    definitions = ", ".join(f"{_quote(name)} {kind}" for name, kind in columns)
+    conn.execute(f"CREATE TABLE {_quote(table)} ({definitions})")
+
+
+def _insert_statement(table: str, count: int) -> str:
+    return f"INSERT INTO {_quote(table)} VALUES ({', '.join('?' * count)})"
+
+
+def _sqlite_type(arrow_type) -> str:
+    """Declared SQLite type for a Parquet column."""
+    import pyarrow as pa
+
+    types = pa.types
+    if types.is_dictionary(arrow_type):
+        return _sqlite_type(arrow_type.value_type)
+    if types.is_boolean(arrow_type) or types.is_integer(arrow_type):
+        return "INTEGER"
+    if types.is_duration(arrow_type):
+        return "INTEGER"
+    if types.is_floating(arrow_type) or types.is_decimal(arrow_type):
+        return "REAL"
+    if types.is_timestamp(arrow_type):
+        return "TIMESTAMP"
+    if types.is_date(arrow_type):
+        return "DATE"
+    if types.is_time(arrow_type):
+        return "TIME"
+    if types.is_binary(arrow_type) or types.is_large_binary(arrow_type):
+        return "BLOB"
+    if types.is_fixed_size_binary(arrow_type):
+        return "BLOB"
+    return "TEXT"
+
+
+def _arrow_values(array) -> list:
+    """Python values of an Arrow column that sqlite3 can bind."""
+    import pyarrow as pa
+
+    types = pa.types
+    if types.is_dictionary(array.type):
+        array = array.dictionary_decode()
+    kind = array.type
+
+    if types.is_decimal(kind) or types.is_float16(kind):
+        return array.cast(pa.float64()).to_pylist()
+    if types.is_duration(kind):
+        return array.cast(pa.int64()).to_pylist()
+    if types.is_temporal(kind):
+        # Arrow formats these as "YYYY-MM-DD HH:MM:SS", which SQLite's date
+        # functions understand
+        return array.cast(pa.string()).to_pylist()
+    if types.is_nested(kind):
+        # Lists, structs and maps are kept as JSON text
+        return [None if v is None else dumps(v).decode("utf-8") for v in array.to_pylist()]
+    return array.to_pylist()
+
+
+def _pandas_type(dtype) -> str:
+    """Declared SQLite type for a CSV column, the way DataFrame.to_sql names it."""
+    import pandas as pd
+
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+
+def _pandas_values(series) -> list:
+    """Python values of a CSV column, with missing values as None."""
+    values = series.tolist()
+    if series.hasnans:
+        return [None if v != v else v for v in values]
+    return values
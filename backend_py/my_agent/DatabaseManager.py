@@ -1,6 +1,8 @@
-import requests
 import os
-from typing import List, Any
+from typing import Any, Dict, List, Optional
+
+from my_agent.Metrics import DB_BYTES, DB_ROWS, DB_SECONDS, observe
+from my_agent.RequestTimer import timed
 
 
 class DatabaseManager:
@@ -10,25 +12,43 @@ class DatabaseManager:
 
     def get_schema(self, uuid: str) -> str:
         """Retrieve the database schema."""
+        # Imported on first use; LocalDatabaseManager never needs requests
+        import requests
+
         try:
-            response = requests.get(
-                f"{self.endpoint_url}/get-schema/{uuid}",
-                timeout=30  # Add timeout
-            )
-            response.raise_for_status()
+            with timed("sql"), observe(DB_SECONDS, "schema", "http"):
+                response = requests.get(
+                    f"{self.endpoint_url}/get-schema/{uuid}",
+                    timeout=30  # Add timeout
+                )
+                response.raise_for_status()
+            DB_BYTES.labels("schema", "http").observe(len(response.content))
             return response.json()['schema']
         except requests.RequestException as e:
             raise Exception(f"Error fetching schema: {str(e)}")
 
+    def execute_progressive(self, uuid: str, query: str) -> Optional[Dict]:
+        """Approximate rows from a sample, with the exact query started in the background.
+
+        None when no sample can answer the query; the remote service keeps none.
+        """
+        return None
+
     def execute_query(self, uuid: str, query: str) -> List[Any]:
         """Execute SQL query on the remote database and return results."""
+        import requests
+
         try:
-            response = requests.post(
-                f"{self.endpoint_url}/execute-query",
-                json={"uuid": uuid, "query": query},
-                timeout=60  # Add timeout for query execution
-            )
-            response.raise_for_status()
-            return response.json()['results']
+            with timed("sql"), observe(DB_SECONDS, "query", "http"):
+                response = requests.post(
+                    f"{self.endpoint_url}/execute-query",
+                    json={"uuid": uuid, "query": query},
+                    timeout=60  # Add timeout for query execution
+                )
+                response.raise_for_status()
+            results = response.json()['results']
+            DB_BYTES.labels("query", "http").observe(len(response.content))
+            DB_ROWS.labels("http").observe(len(results))
+            return results
         except requests.RequestException as e:
             raise Exception(f"Error executing query: {str(e)}")
\ No newline at end of file
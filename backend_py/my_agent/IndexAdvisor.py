@@ -0,0 +1,407 @@
+import os
+import shutil
+import sqlite3
+import stat
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from urllib.request import pathname2url
+
+from my_agent.QueryAnalyzer import column_usage, index_candidates, table_columns
+from my_agent.Serializer import dumps, loads
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+INDEX_PREFIX = "advisor_"
+
+# Fraction of the rows a lookup still visits is 1/ndv; grouping and ordering
+# on an index only save the sort, not the scan
+_SORT_BENEFIT = 0.3
+
+
+class IndexAdvisor:
+    """Creates and drops indexes on uploaded databases from the SQL run on them.
+
+    The query log comes from the conversations table. Each query is broken
+    down into the columns it filters, joins, groups and orders by
+    (QueryAnalyzer), candidates are scored by rows avoided (table size and
+    column cardinality, weighted by how often the shape recurs) and picked
+    greedily by benefit per estimated byte within a space budget. Changes are
+    applied to a copy of the database, the logged queries are timed before
+    and after, and the copy replaces the original only if they did not get
+    slower. Only indexes named advisor_* are ever dropped.
+
+    Runs are recorded in an advisor.json sidecar of the database. Uploads
+    of the same content share one database, so the advisor works per content
+    on the queries of all of its uuids. A background thread re-runs it for
+    databases that have seen min_new_queries new questions since their last
+    run.
+    """
+
+    def __init__(
+        self,
+        upload_store,
+        conversation_manager,
+        budget_ratio: float = None,
+        max_indexes: int = None,
+        min_new_queries: int = None,
+        min_rows: int = None,
+        interval_seconds: float = None,
+        log_size: int = 500,
+        measure_queries: int = 20,
+        query_timeout: float = 5.0,
+    ):
+        self.upload_store = upload_store
+        self.conversation_manager = conversation_manager
+        self.budget_ratio = _env_float("INDEX_ADVISOR_BUDGET_RATIO", 0.5, budget_ratio)
+        self.max_indexes = int(_env_float("INDEX_ADVISOR_MAX_INDEXES", 5, max_indexes))
+        self.min_new_queries = int(_env_float("INDEX_ADVISOR_MIN_NEW_QUERIES", 5, min_new_queries))
+        self.min_rows = int(_env_float("INDEX_ADVISOR_MIN_ROWS", 1000, min_rows))
+        self.interval_seconds = _env_float("INDEX_ADVISOR_INTERVAL_S", 300, interval_seconds)
+        self.log_size = log_size
+        self.measure_queries = measure_queries
+        self.query_timeout = query_timeout
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Background worker
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="index-advisor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def schedule(self):
+        """Wake the worker early, e.g. after a question was answered."""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval_seconds)
+            self._wake.clear()
+            try:
+                activity = self.conversation_manager.get_database_activity()
+                # One entry per stored database, whichever uuid it was asked through
+                totals = {}
+                for uuid, total in activity.items():
+                    if self.upload_store.exists(uuid):
+                        content_id = self.upload_store.content_id(uuid)
+                        first, count = totals.get(content_id, (uuid, 0))
+                        totals[content_id] = (first, count + total)
+                for uuid, total in totals.values():
+                    if self._stop.is_set():
+                        return
+                    seen = self.report(uuid).get("queries_seen", 0)
+                    if total - seen >= self.min_new_queries:
+                        self.advise(uuid)
+            except Exception as e:
+                print(f"Error running index advisor: {e}")
+
+    # Analysis
+
+    def recommend(self, uuid: str, queries: List[str] = None) -> Dict:
+        """Score index candidates for a database without changing it."""
+        if queries is None:
+            queries = self.conversation_manager.get_query_log(
+                self.upload_store.aliases(uuid), self.log_size
+            )
+        with self.upload_store.connection(uuid) as conn:
+            tables = table_columns(conn)
+            existing = _indexes(conn)
+            shapes = Counter()
+            reasons = {}
+            for query in queries:
+                for table, usage in column_usage(query, tables).items():
+                    for reason, columns in index_candidates(usage):
+                        shapes[(table, columns)] += 1
+                        reasons.setdefault((table, columns), set()).add(reason)
+
+            candidates = []
+            stats = _ColumnStats(conn)
+            for (table, columns), frequency in shapes.items():
+                rows = stats.rows(table)
+                if rows < self.min_rows:
+                    continue
+                covered_by = _covering_index(existing, table, columns)
+                if covered_by and not covered_by.startswith(INDEX_PREFIX):
+                    continue  # the user's own index already serves it
+                if reasons[(table, columns)] & {"where", "join"}:
+                    benefit = frequency * rows * (1 - 1 / max(stats.distinct(table, columns[0]), 1))
+                else:
+                    benefit = frequency * rows * _SORT_BENEFIT
+                size = rows * (sum(stats.width(table, column) for column in columns) + 10)
+                candidates.append(
+                    {
+                        "table": table,
+                        "columns": list(columns),
+                        "reasons": sorted(reasons[(table, columns)]),
+                        "frequency": frequency,
+                        "rows": rows,
+                        "benefit": round(benefit, 1),
+                        "estimated_bytes": int(size),
+                    }
+                )
+
+        budget = self.budget_ratio * os.path.getsize(self.upload_store.path(uuid))
+        candidates.sort(key=lambda c: c["benefit"] / max(c["estimated_bytes"], 1), reverse=True)
+        used = 0
+        selected = []
+        for candidate in candidates:
+            fits = used + candidate["estimated_bytes"] <= budget
+            redundant = any(
+                other["table"] == candidate["table"]
+                and other["columns"][: len(candidate["columns"])] == candidate["columns"]
+                for other in selected
+            )
+            candidate["selected"] = (
+                fits and not redundant and candidate["benefit"] > 0 and len(selected) < self.max_indexes
+            )
+            if candidate["selected"]:
+                selected.append(candidate)
+                used += candidate["estimated_bytes"]
+        return {"queries_analyzed": len(queries), "candidates": candidates}
+
+    def advise(self, uuid: str) -> Dict:
+        """Recommend, apply on a copy, measure, and swap the copy in if it helps."""
+        lock = self._lock(uuid)
+        if lock is False:
+            return {"status": "skipped", "reason": "another process is advising this database"}
+        try:
+            return self._advise(uuid)
+        finally:
+            if lock is not None:
+                lock.close()
+
+    def _advise(self, uuid: str) -> Dict:
+        aliases = self.upload_store.aliases(uuid)
+        activity = self.conversation_manager.get_database_activity()
+        queries_seen = sum(activity.get(alias, 0) for alias in aliases)
+        queries = self.conversation_manager.get_query_log(aliases, self.log_size)
+        run = {
+            "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+            **self.recommend(uuid, queries),
+            "created": [],
+            "dropped": [],
+        }
+
+        path = self.upload_store.data_path(uuid)
+        with self.upload_store.connection(uuid) as conn:
+            current = {
+                name: (table, columns)
+                for name, (table, columns) in _indexes(conn).items()
+                if name.startswith(INDEX_PREFIX)
+            }
+        wanted = {
+            _index_name(c["table"], c["columns"]): (c["table"], tuple(c["columns"]))
+            for c in run["candidates"]
+            if c["selected"]
+        }
+        to_create = {name: shape for name, shape in wanted.items() if name not in current}
+        to_drop = [name for name in current if name not in wanted]
+
+        if not to_create and not to_drop:
+            run["status"] = "unchanged"
+            self._record(uuid, run, queries_seen)
+            return run
+
+        workload = [query for query, _ in Counter(queries).most_common(self.measure_queries)]
+        before = self._time_queries(path, workload)
+
+        candidate_path = path + ".advisor.tmp"
+        shutil.copyfile(path, candidate_path)
+        os.chmod(candidate_path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH)
+        try:
+            conn = sqlite3.connect(candidate_path, isolation_level=None)
+            try:
+                conn.execute("BEGIN")
+                for name in to_drop:
+                    conn.execute(f'DROP INDEX IF EXISTS "{name}"')
+                for name, (table, columns) in to_create.items():
+                    column_list = ", ".join(_quote(column) for column in columns)
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON {_quote(table)} ({column_list})')
+                conn.execute("COMMIT")
+                conn.execute("ANALYZE")
+                conn.execute("PRAGMA optimize")
+            finally:
+                conn.close()
+
+            after = self._time_queries(candidate_path, workload)
+            run["timings"] = [
+                {"query": query, "before_ms": before[query], "after_ms": after[query]}
+                for query in workload
+            ]
+            run["before_ms"] = round(sum(t for t in before.values() if t is not None), 3)
+            run["after_ms"] = round(sum(t for t in after.values() if t is not None), 3)
+
+            # Keep the change unless the measured workload got slower
+            if run["after_ms"] > run["before_ms"] * 1.05 + 1:
+                run["status"] = "rejected"
+            else:
+                os.chmod(candidate_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                os.replace(candidate_path, path)
+                self.upload_store.release(uuid)
+                run["status"] = "applied"
+                run["created"] = [
+                    {"name": name, "table": table, "columns": list(columns)}
+                    for name, (table, columns) in to_create.items()
+                ]
+                run["dropped"] = to_drop
+        finally:
+            if os.path.exists(candidate_path):
+                os.remove(candidate_path)
+
+        self._record(uuid, run, queries_seen)
+        return run
+
+    def _time_queries(self, path: str, queries: List[str]) -> Dict[str, Optional[float]]:
+        """Wall time of each query in milliseconds (None if it failed or timed out)."""
+        conn = sqlite3.connect(f"file:{pathname2url(path)}?mode=ro", uri=True)
+        timings = {}
+        try:
+            for query in queries:
+                deadline = time.perf_counter() + self.query_timeout
+                conn.set_progress_handler(lambda: time.perf_counter() > deadline, 10000)
+                start = time.perf_counter()
+                try:
+                    conn.execute(query).fetchall()
+                    timings[query] = round((time.perf_counter() - start) * 1000, 3)
+                except sqlite3.Error:
+                    timings[query] = None
+        finally:
+            conn.close()
+        return timings
+
+    # Report
+
+    def report_path(self, uuid: str) -> str:
+        return self.upload_store.sidecar_path(uuid, "advisor.json")
+
+    def report(self, uuid: str) -> Dict:
+        """Advisor state for a database: current indexes and recent runs."""
+        try:
+            with open(self.report_path(uuid), "rb") as f:
+                return loads(f.read())
+        except FileNotFoundError:
+            return {}
+
+    def _record(self, uuid: str, run: Dict, queries_seen: int):
+        report = self.report(uuid)
+        runs = (report.get("runs", []) + [run])[-10:]
+        with self.upload_store.connection(uuid) as conn:
+            indexes = [
+                {"name": name, "table": table, "columns": list(columns)}
+                for name, (table, columns) in _indexes(conn).items()
+                if name.startswith(INDEX_PREFIX)
+            ]
+        report = {"database_uuid": uuid, "queries_seen": queries_seen, "indexes": indexes, "runs": runs}
+        tmp_path = self.report_path(uuid) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(dumps(report))
+        os.replace(tmp_path, self.report_path(uuid))
+
+    def _lock(self, uuid: str):
+        """Hold a per-database lock file; False if another process has it."""
+        if fcntl is None:
+            return None
+        lock_file = open(self.upload_store.sidecar_path(uuid, "advisor.lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return lock_file
+        except OSError:
+            lock_file.close()
+            return False
+
+
+class _ColumnStats:
+    """Row counts, distinct counts and widths, estimated from a sample."""
+
+    def __init__(self, conn: sqlite3.Connection, sample: int = 10000):
+        self.conn = conn
+        self.sample = sample
+        self._rows = {}
+        self._columns = {}
+
+    def rows(self, table: str) -> int:
+        if table not in self._rows:
+            # ANALYZE (run at upload) leaves the row count in sqlite_stat1
+            stat_row = None
+            try:
+                stat_row = self.conn.execute(
+                    "SELECT stat FROM sqlite_stat1 WHERE tbl = ? LIMIT 1", (table,)
+                ).fetchone()
+            except sqlite3.OperationalError:
+                pass
+            if stat_row:
+                self._rows[table] = int(stat_row[0].split()[0])
+            else:
+                self._rows[table] = self.conn.execute(f"SELECT COUNT(*) FROM {_quote(table)}").fetchone()[0]
+        return self._rows[table]
+
+    def distinct(self, table: str, column: str) -> int:
+        return self._column(table, column)[0]
+
+    def width(self, table: str, column: str) -> float:
+        return self._column(table, column)[1]
+
+    def _column(self, table: str, column: str):
+        key = (table, column)
+        if key not in self._columns:
+            distinct, width = self.conn.execute(
+                f"SELECT COUNT(DISTINCT c), AVG(LENGTH(c)) FROM "
+                f"(SELECT {_quote(column)} AS c FROM {_quote(table)} LIMIT {int(self.sample)})"
+            ).fetchone()
+            # A sample understates distinct counts of mostly-unique columns
+            sampled = min(self.rows(table), self.sample)
+            if sampled and distinct >= 0.9 * sampled:
+                distinct = self.rows(table)
+            self._columns[key] = (distinct or 1, width or 8)
+        return self._columns[key]
+
+
+def _indexes(conn: sqlite3.Connection) -> Dict[str, tuple]:
+    """Named indexes: name -> (table, column tuple)."""
+    indexes = {}
+    for name, table in conn.execute(
+        "SELECT name, tbl_name FROM sqlite_master WHERE type = 'index'"
+    ):
+        columns = tuple(row[2] for row in conn.execute(f"PRAGMA index_info({_quote(name)})"))
+        indexes[name] = (table, columns)
+    return indexes
+
+
+def _covering_index(indexes: Dict[str, tuple], table: str, columns: tuple) -> Optional[str]:
+    """Name of an existing index whose leading columns are exactly columns."""
+    for name, (index_table, index_columns) in indexes.items():
+        if index_table == table and index_columns[: len(columns)] == columns:
+            return name
+    return None
+
+
+def _index_name(table: str, columns: List[str]) -> str:
+    slug = "_".join([table, *columns])
+    slug = "".join(ch if ch.isalnum() else "_" for ch in slug).lower()
+    # Stable across processes, and distinct for names that slug the same
+    digest = zlib.crc32("\0".join([table, *columns]).encode("utf-8"))
+    return f"{INDEX_PREFIX}{slug[:48]}_{digest:08x}"
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _env_float(name: str, default: float, override) -> float:
+    if override is not None:
+        return override
+    return float(os.getenv(name, default))
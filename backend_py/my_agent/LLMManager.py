@@ -1,29 +1,103 @@
 import os
+import random
+import threading
+import time
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
+from my_agent.Metrics import LLM_RETRIES, LLM_SECONDS, LLM_TOKENS, observe
+from my_agent.RequestTimer import timed
+
+# HTTP statuses worth another attempt, as the Google SDK retries them
+_TRANSIENT_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def _is_transient(error: BaseException) -> bool:
+    """Whether a failed chat model call could succeed if tried again."""
+    transient_types = (TimeoutError, ConnectionError)
+    try:
+        import httpx
+
+        transient_types += (httpx.TransportError,)
+    except ImportError:
+        pass
+    # The client wraps the SDK's error; the status is on the one it came from
+    while error is not None:
+        if isinstance(error, transient_types) or getattr(error, "code", None) in _TRANSIENT_CODES:
+            return True
+        error = error.__cause__
+    return False
 
 
 class LLMManager:
-    def __init__(self):
+    """Calls the chat model for the agent and the formatter.
+
+    The Gemini client (and the Google SDK behind it) is created on the first
+    call, so building a graph is cheap and processes that never ask a
+    question never load it.
+
+    Failed calls are retried here rather than inside the SDK, up to
+    max_retries times with exponential backoff, so every retry is counted.
+    """
+
+    def __init__(self, llm=None, max_retries: int = None, retry_delay: float = None):
+        # Allow a pre-built chat model (e.g. a fake one for offline benchmarks)
+        self._llm = llm
+        self._lock = threading.Lock()
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LLM_MAX_RETRIES", 2))
+        self.retry_delay = retry_delay if retry_delay is not None else float(os.getenv("LLM_RETRY_DELAY_S", 1.0))
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    self._llm = self._create_llm()
+        return self._llm
+
+    def warm_up(self):
+        """Create the client now rather than on the first call."""
+        return self.llm
+
+    def _create_llm(self):
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
         # Get the API key from environment
         api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key:
             raise ValueError("GOOGLE_API_KEY environment variable is required")
 
-        self.llm = ChatGoogleGenerativeAI(
+        return ChatGoogleGenerativeAI(
             model="gemini-2.0-flash",
             temperature=0,
             google_api_key=api_key,
             timeout=30,  # Add timeout to prevent hanging
-            max_retries=2,  # Add retry logic
+            # One attempt per call: invoke() retries, and counts the retries
+            max_retries=1,
         )
 
     def invoke(self, prompt: ChatPromptTemplate, **kwargs) -> str:
         try:
             messages = prompt.format_messages(**kwargs)
-            response = self.llm.invoke(messages)
+            llm = self.llm
+            with timed("llm"), observe(LLM_SECONDS):
+                response = self._invoke_with_retries(llm, messages)
+            usage = getattr(response, "usage_metadata", None) or {}
+            if usage:
+                LLM_TOKENS.labels("prompt").inc(usage.get("input_tokens", 0))
+                LLM_TOKENS.labels("completion").inc(usage.get("output_tokens", 0))
             return response.content
         except Exception as e:
             # Log the error and re-raise with more context
             print(f"LLM invocation failed: {str(e)}")
             raise Exception(f"LLM call failed: {str(e)}")
+
+    def _invoke_with_retries(self, llm, messages):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return llm.invoke(messages)
+            except Exception as e:
+                if attempt == self.max_retries or not _is_transient(e):
+                    raise
+                LLM_RETRIES.inc()
+                delay = self.retry_delay * 2 ** attempt
+                print(f"LLM call failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay + random.uniform(0, self.retry_delay))
@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from my_agent.DatabaseManager import DatabaseManager
+from my_agent.Metrics import DB_BYTES, DB_ROWS, DB_SECONDS, observe
+from my_agent.RequestTimer import timed
+from my_agent.Serializer import dumps
+from my_agent.UploadStore import DatabaseNotFound, UploadStore  # noqa: F401
+
+
+class LocalDatabaseManager(DatabaseManager):
+    """DatabaseManager that reads uploaded databases straight from disk.
+
+    Used when the graph runs inside conversation_api, so schema and query calls
+    skip the HTTP round trip to the database service. Schema descriptions
+    are kept per content, so every upload of the same data reuses them.
+    """
+
+    def __init__(self, store: UploadStore, aggregate_cache=None, schema_cache_size: int = 128, sample_store=None):
+        self.store = store
+        self.aggregate_cache = aggregate_cache
+        self.sample_store = sample_store
+        self.endpoint_url = None
+        self.schema_cache_size = schema_cache_size
+        self._schemas = OrderedDict()  # (content id, version) -> schema
+        self._lock = threading.Lock()
+
+    def get_schema(self, uuid: str) -> str:
+        """Describe every table with its CREATE statement and a few example rows."""
+        with timed("sql"), observe(DB_SECONDS, "schema", "local"):
+            key = (self.store.content_id(uuid), self.store.version(uuid))
+            with self._lock:
+                schema = self._schemas.get(key)
+                if schema is not None:
+                    self._schemas.move_to_end(key)
+                    return schema
+
+            schema = self._describe(uuid)
+            DB_BYTES.labels("schema", "local").observe(len(schema))
+            with self._lock:
+                self._schemas[key] = schema
+                while len(self._schemas) > self.schema_cache_size:
+                    self._schemas.popitem(last=False)
+            return schema
+
+    def _describe(self, uuid: str) -> str:
+        with self.store.connection(uuid) as conn:
+            cursor = conn.cursor()
+
+            # Get all tables
+            cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='table';")
+            tables = cursor.fetchall()
+
+            schema = []
+            for table_name, create_statement in tables:
+                schema.append(f"Table: {table_name}")
+                schema.append(f"CREATE statement: {create_statement}\n")
+
+                # Get sample rows
+                try:
+                    cursor.execute(f"SELECT * FROM '{table_name}' LIMIT 3;")
+                    rows = cursor.fetchall()
+                    if rows:
+                        schema.append("Example rows:")
+                        for row in rows:
+                            schema.append(
+                                dumps(
+                                    dict(zip([col[0] for col in cursor.description], row))
+                                ).decode("utf-8")
+                            )
+                except Exception as e:
+                    print(f"Error fetching rows for table {table_name}: {e}")
+
+                schema.append("")  # Blank line between tables
+
+            return "\n".join(schema)
+
+    def execute_query(self, uuid: str, query: str) -> List[Any]:
+        """Execute SQL query on the local database and return results."""
+        with timed("sql"), observe(DB_SECONDS, "query", "local"):
+            rows = None
+            if self.aggregate_cache is not None:
+                # Recurring aggregates may be answered from a summary table
+                rows = self.aggregate_cache.execute(uuid, query)
+
+            if rows is None:
+                with self.store.connection(uuid) as conn:
+                    cursor = conn.cursor()
+                    try:
+                        cursor.execute(query)
+                        # Rows as lists, the same shape DatabaseManager gets back from JSON
+                        rows = [list(row) for row in cursor.fetchall()]
+                    finally:
+                        cursor.close()
+            DB_ROWS.labels("local").observe(len(rows))
+            return rows
+
+    def execute_progressive(self, uuid: str, query: str) -> Optional[Dict]:
+        """Approximate rows from the database's sample, or None if it cannot answer.
+
+        The exact query starts in the background; the returned dict carries
+        the sample's details and the "exact_id" to collect its rows with
+        SampleStore.exact_result().
+        """
+        if self.sample_store is None:
+            return None
+        with timed("sql"), observe(DB_SECONDS, "sample", "local"):
+            approximate = self.sample_store.execute(uuid, query)
+        if approximate is None:
+            return None
+        approximate["exact_id"] = self.sample_store.run_exact(lambda: self.execute_query(uuid, query))
+        return approximate
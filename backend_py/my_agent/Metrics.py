@@ -0,0 +1,149 @@
+"""Prometheus metrics for the API, the agent graph, the LLM and the databases.
+
+Recording is always on and cheap; without prometheus_client installed every
+metric is a no-op and render() reports that metrics are unavailable. Under
+gunicorn, set PROMETHEUS_MULTIPROC_DIR so /metrics aggregates all workers
+(gunicorn.conf.py empties it when the server starts).
+"""
+
+import functools
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Tuple
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:  # pragma: no cover - prometheus_client is optional
+    prometheus_client = None
+
+# Seconds; LLM calls and whole requests run into tens of seconds
+_LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0,
+)
+_ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+_BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class _NullMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+
+def _histogram(name, documentation, labels, buckets=_LATENCY_BUCKETS):
+    if prometheus_client is None:
+        return _NullMetric()
+    return prometheus_client.Histogram(name, documentation, labels, buckets=buckets)
+
+
+def _counter(name, documentation, labels):
+    if prometheus_client is None:
+        return _NullMetric()
+    return prometheus_client.Counter(name, documentation, labels)
+
+
+HTTP_REQUEST_SECONDS = _histogram(
+    "dataviz_http_request_duration_seconds",
+    "Time to handle an API request",
+    ["endpoint", "method", "status"],
+)
+NODE_SECONDS = _histogram(
+    "dataviz_graph_node_duration_seconds",
+    "Time spent in an agent graph node",
+    ["node", "status"],
+)
+LLM_SECONDS = _histogram(
+    "dataviz_llm_request_duration_seconds",
+    "Time for one chat model call, retries included",
+    ["status"],
+)
+LLM_TOKENS = _counter(
+    "dataviz_llm_tokens_total",
+    "Tokens sent to and received from the chat model",
+    ["kind"],
+)
+LLM_RETRIES = _counter(
+    "dataviz_llm_retries_total",
+    "Chat model calls retried after a transient error",
+    [],
+)
+DB_SECONDS = _histogram(
+    "dataviz_db_request_duration_seconds",
+    "Time for a schema or query call on an uploaded database",
+    ["operation", "backend", "status"],
+)
+DB_ROWS = _histogram(
+    "dataviz_db_result_rows",
+    "Rows returned by a query on an uploaded database",
+    ["backend"],
+    buckets=_ROW_BUCKETS,
+)
+DB_BYTES = _histogram(
+    "dataviz_db_response_bytes",
+    "Size of a schema description, or of a query response on the wire",
+    ["operation", "backend"],
+    buckets=_BYTE_BUCKETS,
+)
+STORE_SECONDS = _histogram(
+    "dataviz_conversation_store_duration_seconds",
+    "Time for a conversation store operation",
+    ["operation", "status"],
+)
+
+
+@contextmanager
+def observe(histogram, *labels: str):
+    """Observe the duration of the enclosed block, labelled ok or error."""
+    start = time.perf_counter()
+    status = "error"
+    try:
+        yield
+        status = "ok"
+    finally:
+        histogram.labels(*labels, status).observe(time.perf_counter() - start)
+
+
+def observed_node(name: str, fn: Callable[[dict], dict]) -> Callable[[dict], dict]:
+    """Wrap a graph node so every run is recorded in NODE_SECONDS."""
+
+    @functools.wraps(fn)
+    def node(state: dict) -> dict:
+        with observe(NODE_SECONDS, name):
+            return fn(state)
+
+    return node
+
+
+def store_operation(operation: str):
+    """Decorator recording a conversation store method in STORE_SECONDS."""
+
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with observe(STORE_SECONDS, operation):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def render() -> Tuple[bytes, str]:
+    """The current metrics in Prometheus text format, and its content type."""
+    if prometheus_client is None:
+        return b"# prometheus_client is not installed\n", "text/plain; charset=utf-8"
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+
@@ -0,0 +1,139 @@
+import cProfile
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Optional
+
+
+class Profile:
+    """One profiled run: cProfile for CPU time plus a wall-clock stack sampler.
+
+    cProfile counts CPU time per function. The sampler snapshots the profiled
+    thread's stack every interval, so time spent waiting on the LLM, SQLite or
+    the network shows up too, and its output is the folded-stack format that
+    flamegraph.pl, speedscope and similar tools read.
+    """
+
+    def __init__(self, path_prefix: str, interval: float):
+        self.path_prefix = path_prefix
+        self.interval = interval
+        self._thread_id = threading.get_ident()
+        self._stacks = Counter()
+        self._done = threading.Event()
+        self._sampler = None
+        self._profiler = None
+
+    def start(self):
+        self._sampler = threading.Thread(target=self._sample, name="profile-sampler", daemon=True)
+        self._sampler.start()
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            self._profiler = profiler
+        except ValueError:
+            # Another profiler (or debugger) is active; keep the samples only
+            pass
+        return self
+
+    def stop(self):
+        """Stop profiling and write <prefix>.prof and <prefix>.folded."""
+        self._done.set()
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.path_prefix + ".prof")
+        self._sampler.join()
+        with open(self.path_prefix + ".folded", "w") as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            if stack:
+                self._stacks[";".join(reversed(stack))] += 1
+
+
+class RequestProfiler:
+    """Opt-in profiling of single requests or graph runs.
+
+    Disabled unless PROFILE_DIR is set, and then a request is profiled only
+    when it sends an X-Profile header (equal to PROFILE_TOKEN when one is
+    configured) or is picked at PROFILE_SAMPLE_RATE. One run is profiled at
+    a time per process; requests arriving meanwhile run unprofiled. Output
+    goes to <PROFILE_DIR>/<time>-<request id>.prof (pstats, e.g. for snakeviz)
+    and .folded (stack samples for flame graphs).
+    """
+
+    def __init__(
+        self,
+        directory: str = None,
+        sample_rate: float = None,
+        token: str = None,
+        interval_ms: float = None,
+    ):
+        self.directory = directory if directory is not None else os.getenv("PROFILE_DIR") or None
+        self.sample_rate = (
+            sample_rate if sample_rate is not None else float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+        )
+        self.token = token if token is not None else os.getenv("PROFILE_TOKEN") or None
+        self.interval = (
+            interval_ms if interval_ms is not None else float(os.getenv("PROFILE_INTERVAL_MS", 5))
+        ) / 1000
+        self._busy = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def wanted(self, header: Optional[str]) -> bool:
+        """Whether a request with this X-Profile header value should be profiled."""
+        if header:
+            return header == self.token if self.token else header.lower() in ("1", "true")
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, request_id: str) -> Optional[Profile]:
+        """Begin profiling the calling thread, or None if a profile is running."""
+        if not self._busy.acquire(blocking=False):
+            return None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+            safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", request_id)[:64]
+            return Profile(os.path.join(self.directory, f"{stamp}-{safe_id}"), self.interval).start()
+        except Exception:
+            self._busy.release()
+            raise
+
+    def finish(self, profile: Profile):
+        try:
+            started = time.perf_counter()
+            profile.stop()
+            print(
+                f"Wrote profile {profile.path_prefix}.* "
+                f"({(time.perf_counter() - started) * 1000:.0f} ms to save)"
+            )
+        finally:
+            self._busy.release()
+
+    @contextmanager
+    def profile(self, request_id: str):
+        """Profile the enclosed block if profiling is enabled and free."""
+        profile = self.start(request_id) if self.enabled else None
+        try:
+            yield profile
+        finally:
+            if profile is not None:
+                self.finish(profile)
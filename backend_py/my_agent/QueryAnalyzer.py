@@ -0,0 +1,517 @@
+import re
+import sqlite3
+from typing import Dict, List, Optional, Set, Tuple
+
+# Literals, quoted identifiers, words, comments and the operators the analysis cares about
+_TOKEN = re.compile(
+    r"""
+      (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+    | (?P<string>'(?:[^']|'')*')
+    | (?P<blob>[xX]'[0-9A-Fa-f]*')
+    | `(?P<backtick>(?:[^`]|``)*)`
+    | "(?P<dquote>(?:[^"]|"")*)"
+    | \[(?P<bracket>[^\]]*)\]
+    | (?P<number>0[xX][0-9A-Fa-f]+|(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)
+    | (?P<word>[A-Za-z_][\w$]*)
+    | (?P<op><=|>=|<>|!=|==|\|\||[=<>(),.*;+\-/%])
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+_QUOTE_ESCAPES = {"backtick": "``", "dquote": '""'}
+
+_CLAUSE_KEYWORDS = {"SELECT", "FROM", "JOIN", "ON", "WHERE", "HAVING", "LIMIT", "UNION", "EXCEPT", "INTERSECT"}
+_EQUALITY = {"=", "==", "IN", "IS"}
+_RANGE = {"<", ">", "<=", ">=", "BETWEEN", "LIKE", "GLOB"}
+_NOT_ALIAS = {
+    "WHERE", "JOIN", "INNER", "LEFT", "RIGHT", "CROSS", "NATURAL", "OUTER", "ON", "USING",
+    "GROUP", "ORDER", "HAVING", "LIMIT", "UNION", "EXCEPT", "INTERSECT", "WINDOW",
+}
+
+
+class Token:
+    __slots__ = ("kind", "value", "upper", "start", "end")
+
+    def __init__(self, kind: str, value: str, start: int = 0, end: int = 0):
+        self.kind = kind
+        self.value = value
+        self.upper = value.upper() if kind in ("word", "op") else None
+        self.start = start
+        self.end = end
+
+    @property
+    def is_identifier(self) -> bool:
+        return self.kind in ("word", "backtick", "dquote", "bracket")
+
+
+def tokenize(query: str, strict: bool = False) -> List[Token]:
+    """The tokens of query, without its comments.
+
+    Characters no token matches (parameters, bitwise operators, ...) are
+    skipped, which is fine for a heuristic; with strict, they raise
+    ValueError instead, so that SQL rebuilt from the tokens means what the
+    query meant.
+    """
+    tokens = []
+    position = 0
+    for match in _TOKEN.finditer(query):
+        if strict and query[position : match.start()].strip():
+            raise ValueError(f"Unsupported SQL near {query[position:match.start()].strip()!r}")
+        position = match.end()
+        kind = match.lastgroup
+        if kind == "comment":
+            continue
+        value = match.group(kind)
+        if kind in _QUOTE_ESCAPES:
+            value = value.replace(_QUOTE_ESCAPES[kind], _QUOTE_ESCAPES[kind][0])
+        tokens.append(Token(kind, value, match.start(), match.end()))
+    if strict and query[position:].strip():
+        raise ValueError(f"Unsupported SQL near {query[position:].strip()!r}")
+    return tokens
+
+
+def table_columns(conn: sqlite3.Connection) -> Dict[str, Set[str]]:
+    """Column names of every table in a database, the shape the analyzers take."""
+    names = [
+        row[0]
+        for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        )
+    ]
+    return {
+        name: {row[1] for row in conn.execute(f"PRAGMA table_info({_quote_identifier(name)})")}
+        for name in names
+    }
+
+
+class ColumnUsage:
+    """Columns of one table referenced by a query, grouped by the clause they appear in."""
+
+    __slots__ = ("table", "equality", "range", "join", "group", "order")
+
+    def __init__(self, table: str):
+        self.table = table
+        self.equality: List[str] = []
+        self.range: List[str] = []
+        self.join: List[str] = []
+        self.group: List[str] = []
+        self.order: List[str] = []
+
+    def add(self, clause: str, column: str):
+        columns = getattr(self, clause)
+        if column not in columns:
+            columns.append(column)
+
+
+def column_usage(query: str, tables: Dict[str, Set[str]]) -> Dict[str, ColumnUsage]:
+    """Which columns of which tables a query filters, joins, groups and orders by.
+
+    tables maps each table name to its column names, as in the database being
+    queried; identifiers that are not columns of a table the query reads
+    (aliases, functions, literals) are ignored. This is a token-level
+    heuristic, not a SQL parser: it is meant for ranking index candidates from
+    generated SELECT statements, and tolerates whatever it does not understand.
+    """
+    lower_tables = {name.lower(): name for name in tables}
+    columns_by_table = {name: {column.lower(): column for column in cols} for name, cols in tables.items()}
+    tokens = tokenize(query)
+
+    # First pass: tables read by the query and their aliases
+    aliases: Dict[str, str] = {}
+    for i, token in enumerate(tokens):
+        if token.upper not in ("FROM", "JOIN") and not (token.upper == "," and _in_from(tokens, i)):
+            continue
+        if i + 1 >= len(tokens) or not tokens[i + 1].is_identifier:
+            continue
+        table = lower_tables.get(tokens[i + 1].value.lower())
+        if table is None:
+            continue
+        aliases[table.lower()] = table
+        j = i + 2
+        if j < len(tokens) and tokens[j].upper == "AS":
+            j += 1
+        if j < len(tokens) and tokens[j].is_identifier and tokens[j].upper not in _NOT_ALIAS:
+            aliases[tokens[j].value.lower()] = table
+    referenced = set(aliases.values())
+
+    usage: Dict[str, ColumnUsage] = {}
+    clause = None
+    for i, token in enumerate(tokens):
+        upper = token.upper
+        if upper in _CLAUSE_KEYWORDS:
+            clause = {"ON": "join", "WHERE": "where", "HAVING": "having"}.get(upper, upper.lower())
+            continue
+        if upper in ("GROUP", "ORDER") and i + 1 < len(tokens) and tokens[i + 1].upper == "BY":
+            clause = upper.lower()
+            continue
+        if clause not in ("where", "join", "group", "order") or not token.is_identifier:
+            continue
+        if i + 1 < len(tokens) and tokens[i + 1].upper in (".", "("):
+            continue  # a qualifier or a function name
+
+        qualifier = None
+        start = i
+        if i >= 2 and tokens[i - 1].upper == "." and tokens[i - 2].is_identifier:
+            qualifier = tokens[i - 2].value.lower()
+            start = i - 2
+        tables_for_column = _resolve(token.value.lower(), qualifier, aliases, referenced, columns_by_table)
+        if not tables_for_column:
+            continue
+
+        role = clause
+        if clause == "where":
+            operator, operand = _comparison(tokens, start, i)
+            if operator in _EQUALITY:
+                # col = other.col in WHERE is an implicit join
+                is_join = operand is not None and _is_column(tokens, operand, aliases, referenced, columns_by_table)
+                role = "join" if is_join else "equality"
+            elif operator in _RANGE:
+                role = "range"
+            else:
+                continue
+        for table in tables_for_column:
+            column = columns_by_table[table][token.value.lower()]
+            usage.setdefault(table, ColumnUsage(table)).add(role, column)
+    return usage
+
+
+def _in_from(tokens: List[Token], i: int) -> bool:
+    """Whether the comma at i separates tables in a FROM list."""
+    depth = 0
+    for token in reversed(tokens[:i]):
+        if token.upper == ")":
+            depth += 1
+        elif token.upper == "(":
+            if depth == 0:
+                return False
+            depth -= 1
+        elif depth == 0 and token.upper in _CLAUSE_KEYWORDS | {"GROUP", "ORDER"}:
+            return token.upper in ("FROM", "JOIN")
+    return False
+
+
+def _resolve(column, qualifier, aliases, referenced, columns_by_table) -> List[str]:
+    if qualifier is not None:
+        table = aliases.get(qualifier)
+        return [table] if table is not None and column in columns_by_table[table] else []
+    return [table for table in referenced if column in columns_by_table[table]]
+
+
+def _comparison(tokens: List[Token], start: int, end: int) -> Tuple[Optional[str], Optional[int]]:
+    """Comparison the column reference tokens[start:end + 1] takes part in.
+
+    Returns the operator and the index of the first token of the other
+    operand, looking on either side of the reference.
+    """
+    j = end + 1
+    if j < len(tokens) and tokens[j].upper == "NOT":
+        j += 1
+    if j < len(tokens) and (tokens[j].upper in _EQUALITY or tokens[j].upper in _RANGE):
+        return tokens[j].upper, j + 1 if j + 1 < len(tokens) else None
+    j = start - 1
+    if j >= 0 and (tokens[j].upper in _EQUALITY or tokens[j].upper in _RANGE):
+        operand = j - 1
+        # Step back to the qualifier of a qualified column
+        if operand >= 2 and tokens[operand - 1].upper == ".":
+            operand -= 2
+        return tokens[j].upper, operand if operand >= 0 else None
+    return None, None
+
+
+def _is_column(tokens, j, aliases, referenced, columns_by_table) -> bool:
+    """Whether the operand starting at j is a column of a table the query reads."""
+    if not tokens[j].is_identifier:
+        return False
+    if j + 2 < len(tokens) and tokens[j + 1].upper == "." and tokens[j + 2].is_identifier:
+        return bool(_resolve(tokens[j + 2].value.lower(), tokens[j].value.lower(), aliases, referenced, columns_by_table))
+    if j + 1 < len(tokens) and tokens[j + 1].upper == "(":
+        return False
+    return bool(_resolve(tokens[j].value.lower(), None, aliases, referenced, columns_by_table))
+
+
+def index_candidates(usage: ColumnUsage, max_columns: int = 3) -> List[Tuple[str, Tuple[str, ...]]]:
+    """Index shapes that would serve a table's usage: (reason, columns) pairs."""
+    candidates = []
+    if usage.equality or usage.range:
+        columns = usage.equality[:max_columns]
+        if usage.range and len(columns) < max_columns:
+            columns = columns + [usage.range[0]]
+        candidates.append(("where", tuple(columns)))
+    for column in usage.join:
+        candidates.append(("join", (column,)))
+    if usage.group:
+        candidates.append(("group", tuple(usage.group[:max_columns])))
+    if usage.order:
+        candidates.append(("order", tuple(usage.order[:max_columns])))
+    return candidates
+
+
+_AGGREGATES = {"SUM", "COUNT", "MIN", "MAX", "AVG", "TOTAL"}
+# Anything that takes a query outside "one table, filter, group, aggregate"
+_UNSUPPORTED = {"JOIN", "UNION", "EXCEPT", "INTERSECT", "WITH", "OVER", "WINDOW", "DISTINCT", "RECURSIVE"}
+
+
+class AggregateCall:
+    """An aggregate function call inside an aggregate query, e.g. SUM("price")."""
+
+    __slots__ = ("function", "argument", "distinct", "start", "end")
+
+    def __init__(self, function: str, argument: str, distinct: bool, start: int, end: int):
+        self.function = function
+        self.argument = argument
+        self.distinct = distinct
+        self.start = start  # token span of the call in the query
+        self.end = end
+
+    @property
+    def key(self) -> Tuple[str, str, bool]:
+        return (self.function, self.argument, self.distinct)
+
+
+class AggregateQuery:
+    """A single-table SELECT ... WHERE ... GROUP BY ... query, in canonical pieces.
+
+    Column references are rendered as "column" with the table's spelling, so
+    equivalent queries written with different quoting or case compare equal.
+    Clauses are token spans, for rewriting the query against a summary table.
+    """
+
+    def __init__(self, tokens, table, columns):
+        self.tokens = tokens
+        self.table = table
+        self.columns = columns  # lower-case name -> column name
+        self.select = None
+        self.conjuncts: List[Tuple[str, frozenset]] = []  # (rendered text, columns)
+        self.group: List[str] = []
+        self.having = None
+        self.order = None
+        self.limit = None
+        self.aggregates: List[AggregateCall] = []
+
+    def render(self, start: int, end: int, replacements: Dict[int, Tuple[int, str]] = None) -> str:
+        """Canonical SQL for tokens[start:end], with token spans replaced.
+
+        replacements maps a start index to (end index, text).
+        """
+        parts = []
+        i = start
+        while i < end:
+            if replacements and i in replacements:
+                i, text = replacements[i]
+                parts.append(text)
+                continue
+            parts.append(self._render_token(self.tokens[i]))
+            i += 1
+        return " ".join(parts)
+
+    def _render_token(self, token: Token) -> str:
+        if token.is_identifier:
+            column = self.columns.get(token.value.lower())
+            if column is not None:
+                return _quote_identifier(column)
+            if token.kind == "dquote":
+                # SQLite reads a double-quoted non-column as a string literal
+                return "'" + token.value.replace("'", "''") + "'"
+            if token.kind == "word":
+                return token.upper
+            return _quote_identifier(token.value)
+        if token.kind == "op":
+            return token.upper
+        return token.value
+
+    def referenced_columns(self, start: int, end: int) -> frozenset:
+        return frozenset(
+            self.columns[token.value.lower()]
+            for token in self.tokens[start:end]
+            if token.is_identifier and token.value.lower() in self.columns
+        )
+
+
+def aggregate_query(query: str, tables: Dict[str, Set[str]]) -> Optional[AggregateQuery]:
+    """Parse a single-table aggregate query, or None if it has any other shape.
+
+    Accepted: SELECT of group columns and expressions over SUM/COUNT/MIN/MAX/
+    AVG/TOTAL calls, FROM one table without alias, an optional WHERE, GROUP BY
+    plain columns, HAVING, ORDER BY and LIMIT. Joins, subqueries, set
+    operations, window functions and qualified names are rejected.
+    """
+    try:
+        # The query is rebuilt from its tokens, so every character must be understood
+        tokens = tokenize(query, strict=True)
+    except ValueError:
+        return None
+    while tokens and tokens[-1].upper == ";":
+        tokens.pop()
+    if not tokens or tokens[0].upper != "SELECT":
+        return None
+    if sum(1 for token in tokens if token.upper == "SELECT") != 1 or any(token.upper == "." for token in tokens):
+        return None
+    for i, token in enumerate(tokens):
+        if token.upper in _UNSUPPORTED and not (
+            token.upper == "DISTINCT" and i >= 2 and tokens[i - 1].upper == "(" and tokens[i - 2].upper == "COUNT"
+        ):
+            return None
+
+    # Top-level clause boundaries
+    bounds = {}
+    depth = 0
+    for i, token in enumerate(tokens):
+        if token.upper == "(":
+            depth += 1
+        elif token.upper == ")":
+            depth -= 1
+        elif depth == 0:
+            if token.upper in ("FROM", "WHERE", "HAVING", "LIMIT"):
+                if token.upper in bounds:
+                    return None
+                bounds[token.upper] = i
+            elif token.upper in ("GROUP", "ORDER") and i + 1 < len(tokens) and tokens[i + 1].upper == "BY":
+                if token.upper in bounds:
+                    return None
+                bounds[token.upper] = i
+    if depth != 0 or "FROM" not in bounds:
+        return None
+    order = ["SELECT", "FROM", "WHERE", "GROUP", "HAVING", "ORDER", "LIMIT"]
+    positions = {"SELECT": 0, **bounds}
+    present = [name for name in order if name in positions]
+    if [positions[name] for name in present] != sorted(positions[name] for name in present):
+        return None
+    spans = {}
+    for index, name in enumerate(present):
+        start = positions[name] + (2 if name in ("GROUP", "ORDER") else 1)
+        end = positions[present[index + 1]] if index + 1 < len(present) else len(tokens)
+        spans[name] = (start, end)
+
+    # FROM exactly one known table, without alias
+    from_start, from_end = spans["FROM"]
+    if from_end - from_start != 1 or not tokens[from_start].is_identifier:
+        return None
+    table = {name.lower(): name for name in tables}.get(tokens[from_start].value.lower())
+    if table is None:
+        return None
+    columns = {column.lower(): column for column in tables[table]}
+    parsed = AggregateQuery(tokens, table, columns)
+
+    if "GROUP" in spans:
+        for item in _split(tokens, *spans["GROUP"], ","):
+            if len(item) != 1 or not tokens[item[0]].is_identifier:
+                return None
+            column = columns.get(tokens[item[0]].value.lower())
+            if column is None:
+                return None
+            if column not in parsed.group:
+                parsed.group.append(column)
+
+    if "WHERE" in spans:
+        for conjunct in _conjuncts(tokens, *spans["WHERE"]):
+            start, end = conjunct[0], conjunct[-1] + 1
+            if any(tokens[i].upper in _AGGREGATES and i + 1 < end and tokens[i + 1].upper == "(" for i in conjunct):
+                return None
+            parsed.conjuncts.append((parsed.render(start, end), parsed.referenced_columns(start, end)))
+
+    parsed.select = spans["SELECT"]
+    parsed.having = spans.get("HAVING")
+    parsed.order = spans.get("ORDER")
+    parsed.limit = spans.get("LIMIT")
+    for span in (parsed.select, parsed.having, parsed.order):
+        if span is None:
+            continue
+        calls = _aggregate_calls(parsed, *span)
+        if calls is None:
+            return None
+        parsed.aggregates.extend(calls)
+        # Outside aggregate calls only group columns may be referenced
+        inside = {i for call in calls for i in range(call.start, call.end)}
+        for i in range(*span):
+            token = tokens[i]
+            if i in inside or not token.is_identifier:
+                continue
+            column = columns.get(token.value.lower())
+            if column is not None and column not in parsed.group:
+                return None
+
+    if not parsed.aggregates and not parsed.group:
+        return None
+    return parsed
+
+
+def _aggregate_calls(parsed: AggregateQuery, start: int, end: int) -> Optional[List[AggregateCall]]:
+    tokens = parsed.tokens
+    calls = []
+    i = start
+    while i < end:
+        if tokens[i].upper in _AGGREGATES and i + 1 < end and tokens[i + 1].upper == "(":
+            close = _matching_paren(tokens, i + 1, end)
+            if close is None:
+                return None
+            arg_start = i + 2
+            distinct = arg_start < close and tokens[arg_start].upper == "DISTINCT"
+            if distinct:
+                arg_start += 1
+            argument = parsed.render(arg_start, close) or "*"
+            if any(token.upper in _AGGREGATES for token in tokens[arg_start:close]):
+                return None  # nested aggregates
+            calls.append(AggregateCall(tokens[i].upper, argument, distinct, i, close + 1))
+            i = close + 1
+        else:
+            i += 1
+    return calls
+
+
+def _matching_paren(tokens: List[Token], open_index: int, end: int) -> Optional[int]:
+    depth = 0
+    for i in range(open_index, end):
+        if tokens[i].upper == "(":
+            depth += 1
+        elif tokens[i].upper == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    return None
+
+
+def _split(tokens: List[Token], start: int, end: int, separator: str) -> List[List[int]]:
+    """Token indexes of start..end split on separator at parenthesis depth 0."""
+    items, current, depth = [], [], 0
+    for i in range(start, end):
+        upper = tokens[i].upper
+        if upper == "(":
+            depth += 1
+        elif upper == ")":
+            depth -= 1
+        if depth == 0 and upper == separator:
+            items.append(current)
+            current = []
+        else:
+            current.append(i)
+    items.append(current)
+    return [item for item in items if item]
+
+
+def _conjuncts(tokens: List[Token], start: int, end: int) -> List[List[int]]:
+    """WHERE split on top-level AND (the AND of BETWEEN x AND y excluded)."""
+    items, current, depth, between = [], [], 0, False
+    for i in range(start, end):
+        upper = tokens[i].upper
+        if upper == "(":
+            depth += 1
+        elif upper == ")":
+            depth -= 1
+        elif depth == 0 and upper == "BETWEEN":
+            between = True
+        elif depth == 0 and upper == "AND":
+            if between:
+                between = False
+            else:
+                items.append(current)
+                current = []
+                continue
+        elif depth == 0 and upper == "OR":
+            # A top-level OR makes the whole WHERE a single condition
+            return [list(range(start, end))]
+        current.append(i)
+    items.append(current)
+    return [item for item in items if item]
+
+
+def _quote_identifier(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
@@ -0,0 +1,114 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+_active_timer: ContextVar[Optional["RequestTimer"]] = ContextVar("request_timer", default=None)
+_current_node: ContextVar[Optional[str]] = ContextVar("request_timer_node", default=None)
+
+
+class RequestTimer:
+    """Accumulates where one request spends its time, per graph node and stage.
+
+    Stages are "llm" (chat model calls) and "sql" (schema and query calls);
+    whatever a node spends outside them is its own work. The timer is carried
+    in a context variable, so LLMManager and the database managers record into
+    it without being passed around, and recording is a no-op outside
+    RequestTimer.collect().
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queue_wait = 0.0
+        self.stages: Dict[str, float] = {}
+        self.nodes: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    @contextmanager
+    def collect(cls):
+        timer = cls()
+        token = _active_timer.set(timer)
+        try:
+            yield timer
+        finally:
+            _active_timer.reset(token)
+
+    def add(self, stage: str, seconds: float, node: str = None):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+            if node is not None:
+                times = self.nodes.setdefault(node, {})
+                times[stage] = times.get(stage, 0.0) + seconds
+
+    def summary(self) -> Dict:
+        """Durations in milliseconds: totals per stage and a per-node breakdown."""
+        nodes = {}
+        for node, times in self.nodes.items():
+            total = times.get("total", 0.0)
+            nodes[node] = {
+                "total_ms": _ms(total),
+                "llm_ms": _ms(times.get("llm", 0.0)),
+                "sql_ms": _ms(times.get("sql", 0.0)),
+                "other_ms": _ms(total - times.get("llm", 0.0) - times.get("sql", 0.0)),
+            }
+        formatting = self.nodes.get("format_data_for_visualization", {})
+        return {
+            "total_ms": _ms(time.perf_counter() - self.started),
+            "queue_ms": _ms(self.queue_wait),
+            "llm_ms": _ms(self.stages.get("llm", 0.0)),
+            "sql_ms": _ms(self.stages.get("sql", 0.0)),
+            "format_ms": _ms(formatting.get("total", 0.0) - formatting.get("llm", 0.0)),
+            "nodes": nodes,
+        }
+
+    def server_timing(self) -> str:
+        """Server-Timing header value for the summary."""
+        summary = self.summary()
+        metrics = [
+            f"{name};dur={summary[f'{name}_ms']}"
+            for name in ("queue", "llm", "sql", "format", "total")
+        ]
+        metrics += [
+            f"{node};dur={times['total_ms']}" for node, times in summary["nodes"].items()
+        ]
+        return ", ".join(metrics)
+
+
+@contextmanager
+def timed(stage: str):
+    """Record the enclosed block under stage for the active request, if any."""
+    timer = _active_timer.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(stage, time.perf_counter() - start, _current_node.get())
+
+
+def timed_node(name: str, fn: Callable[[dict], dict]) -> Callable[[dict], dict]:
+    """Wrap a graph node so its time, and the stages inside it, are attributed to it."""
+
+    @functools.wraps(fn)
+    def node(state: dict) -> dict:
+        timer = _active_timer.get()
+        if timer is None:
+            return fn(state)
+        token = _current_node.set(name)
+        start = time.perf_counter()
+        try:
+            return fn(state)
+        finally:
+            timer.add("total", time.perf_counter() - start, name)
+            _current_node.reset(token)
+
+    return node
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
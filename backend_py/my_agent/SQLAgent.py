@@ -3,12 +3,14 @@ from langchain_core.output_parsers import JsonOutputParser
 from my_agent.DatabaseManager import DatabaseManager
 from my_agent.LLMManager import LLMManager
 from my_agent.ConversationManager import ConversationManager
+from my_agent.SQLValidator import SQLValidator, describe_issues
 
 class SQLAgent:
-    def __init__(self):
-        self.db_manager = DatabaseManager()
-        self.llm_manager = LLMManager()
-        self.conversation_manager = ConversationManager()
+    def __init__(self, db_manager=None, llm_manager=None, conversation_manager=None, sql_validator=None):
+        self.db_manager = db_manager or DatabaseManager()
+        self.llm_manager = llm_manager or LLMManager()
+        self.conversation_manager = conversation_manager or ConversationManager()
+        self.sql_validator = sql_validator or SQLValidator()
 
     def get_conversation_context(self, uuid: str, session_id: str = None) -> str:
         """Get recent conversation context for follow-up questions."""
@@ -16,21 +18,8 @@ class SQLAgent:
             return ""
         
         try:
-            history = self.conversation_manager.get_conversation_history(session_id, limit=3)
-            if not history:
-                return ""
-            
-            context_parts = []
-            for entry in reversed(history):  # Reverse to get chronological order
-                if entry['question'] and entry['sql_query']:
-                    context_parts.append(f"Previous Q: {entry['question']}")
-                    context_parts.append(f"Previous SQL: {entry['sql_query']}")
-                    if entry['results_summary']:
-                        context_parts.append(f"Previous Result: {entry['results_summary']}")
-            
-            if context_parts:
-                return "===Recent conversation context:\n" + "\n".join(context_parts) + "\n\n"
-            return ""
+            # Served from the in-memory per-session ring buffer
+            return self.conversation_manager.get_conversation_context(session_id)
         except Exception as e:
             print(f"Error getting conversation context: {e}")
             return ""
@@ -182,26 +171,21 @@ Generate SQL query string'''),
             return {"sql_query": cleaned_query}
 
     def validate_and_fix_sql(self, state: dict) -> dict:
-        """Validate and fix the generated SQL query."""
+        """Validate the generated SQL against the schema, without running it."""
         sql_query = state['sql_query']
 
         if sql_query == "NOT_RELEVANT":
             return {"sql_query": "NOT_RELEVANT", "sql_valid": False}
-        
-        # TEMPORARY FIX: Skip LLM validation and assume SQL is valid
-        # The validation LLM was causing queries to hang or be incorrectly marked invalid
-        # We'll validate by actually testing the query execution instead
+
+        # Compiled against an empty copy of the tables: checks every table,
+        # column and function the query uses, and that it only reads, at a
+        # cost independent of the data size. The schema is cached per database.
         try:
-            # Test the query by executing it
-            results = self.db_manager.execute_query(state['uuid'], sql_query)
-            return {"sql_query": sql_query, "sql_valid": True}
+            issues = self.sql_validator.validate(self.db_manager.get_schema(state['uuid']), sql_query)
         except Exception as e:
-            # If query fails, it's invalid
-            return {
-                "sql_query": sql_query, 
-                "sql_valid": False,
-                "sql_issues": f"Query execution failed: {str(e)}"
-            }
+            print(f"Error validating SQL: {e}")
+            issues = []
+        return {"sql_query": sql_query, "sql_valid": not issues, "sql_issues": issues}
 
     def execute_sql(self, state: dict) -> dict:
         """Execute SQL query and return results."""
@@ -210,6 +194,19 @@ Generate SQL query string'''),
         
         if query == "NOT_RELEVANT":
             return {"results": "NOT_RELEVANT"}
+        if state.get('sql_issues'):
+            # Would fail anyway, or must not run at all (writes)
+            return {"error": describe_issues(state['sql_issues']), "results": []}
+
+        if state.get('progressive'):
+            # Answer from the table's sample now; the exact rows follow later
+            try:
+                approximate = self.db_manager.execute_progressive(uuid, query)
+            except Exception as e:
+                print(f"Error running query on the sample: {e}")
+                approximate = None
+            if approximate is not None:
+                return {"results": approximate.pop("results"), "approximate": approximate}
 
         try:
             results = self.db_manager.execute_query(uuid, query)
@@ -226,16 +223,12 @@ Generate SQL query string'''),
         sql_query = state.get('sql_query', '')
         visualization = state.get('visualization', 'none')
         error = state.get('error')
+        approximate = state.get('approximate')
 
         if results == "NOT_RELEVANT":
             answer = "Sorry, I can only give answers relevant to the database."
         else:
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", "You are an AI assistant that formats database query results into a human-readable response. Give a conclusion to the user's question based on the query results. Do not give the answer in markdown format. Only give the answer in one line."),
-                ("human", "User question: {question}\n\nQuery results: {results}\n\nFormatted response:"),
-            ])
-
-            answer = self.llm_manager.invoke(prompt, question=question, results=results)
+            answer = self.answer(question, results, approximate)
 
         # Save conversation to history
         try:
@@ -249,6 +242,8 @@ Generate SQL query string'''),
                 results_summary = "No data found"
             else:
                 results_summary = f"Found {len(results) if isinstance(results, list) else 1} rows"
+                if approximate:
+                    results_summary += f" (estimated from a {approximate['fraction']:.0%} sample)"
             
             self.conversation_manager.save_conversation(
                 session_id=session_id,
@@ -257,13 +252,32 @@ Generate SQL query string'''),
                 results_summary=results_summary,
                 visualization_type=visualization,
                 error_message=error,
-                database_uuid=uuid
+                database_uuid=uuid,
+                answer=answer,
             )
         except Exception as e:
             print(f"Error saving conversation: {e}")
         
         return {"answer": answer, "session_id": session_id}
 
+    def answer(self, question: str, results, approximate: dict = None) -> str:
+        """One-line answer to question from its query results.
+
+        approximate is the sample the results were estimated from, if any;
+        the answer then says its figures are estimates.
+        """
+        system = "You are an AI assistant that formats database query results into a human-readable response. Give a conclusion to the user's question based on the query results. Do not give the answer in markdown format. Only give the answer in one line."
+        if approximate:
+            system += (
+                f" The results are estimates computed from a random {approximate['fraction']:.0%} sample of the data,"
+                " not exact figures: say that the numbers are approximate."
+            )
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", system),
+            ("human", "User question: {question}\n\nQuery results: {results}\n\nFormatted response:"),
+        ])
+        return self.llm_manager.invoke(prompt, question=question, results=results)
+
     def choose_visualization(self, state: dict) -> dict:
         """Choose an appropriate visualization for the data."""
         question = state['question']
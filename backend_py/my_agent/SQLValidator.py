@@ -0,0 +1,178 @@
+import difflib
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# The CREATE statements in a schema description, as written by
+# LocalDatabaseManager._describe and the database service
+_CREATE_STATEMENT = re.compile(r"^CREATE statement: (.*?)\n\n", re.DOTALL | re.MULTILINE)
+
+# What a query may do; anything else the authorizer reports is a write
+_ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+# Table-valued functions (json_each, json_tree, ...) make SQLite report an
+# UPDATE of the schema table while compiling; actually writing it fails anyway
+_SCHEMA_TABLES = {"sqlite_master", "sqlite_schema", "sqlite_temp_master", "sqlite_temp_schema"}
+_ACTION_NAMES = {
+    getattr(sqlite3, f"SQLITE_{name}"): name.replace("_", " ")
+    for name in (
+        "ALTER_TABLE", "ANALYZE", "ATTACH", "CREATE_INDEX", "CREATE_TABLE", "CREATE_TEMP_INDEX",
+        "CREATE_TEMP_TABLE", "CREATE_TEMP_TRIGGER", "CREATE_TEMP_VIEW", "CREATE_TRIGGER", "CREATE_VIEW",
+        "CREATE_VTABLE", "DELETE", "DETACH", "DROP_INDEX", "DROP_TABLE", "DROP_TEMP_INDEX",
+        "DROP_TEMP_TABLE", "DROP_TEMP_TRIGGER", "DROP_TEMP_VIEW", "DROP_TRIGGER", "DROP_VIEW",
+        "DROP_VTABLE", "INSERT", "PRAGMA", "REINDEX", "SAVEPOINT", "TRANSACTION", "UPDATE",
+    )
+}
+
+# SQLite error messages for the issues a fix can target, by issue type
+_ERRORS = [
+    ("multiple_statements", re.compile(r"^You can only execute one statement at a time")),
+    ("unknown_table", re.compile(r"^no such table: (?:\w+\.)?(.+)$")),
+    ("unknown_column", re.compile(r"^no such column: (.+)$")),
+    ("ambiguous_column", re.compile(r"^ambiguous column name: (.+)$")),
+    ("unknown_function", re.compile(r"^no such function: (.+)$")),
+    ("syntax_error", re.compile(r"^(?:near \"(.*)\": syntax error|incomplete input)$")),
+]
+
+
+def create_statements(schema: str) -> Tuple[str, ...]:
+    """The CREATE statements of every table in a schema description."""
+    return tuple(statement.strip() for statement in _CREATE_STATEMENT.findall(schema))
+
+
+class _Skeleton:
+    """An empty in-memory copy of a database's tables: the schema without the data."""
+
+    def __init__(self, statements: Tuple[str, ...]):
+        self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.complete = True
+        for statement in statements:
+            try:
+                self.conn.execute(statement)
+            except sqlite3.Error as e:
+                # SQLite's own tables (sqlite_stat1, ...) and the shadow tables
+                # a virtual table creates itself need no copy
+                if "already exists" not in str(e) and "reserved for internal use" not in str(e):
+                    print(f"Error copying table definition for validation: {e}")
+                    self.complete = False
+        self.columns: Dict[str, List[str]] = {
+            table: [row[0] for row in self.conn.execute("SELECT name FROM pragma_table_info(?)", (table,))]
+            for (table,) in self.conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+            )
+        }
+        self.lock = threading.Lock()
+
+
+class SQLValidator:
+    """Checks generated SQL without reading any data.
+
+    The query is compiled with EXPLAIN against a skeleton of the database: the
+    tables from the schema's CREATE statements, created empty in memory. That
+    resolves every table, column and function the query references and checks
+    its syntax, while an authorizer rejects anything but reading. The cost
+    depends on the query and the schema only, never on the size of the data,
+    and the same validation works for local and remote databases.
+    Skeletons are kept per schema.
+    """
+
+    def __init__(self, cache_size: int = 32):
+        self.cache_size = cache_size
+        self._skeletons: "OrderedDict[Tuple[str, ...], _Skeleton]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def validate(self, schema: str, query: str) -> List[Dict]:
+        """Issues found in query, or an empty list if it can run against schema.
+
+        Each issue has a "type" (forbidden_statement, multiple_statements,
+        unknown_table, unknown_column, ambiguous_column, unknown_function,
+        syntax_error or invalid) and a "message"; issues about a name also
+        carry the "name" and the closest existing names as "suggestions".
+        """
+        statements = create_statements(schema)
+        if not statements:
+            return []  # nothing to check against; leave it to execution
+        skeleton = self._skeleton(statements)
+        if not skeleton.complete:
+            # Unknown tables could be ones the skeleton lacks
+            return []
+
+        denied: List[str] = []
+
+        def authorize(action, arg1, arg2, db_name, trigger):
+            if action in _ALLOWED_ACTIONS:
+                return sqlite3.SQLITE_OK
+            if action == sqlite3.SQLITE_UPDATE and arg1 in _SCHEMA_TABLES:
+                return sqlite3.SQLITE_OK
+            denied.append(_ACTION_NAMES.get(action, str(action)))
+            return sqlite3.SQLITE_DENY
+
+        with skeleton.lock:
+            skeleton.conn.set_authorizer(authorize)
+            try:
+                skeleton.conn.execute(f"EXPLAIN {query}").fetchall()
+                return []
+            except (sqlite3.Error, sqlite3.Warning) as e:
+                message = str(e)
+            finally:
+                skeleton.conn.set_authorizer(None)
+
+        if denied:
+            return [
+                {
+                    "type": "forbidden_statement",
+                    "message": f"Only SELECT queries are allowed; the query would {denied[0]}",
+                    "name": denied[0],
+                }
+            ]
+        return [self._issue(skeleton, message)]
+
+    def _issue(self, skeleton: _Skeleton, message: str) -> Dict:
+        for issue_type, pattern in _ERRORS:
+            match = pattern.match(message)
+            if match is None:
+                continue
+            issue = {"type": issue_type, "message": message}
+            name = match.group(1) if match.groups() else None
+            if name is not None:
+                issue["name"] = name
+            if issue_type == "unknown_table":
+                issue["suggestions"] = _closest(name, skeleton.columns)
+            elif issue_type in ("unknown_column", "ambiguous_column"):
+                column = name.rsplit(".", 1)[-1]
+                tables = [table for table, columns in skeleton.columns.items() if column in columns]
+                issue["suggestions"] = (
+                    [f"{table}.{column}" for table in tables]
+                    if issue_type == "ambiguous_column"
+                    else _closest(column, {c for columns in skeleton.columns.values() for c in columns})
+                )
+            return issue
+        return {"type": "invalid", "message": message}
+
+    def _skeleton(self, statements: Tuple[str, ...]) -> _Skeleton:
+        with self._lock:
+            skeleton = self._skeletons.get(statements)
+            if skeleton is not None:
+                self._skeletons.move_to_end(statements)
+                return skeleton
+
+        skeleton = _Skeleton(statements)
+        with self._lock:
+            # Another thread may have built it meanwhile; either copy works
+            self._skeletons[statements] = skeleton
+            while len(self._skeletons) > self.cache_size:
+                self._skeletons.popitem(last=False)
+        return skeleton
+
+
+def _closest(name: Optional[str], names) -> List[str]:
+    if not name:
+        return []
+    by_lower = {candidate.lower(): candidate for candidate in names}
+    return [by_lower[match] for match in difflib.get_close_matches(name.lower(), by_lower, n=3, cutoff=0.75)]
+
+
+def describe_issues(issues: List[Dict]) -> str:
+    """Issues as one line of text, e.g. for an error message."""
+    return "; ".join(issue["message"] for issue in issues)
@@ -0,0 +1,267 @@
+import os
+import queue
+import sqlite3
+import stat
+import threading
+import time
+import uuid as uuid_lib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+from urllib.request import pathname2url
+
+from my_agent.QueryAnalyzer import aggregate_query, table_columns
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+# Aggregates that grow with the number of rows, scaled up from the sample
+_SCALED = {"SUM": "({} * {})", "TOTAL": "({} * {})", "COUNT": "CAST(ROUND({} * {}) AS INTEGER)"}
+
+
+class SampleStore:
+    """Random samples of large uploaded tables, for approximate answers.
+
+    After an upload, a background thread copies a Bernoulli sample of
+    every table with at least min_rows rows into the database's sample.sqlite
+    sidecar, keeping each row with probability fraction. Single-table
+    aggregate queries can then run against the sample in time proportional
+    to the sample, with SUM, TOTAL and COUNT scaled up by the table's
+    source/sample row ratio (AVG, MIN and MAX are left as they are; DISTINCT
+    aggregates are not estimated). The exact query meanwhile runs on a
+    background pool, and the caller collects its rows by id.
+
+    Samples are tied to UploadStore.version() like summaries: a re-upload
+    deletes them and a version mismatch makes them invisible.
+    """
+
+    def __init__(self, upload_store, fraction: float = None, min_rows: int = None, exact_workers: int = None):
+        self.upload_store = upload_store
+        self.fraction = fraction or float(os.getenv("SAMPLE_FRACTION", 0.01))
+        self.min_rows = min_rows if min_rows is not None else int(os.getenv("SAMPLE_MIN_ROWS", 1000000))
+        self.exact_workers = exact_workers or int(os.getenv("SAMPLE_EXACT_WORKERS", 2))
+        # Exact results nobody collected are dropped after this long
+        self.exact_ttl = float(os.getenv("SAMPLE_EXACT_TTL_S", 600))
+        self._lock = threading.Lock()
+        self._samples = {}  # content id -> (file signature, (table columns, {table: sample info}) or None)
+        self._exact: Dict[str, tuple] = {}  # id -> (Future, monotonic time submitted)
+        self._builds = None
+        self._thread = None
+        self._executor = None
+        self._build_pid = None
+        self._exact_pid = None
+
+    def path(self, uuid: str) -> str:
+        return self.upload_store.sidecar_path(uuid, "sample.sqlite")
+
+    def execute(self, uuid: str, query: str) -> Optional[Dict]:
+        """Approximate rows for query from the sample, or None if it has none.
+
+        Returns the rows with the sample they came from: "table",
+        "fraction" (the stated sampling fraction), "sample_rows",
+        "source_rows" and the "scale" applied to SUM, TOTAL and COUNT.
+        """
+        version = self.upload_store.version(uuid)
+        loaded = self._load(uuid, self.upload_store.content_id(uuid), version)
+        if loaded is None:
+            return None
+        tables, samples = loaded
+        # None too for queries the tokenizer cannot rebuild exactly
+        parsed = aggregate_query(query, tables)
+        if parsed is None or parsed.table not in samples or not parsed.aggregates:
+            return None
+        if any(call.distinct for call in parsed.aggregates):
+            return None
+
+        sample = samples[parsed.table]
+        scale = sample["source_rows"] / max(sample["sample_rows"], 1)
+        replacements = {}
+        for call in parsed.aggregates:
+            if call.function in _SCALED:
+                text = parsed.render(call.start, call.end)
+                replacements[call.start] = (call.end, _SCALED[call.function].format(text, repr(scale)))
+        sql = parsed.render(0, len(parsed.tokens), replacements)
+        try:
+            conn = sqlite3.connect(f"file:{pathname2url(self.path(uuid))}?mode=ro", uri=True)
+            try:
+                rows = [list(row) for row in conn.execute(sql).fetchall()]
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Error querying the sample of {uuid}, running the query in full: {e}")
+            return None
+        return {"results": rows, "table": parsed.table, "scale": scale, **sample}
+
+    def run_exact(self, fn: Callable[[], List]) -> str:
+        """Run fn (the exact query) in the background; returns an id for exact_result()."""
+        now = time.monotonic()
+        with self._lock:
+            if self._executor is None or self._exact_pid != os.getpid():
+                # Threads do not survive a fork
+                self._executor = ThreadPoolExecutor(max_workers=self.exact_workers, thread_name_prefix="exact-query")
+                self._exact = {}
+                self._exact_pid = os.getpid()
+            self._exact = {
+                key: (future, submitted)
+                for key, (future, submitted) in self._exact.items()
+                if not future.done() or now - submitted < self.exact_ttl
+            }
+            exact_id = uuid_lib.uuid4().hex
+            self._exact[exact_id] = (self._executor.submit(fn), now)
+        return exact_id
+
+    def exact_result(self, exact_id: str, timeout: float = None) -> List:
+        """Rows of an exact query, waiting for it; raises its error, or KeyError if unknown."""
+        with self._lock:
+            future, _ = self._exact.pop(exact_id)
+        return future.result(timeout)
+
+    def samples(self, uuid: str) -> List[Dict]:
+        """Sampled tables of a database, for inspection."""
+        loaded = self._load(uuid, self.upload_store.content_id(uuid), self.upload_store.version(uuid))
+        if loaded is None:
+            return []
+        return [{"table": table, **sample} for table, sample in loaded[1].items()]
+
+    def _load(self, uuid: str, content_id: str, version: str):
+        """(table columns, sample info) of uuid's sample, re-read when the file changes."""
+        try:
+            info = os.stat(self.path(uuid))
+        except FileNotFoundError:
+            return None
+        signature = (version, info.st_ino, info.st_mtime_ns, info.st_size)
+        cached = self._samples.get(content_id)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        loaded = None
+        try:
+            conn = sqlite3.connect(f"file:{pathname2url(self.path(uuid))}?mode=ro", uri=True)
+            try:
+                stored = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+                if stored and stored[0] == version:
+                    samples = {
+                        table: {"fraction": fraction, "sample_rows": sample_rows, "source_rows": source_rows}
+                        for table, fraction, sample_rows, source_rows in conn.execute(
+                            "SELECT source_table, fraction, sample_rows, source_rows FROM samples"
+                        )
+                    }
+                    tables = {name: columns for name, columns in table_columns(conn).items() if name in samples}
+                    loaded = (tables, samples) if samples else None
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Error loading the sample of {uuid}: {e}")
+        with self._lock:
+            self._samples[content_id] = (signature, loaded)
+        return loaded
+
+    def schedule(self, uuid: str):
+        """Build uuid's sample in the background."""
+        if self._thread is None or self._build_pid != os.getpid():
+            with self._lock:
+                if self._thread is None or self._build_pid != os.getpid():
+                    self._builds = queue.Queue()
+                    self._build_pid = os.getpid()
+                    self._thread = threading.Thread(target=self._run, name="sample-store", daemon=True)
+                    self._thread.start()
+        self._builds.put((uuid, self.upload_store.version(uuid)))
+
+    def _run(self):
+        while True:
+            uuid, version = self._builds.get()
+            try:
+                self.build(uuid, version)
+            except Exception as e:
+                print(f"Error sampling {uuid}: {e}")
+
+    def build(self, uuid: str, version: str) -> List[str]:
+        """Write the sample of every large table of uuid; returns the tables sampled."""
+        if self.upload_store.version(uuid) != version:
+            return []
+        path = self.path(uuid)
+        lock_file = None
+        if fcntl is not None:
+            lock_file = open(path + ".lock", "w")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if os.path.exists(path):
+                return []  # another process sampled this content already
+            # Built aside and renamed into place, so readers never see half a sample
+            staging = f"{path}.{os.getpid()}.tmp"
+            try:
+                conn = sqlite3.connect(staging, isolation_level=None)
+                try:
+                    sampled = self._build(conn, uuid, version)
+                finally:
+                    conn.close()
+                if sampled:
+                    os.replace(staging, path)
+                return sampled
+            finally:
+                if os.path.exists(staging):
+                    os.remove(staging)
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+
+    def _build(self, conn, uuid, version) -> List[str]:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute(
+            """
+            CREATE TABLE samples (
+                source_table TEXT PRIMARY KEY,
+                fraction REAL NOT NULL,
+                sample_rows INTEGER NOT NULL,
+                source_rows INTEGER NOT NULL,
+                built_at TIMESTAMP
+            )
+        """
+        )
+        conn.execute("INSERT INTO meta (key, value) VALUES ('version', ?)", (version,))
+
+        source = self.upload_store.path(uuid)
+        immutable = not os.stat(source).st_mode & stat.S_IWUSR
+        conn.execute(
+            "ATTACH DATABASE ? AS src",
+            (f"file:{pathname2url(source)}?mode=ro" + ("&immutable=1" if immutable else ""),),
+        )
+        try:
+            tables = conn.execute(
+                "SELECT name, sql FROM src.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+            ).fetchall()
+            # random() is uniform over 64-bit integers; keep a row below the threshold
+            threshold = min(int(self.fraction * 2 ** 63) * 2 - 2 ** 63, 2 ** 63 - 1)
+            sampled = []
+            for name, create_statement in tables:
+                source_rows = conn.execute(f"SELECT COUNT(*) FROM src.{_quote(name)}").fetchone()[0]
+                if source_rows < self.min_rows:
+                    continue
+                # The table's own definition keeps column types and affinities
+                conn.execute(create_statement)
+                conn.execute(
+                    f"INSERT INTO main.{_quote(name)} SELECT * FROM src.{_quote(name)} WHERE random() < ?",
+                    (threshold,),
+                )
+                sample_rows = conn.execute(f"SELECT COUNT(*) FROM main.{_quote(name)}").fetchone()[0]
+                conn.execute(
+                    "INSERT INTO samples VALUES (?, ?, ?, ?, ?)",
+                    (
+                        name,
+                        self.fraction,
+                        sample_rows,
+                        source_rows,
+                        datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                    ),
+                )
+                sampled.append(name)
+            return sampled
+        finally:
+            conn.execute("DETACH DATABASE src")
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
@@ -11,13 +11,16 @@ class State(TypedDict):
     unique_nouns: List[str]
     sql_query: str
     sql_valid: bool
-    sql_issues: str
+    sql_issues: List[Dict[str, Any]]  # SQLValidator issues, empty when valid
     results: List[Any]
     answer: str
     error: str
     visualization: str
     visualization_reason: str
     formatted_data_for_visualization: Dict[str, Any]
+    chart_encoding: Optional[str]  # "columnar" for parallel-array chart payloads
+    progressive: Optional[bool]  # answer from a sample first (SampleStore)
+    approximate: Optional[Dict[str, Any]]  # the sample the results came from, if any
 
 # Keep the old ones for backward compatibility
 InputState = State
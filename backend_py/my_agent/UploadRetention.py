@@ -0,0 +1,311 @@
+import os
+import threading
+import time
+from typing import Dict, List
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+# Staging and temporary files older than this were left behind by a crash
+_STALE_TEMP_S = 24 * 3600
+_TEMP_SUFFIXES = (".upload", ".tmp")
+# Files kept alongside a database's <id>.sqlite
+_SIDECAR_SUFFIXES = (
+    ".version",
+    ".access",
+    ".advisor.json",
+    ".advisor.lock",
+    ".summaries.sqlite",
+    ".summaries.sqlite-journal",
+    ".summaries.sqlite.lock",
+    ".sample.sqlite",
+    ".sample.sqlite.lock",
+)
+
+
+class UploadRetention:
+    """Background worker that keeps the uploads directory within a disk budget.
+
+    Each stored database counts with its sidecars (summaries, advisor report,
+    version, locks). When the total passes max_bytes, databases are evicted
+    least recently used first, with their sidecars and every uuid aliasing
+    them. A database is kept if this process has a connection to it lent out,
+    if it was used in the last min_idle_seconds (which covers connections in
+    other processes; they keep working on the unlinked file anyway), if
+    one of its uuids has a session active in the last active_session_minutes,
+    or if a saved chart queries one of its uuids.
+    Candidates are looked at again right before eviction, so a database
+    used or re-uploaded since the scan is kept. Leftover staging files,
+    aliases whose data is gone and sidecars of data that is gone are removed
+    as well. As with ConversationRetention, a lock file makes sure only one
+    process runs the worker.
+    """
+
+    def __init__(
+        self,
+        upload_store,
+        conversation_manager,
+        max_bytes: int = None,
+        min_idle_seconds: float = None,
+        active_session_minutes: int = None,
+        interval_seconds: float = None,
+    ):
+        self.upload_store = upload_store
+        self.conversation_manager = conversation_manager
+        self.max_bytes = (
+            max_bytes
+            if max_bytes is not None
+            else int(os.getenv("UPLOAD_MAX_MB", 0)) * 1024 * 1024
+        )
+        self.min_idle_seconds = _env_float("UPLOAD_MIN_IDLE_S", 600, min_idle_seconds)
+        self.active_session_minutes = int(
+            _env_float("UPLOAD_ACTIVE_SESSION_MINUTES", 30, active_session_minutes)
+        )
+        self.interval_seconds = _env_float("UPLOAD_RETENTION_INTERVAL_S", 600, interval_seconds)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_file = None
+        self._last_run = None
+
+    def start(self) -> bool:
+        """Start the worker thread unless another process already runs one."""
+        if not self._acquire_lock():
+            return False
+        self._thread = threading.Thread(target=self._run, name="upload-retention", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def schedule(self):
+        """Wake the worker early, e.g. after an upload."""
+        self._wake.set()
+
+    def run_once(self) -> Dict:
+        """Apply the disk budget once and report what was done."""
+        now = time.time()
+        removed = self._remove_leftovers(now)
+        databases = self.databases()
+        used = sum(db["bytes"] for db in databases)
+
+        evicted, freed = 0, 0
+        if self.max_bytes and used > self.max_bytes:
+            # Saved charts must stay refreshable, however long ago they were used
+            active = self.conversation_manager.get_active_databases(
+                self.active_session_minutes
+            ) | self.conversation_manager.get_saved_chart_databases()
+            for db in sorted(databases, key=lambda db: db["last_access"]):
+                if used - freed <= self.max_bytes:
+                    break
+                if not self._evictable(db, active, now):
+                    continue
+                # The scan may be stale by now: a request may have used it or
+                # linked a new uuid to it meanwhile
+                db = self._refresh(db)
+                if not self._evictable(db, active, time.time()):
+                    continue
+                self._evict(db)
+                evicted += 1
+                freed += db["bytes"]
+
+        self._last_run = {
+            "timestamp": now,
+            "evicted": evicted,
+            "freed_bytes": freed,
+            "leftovers_removed": removed,
+        }
+        usage = self.usage()
+        del usage["last_run"]
+        return {**self._last_run, **usage}
+
+    def usage(self) -> Dict:
+        """Disk used by uploaded databases against the budget."""
+        databases = self.databases()
+        return {
+            "used_bytes": sum(db["bytes"] for db in databases),
+            "max_bytes": self.max_bytes,
+            "databases": len(databases),
+            "uuids": sum(len(db["uuids"]) for db in databases),
+            "oldest_access": min((db["last_access"] for db in databases), default=None),
+            "last_run": self._last_run,
+        }
+
+    def databases(self) -> List[Dict]:
+        """Every stored database with its uuids, files, size and last access."""
+        store = self.upload_store
+        databases = {}
+
+        def entry(directory, key):
+            return databases.setdefault(
+                (directory, key), {"id": key, "uuids": [], "files": [], "bytes": 0}
+            )
+
+        with os.scandir(store.content_dir) as entries:
+            for item in entries:
+                if item.is_file() and not item.name.endswith(_TEMP_SUFFIXES):
+                    db = entry(store.content_dir, item.name.split(".", 1)[0])
+                    db["files"].append(item.path)
+                    db["bytes"] += item.stat().st_size
+
+        with os.scandir(store.upload_dir) as entries:
+            for item in entries:
+                # <uuid>.summaries.sqlite and the like belong to a database
+                if not item.name.endswith(".sqlite") or item.name.endswith(_SIDECAR_SUFFIXES):
+                    continue
+                uuid = item.name[: -len(".sqlite")]
+                if item.is_symlink():
+                    target = os.path.realpath(item.path)
+                    key = os.path.basename(target)[: -len(".sqlite")]
+                    if (store.content_dir, key) in databases:
+                        entry(store.content_dir, key)["uuids"].append(uuid)
+                elif item.is_file():
+                    # Stored before deduplication: the file and its sidecars
+                    db = entry(store.upload_dir, uuid)
+                    db["uuids"].append(uuid)
+                    for suffix in _legacy_suffixes(store.upload_dir, uuid):
+                        path = os.path.join(store.upload_dir, uuid + suffix)
+                        db["files"].append(path)
+                        db["bytes"] += os.path.getsize(path)
+
+        result = []
+        for (directory, key), db in databases.items():
+            db["data_path"] = os.path.join(directory, f"{key}.sqlite")
+            db["last_access"] = _last_access(db)
+            db["stored"] = os.path.exists(db["data_path"])
+            result.append(db)
+        return result
+
+    def _refresh(self, db: Dict) -> Dict:
+        """db with its last access and uuids read again from disk."""
+        uuids = db["uuids"]
+        if os.path.dirname(db["data_path"]) == self.upload_store.content_dir:
+            target = os.path.realpath(db["data_path"])
+            with os.scandir(self.upload_store.upload_dir) as entries:
+                uuids = [
+                    item.name[: -len(".sqlite")]
+                    for item in entries
+                    if item.name.endswith(".sqlite")
+                    and item.is_symlink()
+                    and os.path.realpath(item.path) == target
+                ]
+        db = {**db, "uuids": uuids}
+        db["last_access"] = _last_access(db)
+        return db
+
+    def _evictable(self, db: Dict, active, now: float) -> bool:
+        if now - db["last_access"] < self.min_idle_seconds:
+            return False
+        if any(uuid in active for uuid in db["uuids"]):
+            return False
+        return not any(self.upload_store.in_use(uuid) for uuid in db["uuids"])
+
+    def _evict(self, db: Dict):
+        # Aliases first, so requests see "not found" rather than half a database
+        for uuid in db["uuids"]:
+            self.upload_store.release(uuid)
+            _remove(self.upload_store.path(uuid))
+        for path in db["files"]:
+            _remove(path)
+        print(f"Evicted upload {db['id']} ({db['bytes']} bytes, uuids {db['uuids']})")
+
+    def _remove_leftovers(self, now: float) -> int:
+        """Remove crashed uploads' staging files, aliases of removed data and
+        sidecars of removed data."""
+        removed = 0
+        for directory in (self.upload_store.upload_dir, self.upload_store.content_dir):
+            # Sidecars by the stem of the data file they belong to
+            sidecars: Dict[str, List] = {}
+            busy = set()
+            with os.scandir(directory) as entries:
+                for item in entries:
+                    stem = item.name.split(".", 1)[0]
+                    if item.name.endswith(".sqlite") and item.is_symlink():
+                        stale = not os.path.exists(item.path)
+                    elif item.name.endswith(_TEMP_SUFFIXES) and item.is_file():
+                        stale = now - item.stat().st_mtime > _STALE_TEMP_S
+                        busy.add(stem)
+                    else:
+                        if item.name.endswith(_SIDECAR_SUFFIXES) and item.is_file():
+                            sidecars.setdefault(stem, []).append(item)
+                        continue
+                    if stale:
+                        _remove(item.path)
+                        removed += 1
+
+            for stem, items in sidecars.items():
+                # Data still being written, or removed only just now, keeps
+                # its sidecars a little longer
+                if stem in busy or os.path.lexists(os.path.join(directory, f"{stem}.sqlite")):
+                    continue
+                if now - max(item.stat().st_mtime for item in items) < self.min_idle_seconds:
+                    continue
+                for item in items:
+                    _remove(item.path)
+                    removed += 1
+        return removed
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                report = self.run_once()
+                if report["evicted"] or report["leftovers_removed"]:
+                    print(f"Upload retention: {report}")
+            except Exception as e:
+                print(f"Error applying upload retention: {e}")
+            self._wake.wait(self.interval_seconds)
+            self._wake.clear()
+
+    def _acquire_lock(self) -> bool:
+        if fcntl is None:
+            return True
+        self._lock_file = open(
+            os.path.join(self.upload_store.upload_dir, "uploads.retention.lock"), "w"
+        )
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+
+
+def _legacy_suffixes(directory: str, uuid: str) -> List[str]:
+    """The database file and sidecars of a pre-deduplication upload."""
+    suffixes = [".sqlite"]
+    for suffix in _SIDECAR_SUFFIXES:
+        if os.path.exists(os.path.join(directory, uuid + suffix)):
+            suffixes.append(suffix)
+    return suffixes
+
+
+def _last_access(db: Dict) -> float:
+    data_path = db["data_path"]
+    for path in (data_path[: -len(".sqlite")] + ".access", data_path):
+        try:
+            return os.stat(path).st_mtime
+        except FileNotFoundError:
+            continue
+    # Sidecars of data that is gone (or still being published) count from
+    # their own age
+    return max((os.stat(path).st_mtime for path in db["files"] if os.path.exists(path)), default=0)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _env_float(name: str, default: float, override) -> float:
+    if override is not None:
+        return override
+    return float(os.getenv(name, default))
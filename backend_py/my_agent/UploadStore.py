@@ -0,0 +1,324 @@
+import hashlib
+import os
+import queue
+import sqlite3
+import stat
+import threading
+import time
+import uuid as uuid_lib
+from contextlib import contextmanager
+from typing import IO, List
+from urllib.request import pathname2url
+
+
+class DatabaseNotFound(Exception):
+    pass
+
+
+class InvalidDatabase(Exception):
+    pass
+
+
+class UploadStore:
+    """Uploaded databases on disk: optimized once at upload, then read-only.
+
+    finalize() turns a freshly uploaded file into its served form: it checks
+    the file, rewrites it with VACUUM INTO at page_size, gathers ANALYZE
+    statistics, switches it to a rollback journal and drops its write
+    permission. Read-only files are opened with SQLite's immutable URI flag,
+    which skips file locking and change detection on every read; files that
+    predate this (still writable) are opened read-only without it. Connections
+    are pooled per database and discarded when the file is replaced.
+
+    Uploads are stored once per content: content/<sha256>.sqlite holds the
+    data and <uuid>.sqlite is a symlink to it, so every uuid uploaded with the
+    same bytes shares one file, one connection pool and one set of sidecars
+    (version, summaries, advisor report). Databases from before this are
+    plain files and keep their sidecars under their own uuid.
+
+    Use is recorded as the mtime of an access sidecar (touched at most once a
+    minute per process), which UploadRetention evicts by.
+    """
+
+    def __init__(self, upload_dir: str, page_size: int = None, pool_size: int = 4):
+        self.upload_dir = upload_dir
+        self.content_dir = os.path.join(upload_dir, "content")
+        os.makedirs(self.content_dir, exist_ok=True)
+        self._content_realpath = os.path.realpath(self.content_dir)
+        self.page_size = page_size or int(os.getenv("UPLOAD_PAGE_SIZE", 8192))
+        self.pool_size = pool_size
+        self._pools = {}
+        self._borrowed = {}  # data path -> connections currently lent out
+        self._touched = {}  # data path -> last time its access file was touched
+        self._lock = threading.Lock()
+
+    def path(self, uuid: str) -> str:
+        return os.path.join(self.upload_dir, f"{uuid}.sqlite")
+
+    def staging_path(self, uuid: str) -> str:
+        """Where an upload is written before finalize() moves it into place."""
+        return os.path.join(self.upload_dir, f"{uuid}.upload")
+
+    def data_path(self, uuid: str) -> str:
+        """The file holding uuid's data, with aliases resolved."""
+        return os.path.realpath(self.path(uuid))
+
+    def content_id(self, uuid: str) -> str:
+        """Identity of the data behind uuid, shared by all of its aliases.
+
+        The content hash for deduplicated uploads, uuid itself otherwise.
+        """
+        return self._location(uuid)[1]
+
+    def sidecar_path(self, uuid: str, suffix: str) -> str:
+        """Path of a file kept alongside a database, e.g. its summaries."""
+        directory, key = self._location(uuid)
+        return os.path.join(directory, f"{key}.{suffix}")
+
+    def aliases(self, uuid: str) -> List[str]:
+        """Every uuid whose database is the same stored content as uuid's."""
+        target = self.data_path(uuid)
+        if os.path.dirname(target) != self._content_realpath:
+            return [uuid]
+        found = []
+        with os.scandir(self.upload_dir) as entries:
+            for entry in entries:
+                if (
+                    entry.name.endswith(".sqlite")
+                    and entry.is_symlink()
+                    and os.path.realpath(entry.path) == target
+                ):
+                    found.append(entry.name[: -len(".sqlite")])
+        return found
+
+    def _location(self, uuid: str):
+        """Directory and file name stem of the data behind uuid."""
+        target = self.data_path(uuid)
+        if os.path.dirname(target) == self._content_realpath:
+            return self.content_dir, os.path.basename(target)[: -len(".sqlite")]
+        return self.upload_dir, uuid
+
+    def exists(self, uuid: str) -> bool:
+        return os.path.exists(self.path(uuid))
+
+    def version(self, uuid: str) -> str:
+        """Token that changes whenever the data behind uuid is replaced.
+
+        Index changes keep it, and so does uploading the same bytes again;
+        new data gets a new one. Files from before
+        versions were recorded fall back to their size and mtime.
+        """
+        try:
+            with open(self.sidecar_path(uuid, "version")) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            try:
+                info = os.stat(self.path(uuid))
+            except FileNotFoundError:
+                raise DatabaseNotFound("Database not found")
+            return f"{info.st_size}-{info.st_mtime_ns}"
+
+    def save(self, stream: IO[bytes], staged_path: str) -> str:
+        """Write an upload to staged_path, returning the SHA-256 of its bytes."""
+        digest = hashlib.sha256()
+        with open(staged_path, "wb") as f:
+            for chunk in iter(lambda: stream.read(1 << 20), b""):
+                digest.update(chunk)
+                f.write(chunk)
+        return digest.hexdigest()
+
+    def digest(self, stream: IO[bytes]) -> str:
+        """SHA-256 of a seekable upload stream, which is rewound afterwards."""
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: stream.read(1 << 20), b""):
+            digest.update(chunk)
+        stream.seek(0)
+        return digest.hexdigest()
+
+    def link(self, uuid: str, content_id: str) -> bool:
+        """Make uuid an alias of already stored content; False if it is not stored."""
+        target = os.path.join(self.content_dir, f"{content_id}.sqlite")
+        if not os.path.exists(target):
+            return False
+        # Marked as used before linking, so retention does not evict it meanwhile
+        self._touch(target, force=True)
+        self._link(uuid, target)
+        if not os.path.exists(target):
+            # Evicted between the check and the link after all
+            os.remove(self.path(uuid))
+            return False
+        return True
+
+    def finalize(self, uuid: str, staged_path: str, content_id: str = None):
+        """Optimize a staged upload and publish it as the database for uuid.
+
+        With content_id the data is stored under content/ and uuid becomes an
+        alias of it; content that is already stored is not optimized again.
+        """
+        if content_id is None:
+            directory, key = self.upload_dir, uuid
+        else:
+            directory, key = self.content_dir, content_id
+        target = os.path.join(directory, f"{key}.sqlite")
+        optimized = f"{target}.{uuid}.tmp"
+        try:
+            if content_id is None or not os.path.exists(target):
+                self.optimize(staged_path, optimized)
+                # Anything derived from a previous version of this data is stale
+                for suffix in ("summaries.sqlite", "summaries.sqlite-journal", "sample.sqlite"):
+                    sidecar = os.path.join(directory, f"{key}.{suffix}")
+                    if os.path.exists(sidecar):
+                        os.remove(sidecar)
+                with open(os.path.join(directory, f"{key}.version"), "w") as f:
+                    f.write(uuid_lib.uuid4().hex)
+                os.replace(optimized, target)
+            self._touch(target, force=True)
+            if content_id is not None:
+                self._link(uuid, target)
+        finally:
+            # Opening a staged WAL database leaves -wal/-shm files behind
+            for leftover in (
+                staged_path, staged_path + "-wal", staged_path + "-shm", optimized
+            ):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+    def optimize(self, source: str, destination: str):
+        """Check source and write an optimized, read-only copy to destination."""
+        try:
+            conn = sqlite3.connect(f"file:{pathname2url(source)}?mode=ro", uri=True)
+            try:
+                status = conn.execute("PRAGMA quick_check").fetchone()[0]
+                if status != "ok":
+                    raise InvalidDatabase(f"Database integrity check failed: {status}")
+                # Takes effect on the VACUUM INTO copy
+                conn.execute(f"PRAGMA page_size = {int(self.page_size)}")
+                conn.execute("VACUUM INTO ?", (destination,))
+            finally:
+                conn.close()
+
+            conn = sqlite3.connect(destination, isolation_level=None)
+            try:
+                conn.execute("PRAGMA journal_mode = DELETE")
+                conn.execute("ANALYZE")
+                conn.execute("PRAGMA optimize")
+            finally:
+                conn.close()
+        except sqlite3.DatabaseError as e:
+            raise InvalidDatabase(f"Not a valid SQLite database: {e}")
+
+        # Read-only on disk: readers may open it as immutable from now on
+        os.chmod(destination, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+    def _link(self, uuid: str, target: str):
+        try:
+            os.symlink(os.path.relpath(target, self.upload_dir), self.path(uuid))
+        except (NotImplementedError, OSError):
+            # No symlinks (e.g. Windows without the privilege): share the file
+            # through a hard link, at the cost of separate sidecars
+            os.link(target, self.path(uuid))
+
+    @contextmanager
+    def connection(self, uuid: str):
+        """Borrow a pooled read-only connection to the database for uuid."""
+        path = self.data_path(uuid)
+        try:
+            info = os.stat(path)
+        except FileNotFoundError:
+            # Evicted or removed: drop any connections still pooled for it
+            self._release_path(path)
+            raise DatabaseNotFound("Database not found")
+
+        # A replaced file has a new inode/mtime, so it gets a fresh pool
+        key = (path, info.st_ino, info.st_mtime_ns)
+        pool = self._pool(key)
+        try:
+            conn = pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect(path, immutable=not info.st_mode & stat.S_IWUSR)
+        with self._lock:
+            self._borrowed[path] = self._borrowed.get(path, 0) + 1
+        self._touch(path)
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                self._borrowed[path] -= 1
+                if not self._borrowed[path]:
+                    del self._borrowed[path]
+            try:
+                pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def in_use(self, uuid: str) -> bool:
+        """Whether this process has a connection to uuid's database lent out."""
+        return self.data_path(uuid) in self._borrowed
+
+    def last_access(self, uuid: str) -> float:
+        """When uuid's data was last used, as a timestamp."""
+        path = self.data_path(uuid)
+        for candidate in (self._access_path(path), path):
+            try:
+                return os.stat(candidate).st_mtime
+            except FileNotFoundError:
+                continue
+        raise DatabaseNotFound("Database not found")
+
+    def _access_path(self, data_path: str) -> str:
+        return data_path[: -len(".sqlite")] + ".access"
+
+    def _touch(self, data_path: str, force: bool = False):
+        now = time.time()
+        if not force and now - self._touched.get(data_path, 0) < 60:
+            return
+        self._touched[data_path] = now
+        access_path = self._access_path(data_path)
+        try:
+            with open(access_path, "a"):
+                pass
+            os.utime(access_path)
+        except OSError as e:
+            print(f"Error recording access to {data_path}: {e}")
+
+    def release(self, uuid: str):
+        """Close pooled connections to a database that is being replaced or removed."""
+        self._release_path(self.data_path(uuid))
+
+    def _release_path(self, path: str):
+        with self._lock:
+            keys = [key for key in self._pools if key[0] == path]
+            pools = [self._pools.pop(key) for key in keys]
+        for pool in pools:
+            _drain(pool)
+
+    def close(self):
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            _drain(pool)
+
+    def _pool(self, key) -> queue.LifoQueue:
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                stale = [other for other in self._pools if other[0] == key[0]]
+                for other in stale:
+                    _drain(self._pools.pop(other))
+                pool = self._pools[key] = queue.LifoQueue(maxsize=self.pool_size)
+            return pool
+
+    def _connect(self, path: str, immutable: bool) -> sqlite3.Connection:
+        flags = "mode=ro&immutable=1" if immutable else "mode=ro"
+        return sqlite3.connect(
+            f"file:{pathname2url(path)}?{flags}", uri=True, check_same_thread=False
+        )
+
+
+def _drain(pool: queue.LifoQueue):
+    while True:
+        try:
+            pool.get_nowait().close()
+        except queue.Empty:
+            return
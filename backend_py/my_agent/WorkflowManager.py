@@ -2,26 +2,36 @@ from langgraph.graph import StateGraph
 from my_agent.State import State
 from my_agent.SQLAgent import SQLAgent
 from my_agent.DataFormatter import DataFormatter
+from my_agent.LLMManager import LLMManager
+from my_agent.Metrics import observed_node
+from my_agent.RequestTimer import timed_node
 from langgraph.graph import END
 
 class WorkflowManager:
-    def __init__(self):
-        self.sql_agent = SQLAgent()
-        self.data_formatter = DataFormatter()
+    def __init__(self, db_manager=None, llm_manager=None, conversation_manager=None):
+        # Share a single LLMManager between the agent and the formatter
+        self.llm_manager = llm_manager or LLMManager()
+        self.sql_agent = SQLAgent(db_manager, self.llm_manager, conversation_manager)
+        self.data_formatter = DataFormatter(self.llm_manager)
 
     def create_workflow(self) -> StateGraph:
         """Create and configure the workflow graph."""
         workflow = StateGraph(State)
 
-        # Add nodes to the graph
-        workflow.add_node("parse_question", self.sql_agent.parse_question)
-        workflow.add_node("get_unique_nouns", self.sql_agent.get_unique_nouns)
-        workflow.add_node("generate_sql", self.sql_agent.generate_sql)
-        workflow.add_node("validate_and_fix_sql", self.sql_agent.validate_and_fix_sql)
-        workflow.add_node("execute_sql", self.sql_agent.execute_sql)
-        workflow.add_node("format_results", self.sql_agent.format_results)
-        workflow.add_node("choose_visualization", self.sql_agent.choose_visualization)
-        workflow.add_node("format_data_for_visualization", self.data_formatter.format_data_for_visualization)
+        # Add nodes to the graph (recorded in metrics, and timed per node when
+        # a RequestTimer is active)
+        nodes = {
+            "parse_question": self.sql_agent.parse_question,
+            "get_unique_nouns": self.sql_agent.get_unique_nouns,
+            "generate_sql": self.sql_agent.generate_sql,
+            "validate_and_fix_sql": self.sql_agent.validate_and_fix_sql,
+            "execute_sql": self.sql_agent.execute_sql,
+            "format_results": self.sql_agent.format_results,
+            "choose_visualization": self.sql_agent.choose_visualization,
+            "format_data_for_visualization": self.data_formatter.format_data_for_visualization,
+        }
+        for name, node in nodes.items():
+            workflow.add_node(name, timed_node(name, observed_node(name, node)))
         
         # Define edges
         workflow.add_edge("parse_question", "get_unique_nouns")
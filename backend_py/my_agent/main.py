@@ -1,8 +1,17 @@
-
+from functools import lru_cache
 
 from my_agent.WorkflowManager import WorkflowManager
 
-# for deployment on langgraph cloud
-graph = WorkflowManager().returnGraph()
-    
-    
\ No newline at end of file
+
+@lru_cache(maxsize=None)
+def get_graph():
+    """Build the compiled graph once per process."""
+    return WorkflowManager().returnGraph()
+
+
+def __getattr__(name):
+    # for deployment on langgraph cloud, which loads main.py:graph; built on
+    # first access so importing this module stays cheap
+    if name == "graph":
+        return get_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
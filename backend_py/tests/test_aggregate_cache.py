@@ -0,0 +1,66 @@
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from my_agent.AggregateCache import AggregateCache
+from my_agent.UploadStore import UploadStore
+
+QUERIES = [
+    "SELECT region, SUM(quantity) FROM sales_0 WHERE ~quantity = -4 GROUP BY region",
+    "SELECT region, SUM(quantity) FROM sales_0 WHERE quantity & 1 = 1 GROUP BY region",
+    "SELECT region, COUNT(*) FROM sales_0 WHERE quantity > 1e1 GROUP BY region",
+    "SELECT region, MAX(quantity) FROM sales_0 WHERE quantity < 0x10 GROUP BY region",
+    "SELECT region, SUM(quantity) FROM sales_0 -- by region\nGROUP BY region",
+    'SELECT region, COUNT(*) FROM sales_0 WHERE region <> "we""st" GROUP BY region',
+]
+
+
+def create_sales(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE sales_0 (region TEXT, quantity INTEGER)")
+    conn.executemany(
+        "INSERT INTO sales_0 VALUES (?, ?)",
+        [(region, quantity) for region in ("north", "south", "east", 'we"st', "west") for quantity in range(20)],
+    )
+    conn.commit()
+    conn.close()
+
+
+class CachedAnswersTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = UploadStore(self.directory)
+        create_sales(self.store.staging_path("db"))
+        self.store.finalize("db", self.store.staging_path("db"))
+        self.cache = AggregateCache(self.store, min_hits=1, min_rows=0)
+        # Build summaries right away instead of on the background thread
+        self.cache._enqueue = lambda job: self.cache.build(*job)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def exact(self, query):
+        with self.store.connection("db") as conn:
+            return sorted(list(row) for row in conn.execute(query).fetchall())
+
+    def test_cached_answers_match_the_exact_query(self):
+        answered = 0
+        for query in QUERIES:
+            with self.subTest(query=query):
+                self.assertIsNone(self.cache.execute("db", query))  # first sight: builds
+                cached = self.cache.execute("db", query)
+                if cached is not None:
+                    answered += 1
+                    self.assertEqual(sorted(cached), self.exact(query))
+        self.assertGreater(answered, 0)
+
+    def test_queries_it_cannot_rebuild_are_not_cached(self):
+        for query in QUERIES[:2]:
+            self.cache.execute("db", query)
+            self.assertIsNone(self.cache.execute("db", query))
+
+
+if __name__ == "__main__":
+    unittest.main()
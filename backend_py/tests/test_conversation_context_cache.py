@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from my_agent.ConversationContextCache import ConversationContextCache
+from my_agent.ConversationManager import ConversationManager
+
+
+class AppendDuringLoadTest(unittest.TestCase):
+    def test_turn_appended_during_a_load_is_not_lost(self):
+        stored = [{"question": "first"}]
+        cache = None
+
+        def load_turns(session_id, limit):
+            turns = list(reversed(stored))[:limit]
+            if len(stored) == 1:
+                # The next turn is saved after this read but before the load ends
+                stored.append({"question": "second"})
+                cache.append(session_id, stored[-1])
+            return turns
+
+        cache = ConversationContextCache(
+            load_turns, lambda turns: ",".join(turn["question"] for turn in turns)
+        )
+        self.assertEqual(cache.get_context("s"), "first,second")
+        cache.append("s", {"question": "third"})
+        self.assertEqual(cache.get_context("s"), "first,second,third")
+
+
+class SharedSessionTest(unittest.TestCase):
+    """Two managers on one database stand in for two worker processes."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, "conversations.sqlite")
+        self.first = ConversationManager(path, write_behind=False)
+        self.second = ConversationManager(path)
+        self.session = self.first.create_session("db")
+
+    def tearDown(self):
+        self.first.close()
+        self.second.close()
+        shutil.rmtree(self.directory)
+
+    def test_turns_saved_by_another_process_are_seen(self):
+        self.first.save_conversation(self.session, "first question", "SELECT 1")
+        self.assertIn("first question", self.first.get_conversation_context(self.session))
+        self.second.save_conversation(self.session, "second question", "SELECT 2")
+        self.second.flush()
+        self.assertIn("second question", self.first.get_conversation_context(self.session))
+
+    def test_edited_turns_are_seen(self):
+        self.first.save_conversation(self.session, "question", "SELECT 1", results_summary="About 10 rows")
+        self.assertIn("About 10 rows", self.first.get_conversation_context(self.session))
+        with self.second._connection() as conn:
+            conn.execute("UPDATE conversations SET results_summary = 'Found 12 rows'")
+            conn.commit()
+        self.assertIn("Found 12 rows", self.first.get_conversation_context(self.session))
+
+    def test_exact_result_replaces_the_estimate(self):
+        self.second.save_conversation(
+            self.session, "total?", "SELECT SUM(x) FROM t",
+            results_summary="Found 1 rows (estimated from a 1% sample)", answer="About 100",
+        )
+        self.second.flush()
+        self.assertIn("estimated", self.first.get_conversation_context(self.session))
+        self.assertIn("estimated", self.second.get_conversation_context(self.session))
+        self.assertTrue(
+            self.second.update_conversation_result(
+                self.session, "total?", "SELECT SUM(x) FROM t", "Found 1 rows", "Exactly 103"
+            )
+        )
+        (turn,) = self.first.get_conversation_history(self.session)
+        self.assertEqual((turn["results_summary"], turn["answer"]), ("Found 1 rows", "Exactly 103"))
+        for manager in (self.first, self.second):
+            self.assertNotIn("estimated", manager.get_conversation_context(self.session))
+
+    def test_own_turns_need_no_reload(self):
+        self.first.save_conversation(self.session, "first question", "SELECT 1")
+        self.first.get_conversation_context(self.session)
+        loads = []
+        load_turns = self.first._context_cache._load_turns
+        self.first._context_cache._load_turns = lambda *args: loads.append(args) or load_turns(*args)
+        self.first.save_conversation(self.session, "second question", "SELECT 2")
+        self.assertIn("second question", self.first.get_conversation_context(self.session))
+        self.assertEqual(loads, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import threading
+import time
+import unittest
+
+from my_agent.ConversationWriter import ConversationWriter
+
+
+class ConversationWriterTest(unittest.TestCase):
+    def test_failing_row_does_not_drop_its_batch(self):
+        written = []
+
+        def write_batch(entries):
+            if any(entry == ("bad",) for entry in entries):
+                raise ValueError("bad row")
+            written.extend(entries)
+
+        writer = ConversationWriter(write_batch, flush_interval_ms=200, batch_size=10)
+        for entry in [("a",), ("bad",), ("b",)]:
+            writer.submit(entry)
+        writer.flush()
+        self.assertEqual(written, [("a",), ("b",)])
+        self.assertEqual(writer.pending(), 0)
+        writer.close()
+
+    def test_flush_does_not_wait_for_later_entries(self):
+        releases = {"early": threading.Event(), "late": threading.Event()}
+
+        def write_batch(entries):
+            for (name,) in entries:
+                releases[name].wait(5)
+
+        writer = ConversationWriter(write_batch, flush_interval_ms=1, batch_size=1)
+        writer.submit(("early",))
+        flushed = threading.Event()
+        threading.Thread(target=lambda: (writer.flush(), flushed.set()), daemon=True).start()
+        time.sleep(0.05)
+        writer.submit(("late",))
+
+        releases["early"].set()
+        # The late entry is still being written, yet the flush has returned
+        self.assertTrue(flushed.wait(2))
+        self.assertEqual(writer.pending(), 1)
+        releases["late"].set()
+        writer.flush()
+        self.assertEqual(writer.pending(), 0)
+        writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+from my_agent.DataFormatter import DataFormatter
+
+
+class FakeLLMManager:
+    """Answers every label prompt with the same label and counts the calls."""
+
+    def __init__(self, label="Value"):
+        self.label = label
+        self.calls = 0
+
+    def invoke(self, prompt, **kwargs):
+        self.calls += 1
+        return self.label
+
+
+MULTI_SERIES = [
+    ["north", "2020", 1],
+    ["south", "2020", 2],
+    ["north", "2021", 3],
+]
+
+
+class LineDataTest(unittest.TestCase):
+    def setUp(self):
+        self.llm = FakeLLMManager("Sales")
+        self.formatter = DataFormatter(self.llm)
+
+    def test_multi_series_asks_the_llm_for_the_y_axis(self):
+        data = self.formatter._format_line_data(MULTI_SERIES, "sales by region")[
+            "formatted_data_for_visualization"
+        ]
+        self.assertEqual(data["xValues"], ["2020", "2021"])
+        self.assertEqual(data["yAxisLabel"], "Sales")
+        self.assertEqual(
+            sorted(series["label"] for series in data["yValues"]), ["north", "south"]
+        )
+        self.assertEqual(self.llm.calls, 1)
+
+    def test_multi_series_through_the_graph_node(self):
+        # A failure in the deterministic path falls back to the LLM formatter
+        data = self.formatter.format_data_for_visualization(
+            {
+                "visualization": "line",
+                "results": MULTI_SERIES,
+                "question": "sales by region",
+                "sql_query": "SELECT region, year, sales FROM sales",
+            }
+        )["formatted_data_for_visualization"]
+        self.assertEqual(data["yAxisLabel"], "Sales")
+
+    def test_pinned_multi_series_refresh_uses_no_llm(self):
+        data = self.formatter.format_pinned(
+            "line", MULTI_SERIES, "sales by region", {"y_axis": "Pinned"}
+        )["formatted_data_for_visualization"]
+        self.assertEqual(data["yAxisLabel"], "Pinned")
+        self.assertEqual(len(data["yValues"]), 2)
+        self.assertEqual(self.llm.calls, 0)
+
+    def test_pinned_single_series_refresh_uses_no_llm(self):
+        data = self.formatter.format_pinned(
+            "line", [["2020", 1], ["2021", 2]], "sales", {"series": "Pinned"}
+        )["formatted_data_for_visualization"]
+        self.assertEqual(data["yValues"], [{"data": [1.0, 2.0], "label": "Pinned"}])
+        self.assertEqual(self.llm.calls, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
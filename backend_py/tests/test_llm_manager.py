@@ -0,0 +1,67 @@
+import unittest
+from unittest import mock
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from my_agent import LLMManager as llm_module
+from my_agent.LLMManager import LLMManager
+
+
+class APIError(Exception):
+    def __init__(self, code):
+        super().__init__(f"status {code}")
+        self.code = code
+
+
+class FlakyModel:
+    """Fails with the given errors in turn, then answers."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return mock.Mock(content="answer", usage_metadata=None)
+
+
+PROMPT = ChatPromptTemplate.from_messages([("human", "{question}")])
+
+
+class RetryTest(unittest.TestCase):
+    def setUp(self):
+        self.retries = mock.patch.object(llm_module, "LLM_RETRIES").start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_transient_errors_are_retried_and_counted(self):
+        model = FlakyModel(APIError(503), TimeoutError())
+        manager = LLMManager(model, max_retries=2, retry_delay=0)
+        self.assertEqual(manager.invoke(PROMPT, question="q"), "answer")
+        self.assertEqual(model.calls, 3)
+        self.assertEqual(self.retries.inc.call_count, 2)
+
+    def test_wrapped_rate_limit_is_retried(self):
+        wrapped = RuntimeError("rate limited")
+        wrapped.__cause__ = APIError(429)
+        model = FlakyModel(wrapped)
+        self.assertEqual(LLMManager(model, retry_delay=0).invoke(PROMPT, question="q"), "answer")
+        self.assertEqual(self.retries.inc.call_count, 1)
+
+    def test_other_errors_fail_at_once(self):
+        model = FlakyModel(APIError(400))
+        with self.assertRaises(Exception):
+            LLMManager(model, retry_delay=0).invoke(PROMPT, question="q")
+        self.assertEqual(model.calls, 1)
+        self.assertEqual(self.retries.inc.call_count, 0)
+
+    def test_retries_are_bounded(self):
+        model = FlakyModel(*[APIError(500)] * 5)
+        with self.assertRaises(Exception):
+            LLMManager(model, max_retries=2, retry_delay=0).invoke(PROMPT, question="q")
+        self.assertEqual(model.calls, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
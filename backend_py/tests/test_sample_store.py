@@ -0,0 +1,42 @@
+import shutil
+import tempfile
+import unittest
+
+from my_agent.SampleStore import SampleStore
+from my_agent.UploadStore import UploadStore
+from tests.test_aggregate_cache import QUERIES, create_sales
+
+
+class SampledAnswersTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = UploadStore(self.directory)
+        create_sales(self.store.staging_path("db"))
+        self.store.finalize("db", self.store.staging_path("db"))
+        # A sample of every row: the estimates must equal the exact answers
+        self.samples = SampleStore(self.store, fraction=1.0, min_rows=0)
+        self.samples.build("db", self.store.version("db"))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def exact(self, query):
+        with self.store.connection("db") as conn:
+            return sorted(list(row) for row in conn.execute(query).fetchall())
+
+    def test_full_sample_answers_match_the_exact_query(self):
+        for query in QUERIES:
+            with self.subTest(query=query):
+                approximate = self.samples.execute("db", query)
+                if approximate is not None:
+                    self.assertEqual(sorted(approximate["results"]), self.exact(query))
+
+    def test_queries_it_cannot_rebuild_are_not_estimated(self):
+        for query in QUERIES[:2]:
+            self.assertIsNone(self.samples.execute("db", query))
+        self.assertIsNotNone(self.samples.execute("db", QUERIES[2]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+from my_agent.SQLValidator import SQLValidator
+
+SCHEMA = (
+    "Table: sales\n"
+    "CREATE statement: CREATE TABLE sales (region TEXT, amount REAL, js TEXT)\n\n"
+    "Table: regions\n"
+    "CREATE statement: CREATE TABLE regions (region TEXT PRIMARY KEY, manager TEXT)\n\n"
+)
+
+
+class SQLValidatorTest(unittest.TestCase):
+    def setUp(self):
+        self.validator = SQLValidator()
+
+    def issue_types(self, query):
+        return [issue["type"] for issue in self.validator.validate(SCHEMA, query)]
+
+    def test_reads_are_valid(self):
+        for query in (
+            "SELECT region, SUM(amount) FROM sales GROUP BY region",
+            "WITH totals AS (SELECT region, SUM(amount) AS total FROM sales GROUP BY region) "
+            "SELECT * FROM totals ORDER BY total DESC",
+            "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 5) SELECT x FROM n",
+            "SELECT region, amount, RANK() OVER (PARTITION BY region ORDER BY amount DESC) FROM sales",
+            "SELECT j.value FROM sales, json_each(sales.js) j",
+            "SELECT t.key FROM sales, json_tree(sales.js) t",
+            "SELECT s.region, r.manager FROM sales s JOIN regions r ON r.region = s.region",
+        ):
+            with self.subTest(query=query):
+                self.assertEqual(self.issue_types(query), [])
+
+    def test_writes_are_forbidden(self):
+        for query in (
+            "INSERT INTO sales VALUES ('north', 1, '{}')",
+            "UPDATE sales SET amount = 0",
+            "DELETE FROM sales",
+            "DROP TABLE sales",
+            "CREATE TABLE copy AS SELECT * FROM sales",
+            "ATTACH DATABASE 'other.sqlite' AS other",
+            "PRAGMA writable_schema = ON",
+        ):
+            with self.subTest(query=query):
+                self.assertEqual(self.issue_types(query), ["forbidden_statement"])
+
+    def test_schema_table_cannot_be_written(self):
+        self.assertNotEqual(self.issue_types("UPDATE sqlite_master SET sql = NULL"), [])
+
+    def test_multiple_statements(self):
+        self.assertEqual(
+            self.issue_types("SELECT 1 FROM sales; DELETE FROM sales"), ["multiple_statements"]
+        )
+
+    def test_unknown_names_come_with_suggestions(self):
+        issue = self.validator.validate(SCHEMA, "SELECT amonut FROM sales")[0]
+        self.assertEqual(issue["type"], "unknown_column")
+        self.assertEqual(issue["suggestions"], ["amount"])
+        issue = self.validator.validate(SCHEMA, "SELECT * FROM sale")[0]
+        self.assertEqual((issue["type"], issue["suggestions"]), ("unknown_table", ["sales"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from my_agent.UploadRetention import UploadRetention
+from my_agent.UploadStore import UploadStore
+
+
+class NoSessions:
+    def get_active_databases(self, minutes=30):
+        return set()
+
+    def get_saved_chart_databases(self):
+        return set()
+
+
+class LegacyUploadTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = UploadStore(self.directory)
+        # A plain file from before deduplication, with sidecars under its uuid
+        for name in ("legacy.sqlite", "legacy.summaries.sqlite", "legacy.sample.sqlite"):
+            conn = sqlite3.connect(os.path.join(self.directory, name))
+            conn.execute("CREATE TABLE t (x)")
+            conn.commit()
+            conn.close()
+        self.retention = UploadRetention(self.store, NoSessions(), max_bytes=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_sidecars_count_with_their_database(self):
+        databases = self.retention.databases()
+        self.assertEqual([db["uuids"] for db in databases], [["legacy"]])
+        files = sorted(os.path.basename(path) for path in databases[0]["files"])
+        self.assertEqual(files, ["legacy.sample.sqlite", "legacy.sqlite", "legacy.summaries.sqlite"])
+        usage = self.retention.usage()
+        self.assertEqual((usage["databases"], usage["uuids"]), (1, 1))
+        self.assertEqual(
+            usage["used_bytes"],
+            sum(os.path.getsize(os.path.join(self.directory, name)) for name in files),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
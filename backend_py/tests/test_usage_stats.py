@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from my_agent.ConversationManager import ConversationManager
+
+
+class UsageAfterDeletesTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.manager = ConversationManager(
+            os.path.join(self.directory, "conversations.sqlite"), write_behind=False
+        )
+        self.session = self.manager.create_session("db")
+        # Turns a minute apart, oldest first
+        self.manager._write_conversations(
+            [
+                (
+                    self.session,
+                    f"question {i}",
+                    "SELECT 1",
+                    None,
+                    "bar" if i % 2 else "line",
+                    "failed" if i % 3 == 0 else None,
+                    "db",
+                    None,
+                    f"2024-01-01 00:{i:02d}:00",
+                )
+                for i in range(10)
+            ]
+        )
+
+    def tearDown(self):
+        self.manager.close()
+        shutil.rmtree(self.directory)
+
+    def counted(self):
+        with self.manager._connection() as conn:
+            rows = conn.execute(
+                "SELECT COUNT(*), COUNT(error_message), MIN(timestamp), MAX(timestamp) FROM conversations"
+            ).fetchone()
+            by_type = dict(
+                conn.execute(
+                    "SELECT visualization_type, COUNT(*) FROM conversations GROUP BY visualization_type"
+                ).fetchall()
+            )
+        return rows, by_type
+
+    def assert_counters_match_rows(self):
+        (total, failed, first, last), by_type = self.counted()
+        for stats in (self.manager.get_session_stats(self.session), self.manager.get_database_usage("db")):
+            self.assertEqual(
+                (stats["total_conversations"], stats["failed_conversations"]), (total, failed)
+            )
+            self.assertEqual((stats["first_conversation"], stats["last_conversation"]), (first, last))
+        visualizations = self.manager.get_database_usage("db")["visualizations"]
+        self.assertEqual(
+            {v["visualization_type"]: v["total_conversations"] for v in visualizations}, by_type
+        )
+
+    def test_counters_follow_deleted_turns(self):
+        self.assert_counters_match_rows()
+        self.assertEqual(self.manager.enforce_storage_budget(max_rows=6, batch_size=3), 4)
+        self.assert_counters_match_rows()
+
+    def test_counters_go_when_every_turn_is_deleted(self):
+        self.manager.enforce_storage_budget(max_rows=1)
+        with self.manager._connection() as conn:
+            conn.execute("DELETE FROM conversations")
+            conn.commit()
+        self.assertEqual(self.manager.get_session_stats(self.session)["total_conversations"], 0)
+        self.assertEqual(self.manager.get_database_usage("db")["visualizations"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,14 @@
+"""WSGI entry point for production serving.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import conversation_api  # noqa: E402
+
+# With preload_app this runs once in the master, before workers are forked
+conversation_api.warm_up()
+
+app = conversation_api.app
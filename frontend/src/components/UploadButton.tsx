@@ -1,5 +1,7 @@
 import React, { useRef, useState } from 'react'
 
+const ALLOWED_EXTENSIONS = ['.sqlite', '.csv', '.parquet', '.zip']
+
 interface UploadButtonProps {
   onFileUpload: (file: File) => void
   disabled?: boolean
@@ -16,11 +18,11 @@ const UploadButton: React.FC<UploadButtonProps> = ({ onFileUpload, disabled }) =
         alert('File size should be less than 1 MB')
         return
       }
-      if (file.name.endsWith('.sqlite') || file.name.endsWith('.csv')) {
+      if (ALLOWED_EXTENSIONS.some((extension) => file.name.toLowerCase().endsWith(extension))) {
         setFileName(file.name)
         onFileUpload(file)
       } else {
-        alert('Please select a valid .sqlite or .csv file')
+        alert('Please select a valid .sqlite, .csv, .parquet or .zip file')
       }
     }
   }
@@ -40,7 +42,7 @@ const UploadButton: React.FC<UploadButtonProps> = ({ onFileUpload, disabled }) =
         ref={fileInputRef}
         onChange={handleFileChange}
         name='file'
-        accept='.sqlite,.csv'
+        accept={ALLOWED_EXTENSIONS.join(',')}
         className='hidden'
       />
       <button
@@ -0,0 +1,27 @@
+// Expands the compact columnar chart payloads produced when the backend is
+// asked for `chart_encoding: 'columnar'` back into the point-object shape the
+// graph components expect. Non-columnar payloads are returned unchanged.
+export const decodeChartData = (visualization: string, data: any) => {
+  if (!data || data.encoding !== 'columnar') {
+    return data
+  }
+
+  if (visualization === 'scatter') {
+    return {
+      series: data.series.map((series: { x: number[]; y: number[]; label?: string }) => ({
+        data: series.x.map((x, i) => ({ x, y: series.y[i], id: i + 1 })),
+        label: series.label,
+      })),
+    }
+  }
+
+  if (visualization === 'pie') {
+    return data.ids.map((id: number, i: number) => ({
+      id,
+      value: data.values[i],
+      label: data.labels[i],
+    }))
+  }
+
+  return data
+}
@@ -8,6 +8,7 @@ import { Client } from '@langchain/langgraph-sdk'
 import { QuestionDisplay } from './QuestionDisplay'
 import { Stream } from './Stream'
 import { graphDictionary, InputType } from '../graphs/graphDictionary'
+import { decodeChartData } from '../graphs/chartEncoding'
 import UploadButton from '../UploadButton'
 import { Sidebar } from './Sidebar'
 
@@ -24,6 +25,13 @@ const sampleQuestions = [
   'What are the peak shopping hours throughout the day?',
 ]
 
+export type SqlIssue = {
+  type: string
+  message: string
+  name?: string
+  suggestions?: string[]
+}
+
 export type GraphState = {
   question: string
   uuid: string
@@ -31,13 +39,14 @@ export type GraphState = {
   unique_nouns: string[]
   sql_query: string
   sql_valid: boolean
-  sql_issues: string
+  sql_issues: SqlIssue[]
   results: any[]
   answer: string
   error: string
   visualization: string
   visualization_reason: string
   formatted_data_for_visualization: { [key: string]: any }
+  approximate?: { table: string; fraction: number; sample_rows: number; source_rows: number } | null
 }
 
 export default function Playground() {
@@ -118,7 +127,7 @@ export default function Playground() {
           unique_nouns: [],
           sql_query: '',
           sql_valid: false,
-          sql_issues: '',
+          sql_issues: [],
           results: [],
           answer: '',
           error: '',
@@ -136,6 +145,7 @@ export default function Playground() {
             question,
             databaseUuid,
             sessionId,
+            chartEncoding: process.env.NEXT_PUBLIC_CHART_ENCODING,
           }),
         })
 
@@ -145,13 +155,16 @@ export default function Playground() {
 
         const reader = response.body?.getReader()
         const decoder = new TextDecoder()
+        let buffer = ''
 
         while (true) {
           const { value, done } = (await reader?.read()) || {}
           if (done) break
 
-          const chunk = decoder.decode(value)
-          const lines = chunk.split('\n')
+          // Events can span chunks (large chart payloads); keep the partial last line
+          buffer += decoder.decode(value, { stream: true })
+          const lines = buffer.split('\n')
+          buffer = lines.pop() || ''
 
           for (const line of lines) {
             if (line.startsWith('data: ')) {
@@ -173,7 +186,7 @@ export default function Playground() {
           unique_nouns: prevState?.unique_nouns || [],
           sql_query: prevState?.sql_query || '',
           sql_valid: false,
-          sql_issues: prevState?.sql_issues || '',
+          sql_issues: prevState?.sql_issues || [],
           results: [],
           answer: prevState?.answer || '',
           error: `API request failed: ${error}`,
@@ -303,7 +316,7 @@ export default function Playground() {
     }
 
     return React.createElement(visualizationConfig.component as React.ComponentType<any>, {
-      data: graphState.formatted_data_for_visualization,
+      data: decodeChartData(graphState.visualization, graphState.formatted_data_for_visualization),
     })
   }
 
@@ -503,6 +516,13 @@ export default function Playground() {
               {graphState.answer && <div className='markdown-content'>{graphState.answer}</div>}
             </div>
 
+            {graphState.approximate && (
+              <div className='text-sm mb-4 text-gruvbox-light-yellow dark:text-gruvbox-dark-yellow italic'>
+                Approximate: estimated from a {graphState.approximate.fraction * 100}% sample, the exact result is
+                on its way
+              </div>
+            )}
+
             {/* Safe Visualization Rendering */}
             {renderVisualization()}
           </div>
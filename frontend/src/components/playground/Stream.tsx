@@ -14,7 +14,15 @@ export const Stream = ({ graphState }: { graphState: GraphState }) => {
       {graphState.sql_valid !== undefined && (
         <StreamRow heading='SQL Valid' information={graphState.sql_valid.toString()} />
       )}
-      {graphState.sql_issues && <StreamRow heading='SQL Issues' information={graphState.sql_issues} />}
+      {graphState.sql_issues?.length > 0 && (
+        <StreamRow heading='SQL Issues' information={graphState.sql_issues.map((issue) => issue.message).join('; ')} />
+      )}
+      {graphState.approximate && (
+        <StreamRow
+          heading='Approximate'
+          information={`Estimated from a ${graphState.approximate.fraction * 100}% sample of ${graphState.approximate.table} (${graphState.approximate.sample_rows} of ${graphState.approximate.source_rows} rows); the exact result follows`}
+        />
+      )}
       {graphState.results && <StreamRow heading='Results' information={JSON.stringify(graphState.results)} />}
       {graphState.answer && <StreamRow heading='Answer' information={graphState.answer} />}
       {graphState.error && <StreamRow heading='Error' information={graphState.error} />}
@@ -5,7 +5,7 @@ export default async function handler(req: any, res: any) {
     return res.status(405).json({ message: 'Method not allowed' })
   }
 
-  const { question, databaseUuid, sessionId } = req.body
+  const { question, databaseUuid, sessionId, chartEncoding } = req.body
   const defaultDatabaseUuid = '921c838c-541d-4361-8c96-70cb23abd9f5'
 
   const client = new Client({
@@ -14,9 +14,25 @@ export default async function handler(req: any, res: any) {
   })
 
   try {
+    if (process.env.ASK_STREAM_URL) {
+      return await proxyAskStream(res, {
+        question,
+        uuid: databaseUuid || defaultDatabaseUuid,
+        session_id: sessionId,
+        chart_encoding: chartEncoding,
+        // Sampled estimate first, replaced by the exact result when it finishes
+        progressive: process.env.ASK_PROGRESSIVE === 'true',
+      })
+    }
+
     const thread = await client.threads.create()
     const streamResponse = client.runs.stream(thread['thread_id'], 'my_agent', {
-      input: { question, uuid: databaseUuid || defaultDatabaseUuid, session_id: sessionId },
+      input: {
+        question,
+        uuid: databaseUuid || defaultDatabaseUuid,
+        session_id: sessionId,
+        chart_encoding: chartEncoding,
+      },
     })
 
     res.writeHead(200, {
@@ -37,3 +53,31 @@ export default async function handler(req: any, res: any) {
     res.status(500).json({ message: `Error in run: ${error}` })
   }
 }
+
+
+// Relay the Python API's per-node event stream (/ask/stream) to the browser
+async function proxyAskStream(res: any, body: { [key: string]: any }) {
+  const upstream = await fetch(process.env.ASK_STREAM_URL as string, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body),
+  })
+
+  if (!upstream.ok || !upstream.body) {
+    return res.status(upstream.status || 500).json({ message: await upstream.text() })
+  }
+
+  res.writeHead(200, {
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache, no-transform',
+    Connection: 'keep-alive',
+  })
+
+  const reader = upstream.body.getReader()
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+    res.write(value)
+  }
+  res.end()
+}
@@ -104,8 +104,13 @@ start_conversation_api() {
     print_status "Installing Python dependencies..."
     pip install -r requirements.txt > /dev/null 2>&1
     
-    # Start the conversation API
-    nohup python conversation_api.py > "../$LOG_DIR/conversation_api.log" 2>&1 &
+    # Start the conversation API (API_MODE=production serves it with gunicorn)
+    if [ "$API_MODE" = "production" ]; then
+        print_status "Using production server (gunicorn)"
+        nohup gunicorn -c gunicorn.conf.py wsgi:app > "../$LOG_DIR/conversation_api.log" 2>&1 &
+    else
+        nohup python conversation_api.py > "../$LOG_DIR/conversation_api.log" 2>&1 &
+    fi
     echo $! > "../$CONVERSATION_API_PID"
     cd ..
     
@@ -164,6 +169,12 @@ stop_service() {
     if is_service_running "$pid_file"; then
         local pid=$(cat "$pid_file")
         kill $pid 2>/dev/null || kill -9 $pid 2>/dev/null || true
+        # Give the service time to shut down gracefully (flush pending writes)
+        local waited=0
+        while ps -p $pid > /dev/null 2>&1 && [ $waited -lt 30 ]; do
+            sleep 1
+            waited=$((waited + 1))
+        done
         rm -f "$pid_file"
         print_success "$service_name stopped"
     else
@@ -301,6 +312,12 @@ health_check() {
     else
         print_error "Conversation API: Unhealthy or not responding"
     fi
+
+    if curl -sf "http://localhost:$CONVERSATION_API_PORT/ready" > /dev/null 2>&1; then
+        print_success "Conversation API: Ready"
+    else
+        print_warning "Conversation API: Not ready"
+    fi
     
     # Check Frontend
     if curl -s "http://localhost:$FRONTEND_PORT" > /dev/null 2>&1; then
@@ -331,6 +348,7 @@ show_help() {
     echo "Individual service commands:"
     echo "  start-frontend     Start only frontend"
     echo "  start-api          Start only conversation API"
+    echo "  start-api-prod     Start only conversation API with gunicorn (multi-worker)"
     echo "  stop-frontend      Stop only frontend"
     echo "  stop-api           Stop only conversation API"
     echo ""
@@ -403,6 +421,9 @@ case "${1:-help}" in
     start-api)
         start_conversation_api
         ;;
+    start-api-prod)
+        API_MODE=production start_conversation_api
+        ;;
     stop-frontend)
         stop_service "Frontend" "$FRONTEND_PID" "$FRONTEND_PORT"
         ;;